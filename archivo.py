@@ -0,0 +1,410 @@
+"""
+Archivo de registros viejos en bases por año
+Los registros con más de N días pasan de ciudadanos a archivo/cedulas_AAAA.db
+(junto a la DB), según el año de alta. La tabla caliente queda pequeña y las
+búsquedas adjuntan (ATTACH) los archivos solo cuando se piden o cuando en la
+tabla caliente no hubo coincidencias. Un archivo nuevo se arma aparte y se
+compacta con VACUUM INTO antes de borrar nada de ciudadanos
+"""
+
+import os
+import re
+import sqlite3
+from contextlib import ExitStack, contextmanager
+
+from busqueda import planificar
+from campos import COLUMNAS
+from db_esquema import (alta_sin_resumenes, borrado_sin_resumenes, crear_tablas_crudos, id_diccionario,
+                        reconstruir_resumenes, sumar_a_resumenes)
+
+DIAS_ARCHIVO = 365
+FILAS_POR_TRANSACCION = 5000
+ADJUNTOS_MAX = 8          # SQLite admite 10 bases adjuntas por conexión
+NUMEROS_POR_CONSULTA = 500
+_NOMBRE = re.compile(r"cedulas_(\d{4})\.db")
+
+_ESQUEMA = ("""
+CREATE TABLE IF NOT EXISTS ciudadanos (
+    id INTEGER PRIMARY KEY,
+    numero TEXT,
+    nombres TEXT,
+    apellidos TEXT,
+    fecha_nacimiento INTEGER,
+    sexo INTEGER,
+    departamento INTEGER,
+    municipio INTEGER,
+    lugar_texto TEXT,
+    registrado INTEGER
+)
+""", "CREATE INDEX IF NOT EXISTS idx_ciudadanos_numero ON ciudadanos(numero)")
+
+_ESQUEMA_FTS = ("""
+CREATE VIRTUAL TABLE IF NOT EXISTS ciudadanos_fts USING fts5(
+    nombres, apellidos,
+    content='ciudadanos', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)
+""", """
+CREATE TRIGGER IF NOT EXISTS ciudadanos_fts_ai AFTER INSERT ON ciudadanos BEGIN
+    INSERT INTO ciudadanos_fts(rowid, nombres, apellidos) VALUES (new.id, new.nombres, new.apellidos);
+END
+""", """
+CREATE TRIGGER IF NOT EXISTS ciudadanos_fts_ad AFTER DELETE ON ciudadanos BEGIN
+    INSERT INTO ciudadanos_fts(ciudadanos_fts, rowid, nombres, apellidos)
+    VALUES ('delete', old.id, old.nombres, old.apellidos);
+END
+""")
+
+_COLUMNAS_ARCHIVO = f"id, {COLUMNAS}, registrado"
+_COLUMNAS_CRUDOS = "ciudadano_id, diccionario, texto, editado, dato"
+# La copia archivada es idéntica a la fila caliente (nadie la modificó entre medias)
+_IGUAL = " AND ".join(f"a.{c} IS main.ciudadanos.{c}" for c in COLUMNAS.split(", "))
+
+
+def directorio_archivo(ruta_db):
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_db)), "archivo")
+
+
+def ruta_anio(directorio, anio):
+    return os.path.join(directorio, f"cedulas_{anio:04d}.db")
+
+
+def listar(directorio):
+    """[(año, ruta)] de los archivos terminados, del más reciente al más viejo"""
+    try:
+        nombres = os.listdir(directorio)
+    except FileNotFoundError:
+        return []
+    archivos = []
+    for nombre in nombres:
+        m = _NOMBRE.fullmatch(nombre)
+        if m:
+            archivos.append((int(m.group(1)), os.path.join(directorio, nombre)))
+    return sorted(archivos, reverse=True)
+
+
+def _crear(ruta):
+    conn = sqlite3.connect(ruta)
+    try:
+        for sentencia in _ESQUEMA:
+            conn.execute(sentencia)
+        try:
+            for sentencia in _ESQUEMA_FTS:
+                conn.execute(sentencia)
+        except sqlite3.OperationalError:
+            pass    # sin FTS5: el archivo se busca con LIKE
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _tiene_fts(conn, alias):
+    return conn.execute(f"SELECT 1 FROM {alias}.sqlite_master WHERE name = 'ciudadanos_fts'").fetchone() is not None
+
+
+def _condicion(limite, limite_sincronizados, incluir_pendientes):
+    """WHERE sobre main.ciudadanos de las filas que se pueden archivar"""
+    sincronizado = "main.ciudadanos.id NOT IN (SELECT ciudadano_id FROM main.sync_outbox)"
+    condicion = f"(main.ciudadanos.registrado < ? AND (? OR {sincronizado}))"
+    params = (limite, int(incluir_pendientes))
+    if limite_sincronizados is not None:
+        condicion = f"({condicion} OR (main.ciudadanos.registrado < ? AND {sincronizado}))"
+        params += (limite_sincronizados,)
+    return condicion, params
+
+
+# ============================================
+# ARCHIVAR
+# ============================================
+
+def archivar(gestor, directorio, limite, limite_sincronizados=None, incluir_pendientes=False,
+             tam_lote=FILAS_POR_TRANSACCION, cancelado=None):
+    """Mueve a los archivos por año las filas con registrado < `limite` (AAAAMMDD).
+
+    Las pendientes de sincronizar solo se archivan con `incluir_pendientes`
+    (sincronización deshabilitada) y siguen en sync_outbox: el envío las lee
+    del archivo (filas_por_id). Con `limite_sincronizados` las ya enviadas
+    se archivan antes. Primero se copian (y, si el archivo es
+    nuevo, se compacta con VACUUM INTO) y después se borran de la tabla
+    caliente las que siguen idénticas a su copia: una interrupción a mitad
+    deja filas repetidas, nunca perdidas, y la siguiente pasada termina.
+    Devuelve {año: filas movidas}.
+    """
+    condicion, params = _condicion(limite, limite_sincronizados, incluir_pendientes)
+    with gestor.lectura() as conn:
+        anios = [fila[0] for fila in conn.execute(
+            f"SELECT DISTINCT registrado / 10000 FROM main.ciudadanos WHERE {condicion}", params)]
+    os.makedirs(directorio, exist_ok=True)
+    movidas = {}
+    for anio in sorted(anios):
+        if cancelado is not None and cancelado():
+            break
+        final = ruta_anio(directorio, anio)
+        nuevo = not os.path.exists(final)
+        destino = final + ".parcial" if nuevo else final
+        if nuevo:
+            if os.path.exists(destino):
+                os.remove(destino)      # restos de una pasada interrumpida
+            _crear(destino)
+        with gestor.adjunta(destino, "archivo") as conn:
+            # Los códigos originales (crudos.py) viajan con su fila y sus diccionarios
+            crear_tablas_crudos(conn, "archivo")
+            conn.execute("INSERT OR IGNORE INTO archivo.crudos_diccionarios (id, datos) "
+                         "SELECT id, datos FROM main.crudos_diccionarios")
+            primero = _copiar(gestor, condicion, params + (anio,), tam_lote, cancelado)
+            if nuevo:
+                if _tiene_fts(conn, "archivo"):
+                    conn.execute("INSERT INTO archivo.ciudadanos_fts(ciudadanos_fts) VALUES ('optimize')")
+                conn.execute("VACUUM archivo INTO ?", (final,))
+        if nuevo:
+            os.remove(destino)
+        if primero is None:
+            continue
+        with gestor.adjunta(final, "archivo"):
+            movidas[anio] = _borrar_archivadas(gestor, primero, tam_lote)
+    return movidas
+
+
+def _copiar(gestor, condicion, params, tam_lote, cancelado):
+    """Copia por lotes las filas del año al archivo adjunto; devuelve el primer id o None"""
+    primero = None
+    ultimo = 0
+    while cancelado is None or not cancelado():
+        with gestor.escritura() as conn:
+            ids = [fila[0] for fila in conn.execute(
+                f"SELECT id FROM main.ciudadanos WHERE id > ? AND {condicion} "
+                f"AND registrado / 10000 = ? ORDER BY id LIMIT ?", (ultimo,) + params + (tam_lote,))]
+            if not ids:
+                break
+            rango = (ids[0], ids[-1])
+            # Copias viejas de filas que siguen calientes (una pasada anterior interrumpida)
+            conn.execute("DELETE FROM archivo.ciudadanos WHERE id IN "
+                         "(SELECT id FROM main.ciudadanos WHERE id BETWEEN ? AND ?)", rango)
+            conn.execute(
+                f"INSERT INTO archivo.ciudadanos ({_COLUMNAS_ARCHIVO}) SELECT {_COLUMNAS_ARCHIVO} "
+                f"FROM main.ciudadanos WHERE id BETWEEN ? AND ? AND {condicion} AND registrado / 10000 = ?",
+                rango + params)
+            conn.execute(
+                f"INSERT OR REPLACE INTO archivo.crudos ({_COLUMNAS_CRUDOS}) SELECT {_COLUMNAS_CRUDOS} "
+                f"FROM main.crudos JOIN archivo.ciudadanos a ON a.id = ciudadano_id "
+                f"WHERE ciudadano_id BETWEEN ? AND ?", rango)
+        primero = ids[0] if primero is None else primero
+        ultimo = ids[-1]
+    return primero
+
+
+def _borrar_archivadas(gestor, primero, tam_lote):
+    """Borra de la tabla caliente las filas con copia idéntica en el archivo adjunto"""
+    borradas = 0
+    ultimo = primero - 1
+    while True:
+        with gestor.escritura() as conn, borrado_sin_resumenes(conn):
+            ids = [fila[0] for fila in conn.execute(
+                "SELECT id FROM archivo.ciudadanos WHERE id > ? ORDER BY id LIMIT ?", (ultimo, tam_lote))]
+            if not ids:
+                break
+            rango = (ids[0], ids[-1])
+            borradas += conn.execute(
+                f"DELETE FROM main.ciudadanos WHERE id BETWEEN ? AND ? AND EXISTS "
+                f"(SELECT 1 FROM archivo.ciudadanos a WHERE a.id = main.ciudadanos.id AND {_IGUAL})",
+                rango).rowcount
+        ultimo = ids[-1]
+    return borradas
+
+
+# ============================================
+# CONSULTA
+# ============================================
+
+@contextmanager
+def adjuntos(conn, rutas):
+    """ATTACH de `rutas` como a0, a1... en una conexión sin transacción abierta"""
+    alias = []
+    try:
+        for i, ruta in enumerate(rutas):
+            conn.execute(f"ATTACH DATABASE ? AS a{i}", (ruta,))
+            alias.append(f"a{i}")
+        yield alias
+    finally:
+        for a in alias:
+            conn.execute(f"DETACH DATABASE {a}")
+
+
+def _grupos(rutas):
+    for inicio in range(0, len(rutas), ADJUNTOS_MAX):
+        yield rutas[inicio:inicio + ADJUNTOS_MAX]
+
+
+def buscar(conn, rutas, filtro, usar_fts=True):
+    """Filas (en el orden de COLUMNAS) de los archivos que cumplen `filtro`.
+
+    Omite los números que están en la tabla caliente y, si un número se
+    archivó más de una vez, deja el del archivo más reciente (`rutas` va
+    del más reciente al más viejo).
+    """
+    vistos = set()
+    filas = []
+    for grupo in _grupos(rutas):
+        with adjuntos(conn, grupo) as alias:
+            for a in alias:
+                where, params, _ = planificar(filtro, usar_fts=usar_fts and _tiene_fts(conn, a),
+                                              alias=f"{a}.ciudadanos", fts=f"{a}.ciudadanos_fts")
+                for fila in conn.execute(f"""
+                SELECT {COLUMNAS} FROM {a}.ciudadanos WHERE {where}
+                AND NOT EXISTS (SELECT 1 FROM main.ciudadanos c WHERE c.numero = {a}.ciudadanos.numero)
+                ORDER BY id
+                """, params):
+                    if fila[0] is None or fila[0] not in vistos:
+                        vistos.add(fila[0])
+                        filas.append(fila)
+    return filas
+
+
+def buscar_numero(conn, rutas, numero):
+    """Fila (en el orden de COLUMNAS) del archivo más reciente que tiene `numero`, o None"""
+    for grupo in _grupos(rutas):
+        with adjuntos(conn, grupo) as alias:
+            for a in alias:
+                fila = conn.execute(f"SELECT {COLUMNAS} FROM {a}.ciudadanos WHERE numero = ? "
+                                    f"ORDER BY id DESC LIMIT 1", (numero,)).fetchone()
+                if fila is not None:
+                    return fila
+    return None
+
+
+def filas_por_id(conn, rutas, ids):
+    """Filas (en el orden de COLUMNAS) de los archivos con esos ids, ordenadas por id.
+
+    Para el envío al servidor: un pendiente archivado con la sincronización
+    deshabilitada sigue en sync_outbox aunque ya no esté en ciudadanos.
+    """
+    faltan = set(ids)
+    encontradas = {}
+    for grupo in _grupos(rutas):
+        if not faltan:
+            break
+        with adjuntos(conn, grupo) as alias:
+            for a in alias:
+                for bloque in _bloques(faltan):
+                    for id_, *fila in conn.execute(
+                            f"SELECT id, {COLUMNAS} FROM {a}.ciudadanos "
+                            f"WHERE id IN ({','.join('?' * len(bloque))})", bloque):
+                        encontradas[id_] = tuple(fila)
+                faltan -= encontradas.keys()
+    return [encontradas[id_] for id_ in sorted(encontradas)]
+
+
+def reconstruir_resumenes_con_archivos(gestor, directorio):
+    """reconstruir_resumenes contando también las filas archivadas.
+
+    Con más de ADJUNTOS_MAX archivos los siguientes se suman en otras
+    transacciones; mientras tanto los totales se ven incompletos.
+    """
+    grupos = list(_grupos([ruta for _, ruta in listar(directorio)])) or [[]]
+    for n, grupo in enumerate(grupos):
+        with ExitStack() as pila:
+            alias = [f"a{i}" for i in range(len(grupo))]
+            for a, ruta in zip(alias, grupo):
+                pila.enter_context(gestor.adjunta(ruta, a))
+            with gestor.escritura() as conn:
+                if n == 0:
+                    reconstruir_resumenes(conn, alias)
+                else:
+                    for a in alias:
+                        sumar_a_resumenes(conn, f"{a}.ciudadanos")
+
+
+def tamano(directorio):
+    """(archivos, bytes) del directorio de archivo"""
+    archivos = listar(directorio)
+    return len(archivos), sum(os.path.getsize(ruta) for _, ruta in archivos)
+
+
+# ============================================
+# NÚMEROS ARCHIVADOS QUE SE VUELVEN A REGISTRAR
+# ============================================
+
+def numeros_archivados(gestor, directorio, numeros, recuperar=False):
+    """Números de `numeros` que no están en ciudadanos pero sí en un archivo.
+
+    UNIQUE(numero) solo cubre la tabla caliente: sin esta consulta un número
+    archivado se insertaría otra vez y las estadísticas contarían dos veces
+    a la persona. Con `recuperar` la copia más reciente vuelve a ciudadanos
+    (mismo id y fecha de alta, sin sumar a los resúmenes) para que el upsert
+    y las visitas la traten como a cualquier fila caliente. Se llama antes
+    de la transacción que inserta: ATTACH no cabe dentro de una.
+    """
+    archivos = listar(directorio)
+    pedidos = {n for n in numeros if n}
+    if not archivos or not pedidos:
+        return set()
+    with gestor.lectura() as conn:
+        pedidos -= _en_tabla(conn, "main.ciudadanos", pedidos)
+    encontrados = set()
+    for _, ruta in archivos:
+        if not pedidos:
+            break
+        with gestor.adjunta(ruta, "archivo"):
+            with gestor.escritura() as conn:
+                ids = {}
+                for numero, id_ in _copias(conn, pedidos):
+                    ids.setdefault(numero, id_)     # la copia más reciente del archivo
+                if recuperar and ids:
+                    _recuperar(conn, list(ids.values()))
+            if recuperar and ids:
+                # En otra transacción: una interrupción deja la fila repetida, no perdida
+                with gestor.escritura() as conn:
+                    _borrar_recuperadas(conn, list(ids.values()))
+        encontrados.update(ids)
+        pedidos -= ids.keys()
+    return encontrados
+
+
+def _bloques(valores):
+    valores = list(valores)
+    for inicio in range(0, len(valores), NUMEROS_POR_CONSULTA):
+        yield valores[inicio:inicio + NUMEROS_POR_CONSULTA]
+
+
+def _en_tabla(conn, tabla, numeros):
+    encontrados = set()
+    for bloque in _bloques(numeros):
+        encontrados.update(fila[0] for fila in conn.execute(
+            f"SELECT numero FROM {tabla} WHERE numero IN ({','.join('?' * len(bloque))})", bloque))
+    return encontrados
+
+
+def _copias(conn, numeros):
+    for bloque in _bloques(numeros):
+        yield from conn.execute(
+            f"SELECT numero, id FROM archivo.ciudadanos WHERE numero IN ({','.join('?' * len(bloque))}) "
+            f"ORDER BY id DESC", bloque)
+
+
+def _recuperar(conn, ids):
+    """Copia a main las filas `ids` del archivo adjunto con su código original"""
+    crear_tablas_crudos(conn, "archivo")     # archivos de antes de crudos.py
+    for bloque in _bloques(ids):
+        marcas = ",".join("?" * len(bloque))
+        with alta_sin_resumenes(conn):
+            conn.execute(f"INSERT INTO main.ciudadanos ({_COLUMNAS_ARCHIVO}) SELECT {_COLUMNAS_ARCHIVO} "
+                         f"FROM archivo.ciudadanos WHERE id IN ({marcas})", bloque)
+        conn.execute(f"INSERT OR REPLACE INTO main.crudos ({_COLUMNAS_CRUDOS}) SELECT {_COLUMNAS_CRUDOS} "
+                     f"FROM archivo.crudos WHERE ciudadano_id IN ({marcas})", bloque)
+        # Archivos de antes de id_diccionario pueden usar otros ids para sus diccionarios
+        for anterior, datos in conn.execute(
+                f"SELECT id, datos FROM archivo.crudos_diccionarios WHERE id IN "
+                f"(SELECT diccionario FROM archivo.crudos WHERE ciudadano_id IN ({marcas}))", bloque).fetchall():
+            nuevo = id_diccionario(datos)
+            conn.execute("INSERT OR IGNORE INTO main.crudos_diccionarios (id, datos) VALUES (?, ?)", (nuevo, datos))
+            if nuevo != anterior:
+                conn.execute(f"UPDATE main.crudos SET diccionario = ? WHERE diccionario = ? "
+                             f"AND ciudadano_id IN ({marcas})", (nuevo, anterior, *bloque))
+
+
+def _borrar_recuperadas(conn, ids):
+    for bloque in _bloques(ids):
+        # Solo las que ya están en ciudadanos
+        condicion = f"IN (SELECT id FROM main.ciudadanos WHERE id IN ({','.join('?' * len(bloque))}))"
+        conn.execute(f"DELETE FROM archivo.crudos WHERE ciudadano_id {condicion}", bloque)
+        conn.execute(f"DELETE FROM archivo.ciudadanos WHERE id {condicion}", bloque)
@@ -0,0 +1,353 @@
+"""
+Benchmarks del núcleo con datos sintéticos
+Mide parser, guardado, consultas, exportación y sincronización a 1k, 100k y 1M
+filas contra un servidor HTTP local; guarda JSON comparable entre versiones
+
+    python benchmark.py --salida bench_v2.json --comparar bench_v1.json
+"""
+
+import argparse
+import gzip
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import urlsplit
+
+import nucleo
+from datos_sinteticos import generar_codigos, generar_filas
+
+TAMANOS = (1_000, 100_000, 1_000_000)
+BLOQUE = 10_000            # códigos/filas generados fuera del cronómetro por vez
+FILAS_POR_LOTE = 1000      # guardar_lote_en_db
+INSERCIONES_SUELTAS = 1000
+REPETICIONES = 5
+TOLERANCIA = 0.25          # >25% más lento que la referencia cuenta como regresión
+
+
+# ============================================
+# SERVIDOR DE SINCRONIZACIÓN SIMULADO
+# ============================================
+
+class ServidorSimulado:
+    """Servidor HTTP local que acepta /api/sincronizar y /api/sincronizar/ndjson.
+
+    Cuenta registros y bytes recibidos; `latencia_ms` simula el viaje de red.
+    GET /api/cambios responde siempre una página vacía: no hay otros dispositivos.
+    """
+
+    def __init__(self, latencia_ms=0):
+        self.latencia = latencia_ms / 1000.0
+        self.registros = 0
+        self.lotes = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == "/api/sincronizar/ndjson":
+                    if self.headers.get("Content-Encoding") == "gzip":
+                        cuerpo_plano = gzip.decompress(cuerpo)
+                    else:
+                        cuerpo_plano = cuerpo
+                    n = cuerpo_plano.count(b"\n")
+                elif self.path == "/api/sincronizar":
+                    n = len(json.loads(cuerpo)["registros"])
+                else:
+                    self.send_error(404)
+                    return
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                with servidor._lock:
+                    servidor.registros += n
+                    servidor.lotes += 1
+                    servidor.bytes += len(cuerpo)
+                self._responder(b'{"ok": true}')
+
+            def do_GET(self):
+                if urlsplit(self.path).path != "/api/cambios":
+                    self.send_error(404)
+                    return
+                self._responder(b'{"registros": [], "hasta": 0, "hay_mas": false, "maximo": 0}')
+
+            def _responder(self, respuesta):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(respuesta)))
+                self.end_headers()
+                self.wfile.write(respuesta)
+
+            def log_message(self, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self._http.daemon_threads = True
+        self.puerto = self._http.server_address[1]
+        self._hilo = threading.Thread(target=self._http.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._http.shutdown()
+        self._http.server_close()
+
+
+# ============================================
+# MEDICIÓN
+# ============================================
+
+def _resultado(segundos, operaciones, **extra):
+    r = {
+        "segundos": round(segundos, 6),
+        "operaciones": operaciones,
+        "ops_s": round(operaciones / segundos, 1) if segundos else None,
+        "us_op": round(segundos / operaciones * 1e6, 3) if operaciones else None,
+    }
+    r.update(extra)
+    return r
+
+
+def _percentiles(tiempos):
+    tiempos = sorted(tiempos)
+    return {
+        "p50_ms": round(tiempos[len(tiempos) // 2] * 1000, 3),
+        "p95_ms": round(tiempos[int(len(tiempos) * 0.95)] * 1000, 3),
+    }
+
+
+def _bloques(iterable, tam):
+    iterador = iter(iterable)
+    while True:
+        bloque = list(islice(iterador, tam))
+        if not bloque:
+            return
+        yield bloque
+
+
+def medir_parser(n, semilla):
+    """parsear_datos sobre n códigos (80% por posiciones, 20% heurísticos)"""
+    total = 0.0
+    for bloque in _bloques(generar_codigos(n, semilla, proporcion_heuristica=0.2), BLOQUE):
+        codigos = [codigo for codigo, _ in bloque]
+        inicio = time.perf_counter()
+        for codigo in codigos:
+            nucleo.parsear_datos(codigo)
+        total += time.perf_counter() - inicio
+    return _resultado(total, n)
+
+
+def poblar(n, semilla):
+    """guardar_lote_en_db en transacciones de FILAS_POR_LOTE filas"""
+    total = 0.0
+    for bloque in _bloques(generar_filas(n, semilla), FILAS_POR_LOTE):
+        inicio = time.perf_counter()
+        nucleo.guardar_lote_en_db(bloque)
+        total += time.perf_counter() - inicio
+    return _resultado(total, n, filas_por_lote=FILAS_POR_LOTE)
+
+
+def medir_guardado_suelto(n, semilla):
+    """guardar_en_db (una transacción por registro) con la tabla ya en n filas"""
+    tiempos = []
+    for datos in generar_filas(INSERCIONES_SUELTAS, semilla + 1, inicio=n):
+        inicio = time.perf_counter()
+        nucleo.guardar_en_db(datos)
+        tiempos.append(time.perf_counter() - inicio)
+    return _resultado(sum(tiempos), len(tiempos), **_percentiles(tiempos))
+
+
+def medir_consulta(filtro, repeticiones=REPETICIONES):
+    tiempos = []
+    filas = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        filas = len(nucleo.obtener_registros(filtro))
+        tiempos.append(time.perf_counter() - inicio)
+    mediana = statistics.median(tiempos)
+    return _resultado(mediana, 1, filas=filas, **_percentiles(tiempos))
+
+
+def medir_exportacion():
+    inicio = time.perf_counter()
+    archivo, mensaje = nucleo.exportar_a_csv()
+    segundos = time.perf_counter() - inicio
+    if archivo is None:
+        raise RuntimeError(mensaje)
+    tamano = os.path.getsize(archivo)
+    os.remove(archivo)
+    with nucleo.get_db().lectura() as conn:
+        filas = conn.execute("SELECT COUNT(*) FROM ciudadanos").fetchone()[0]
+    return _resultado(segundos, filas, bytes=tamano)
+
+
+def medir_payload(formato, tam_lote=500):
+    """Lee y codifica todos los lotes pendientes sin enviarlos ni confirmarlos"""
+    from sincronizacion import leer_lote
+    from transporte_sync import TransporteSync
+
+    transporte = TransporteSync("http://127.0.0.1:9", formato=formato)
+    meta = {"dispositivo": "benchmark", "dispositivo_id": "0", "timestamp": ""}
+    registros = 0
+    tamano = 0
+    desde = 0
+    inicio = time.perf_counter()
+    with nucleo.get_db().lectura() as conn:
+        while True:
+            hasta, filas = leer_lote(conn, desde, tam_lote)
+            if hasta == desde:
+                break
+            paquete = transporte.codificar(dict(meta, lote_id="", desde_seq=desde + 1, hasta_seq=hasta), filas)
+            # Para JSON, requests serializa el dict al enviar: se cuenta aquí
+            cuerpo = paquete.cuerpo if formato == "ndjson" else json.dumps(paquete.cuerpo).encode()
+            registros += paquete.registros
+            tamano += len(cuerpo)
+            desde = hasta
+    segundos = time.perf_counter() - inicio
+    transporte.cerrar()
+    return _resultado(segundos, registros, bytes=tamano)
+
+
+def medir_sincronizacion(servidor, formato):
+    nucleo.guardar_config(dict(nucleo.cargar_config(), habilitado=True, servidor="127.0.0.1",
+                               puerto=servidor.puerto, formato_sync=formato))
+    pendientes = servidor.registros
+    inicio = time.perf_counter()
+    ok, mensaje = nucleo.sincronizar()
+    segundos = time.perf_counter() - inicio
+    if not ok:
+        raise RuntimeError(mensaje)
+    recibidos = servidor.registros - pendientes
+    return _resultado(segundos, recibidos, lotes=servidor.lotes, bytes=servidor.bytes)
+
+
+# ============================================
+# EJECUCIÓN
+# ============================================
+
+def _usar_directorio(directorio):
+    nucleo.cerrar_gestores()
+    os.environ["CEDULAS_DIR"] = directorio
+    nucleo.get_app_dir.cache_clear()
+    nucleo.guardar_config({"servidor": "", "puerto": 5000, "habilitado": False})
+    nucleo.init_db()
+
+
+def correr_tamano(n, semilla=0, sincronizar=True, latencia_ms=0, log=print):
+    directorio = tempfile.mkdtemp(prefix=f"bench_{n}_")
+    r = {}
+    try:
+        _usar_directorio(directorio)
+
+        def paso(nombre, funcion, *args):
+            log(f"  {nombre}...")
+            r[nombre] = funcion(*args)
+            log(f"    {r[nombre]}")
+
+        paso("parsear_datos", medir_parser, n, semilla)
+        paso("guardar_lote_en_db", poblar, n, semilla)
+        paso("guardar_en_db", medir_guardado_suelto, n, semilla)
+        paso("obtener_registros_todos", medir_consulta, None, 1 if n >= 1_000_000 else REPETICIONES)
+        paso("obtener_registros_numero", medir_consulta, "1000007")
+        paso("obtener_registros_nombre", medir_consulta, "castaño")
+        paso("obtener_registros_nombre_apellido", medir_consulta, "maria perez")
+        # La puntuación saca el filtro del índice y de FTS: recorrido completo con LIKE
+        paso("obtener_registros_like", medir_consulta, "perez,")
+        paso("exportar_a_csv", medir_exportacion)
+        paso("payload_sync_ndjson", medir_payload, "ndjson")
+        paso("payload_sync_json", medir_payload, "json")
+        if sincronizar:
+            with ServidorSimulado(latencia_ms) as servidor:
+                paso("sincronizar_ndjson", medir_sincronizacion, servidor, "ndjson")
+        r["db_bytes"] = os.path.getsize(os.path.join(directorio, "cedulas.db"))
+    finally:
+        nucleo.cerrar_gestores()
+        shutil.rmtree(directorio, ignore_errors=True)
+    return r
+
+
+def entorno():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def comparar(actual, referencia, tolerancia=TOLERANCIA):
+    """Lista de (tamaño, métrica, razón) con us_op peor que la referencia más la tolerancia"""
+    regresiones = []
+    for tamano, metricas in actual["resultados"].items():
+        base = referencia.get("resultados", {}).get(tamano, {})
+        for nombre, valor in metricas.items():
+            anterior = base.get(nombre)
+            if not isinstance(valor, dict) or not isinstance(anterior, dict):
+                continue
+            if not valor.get("us_op") or not anterior.get("us_op"):
+                continue
+            razon = valor["us_op"] / anterior["us_op"]
+            if razon > 1 + tolerancia:
+                regresiones.append((tamano, nombre, razon))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del núcleo con datos sintéticos")
+    parser.add_argument("--tamanos", default=",".join(str(t) for t in TAMANOS),
+                        help="filas separadas por coma (por defecto 1000,100000,1000000)")
+    parser.add_argument("--salida", default="benchmark.json")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--sin-sync", action="store_true", help="no levantar el servidor local")
+    parser.add_argument("--latencia-ms", type=int, default=0, help="latencia simulada del servidor")
+    args = parser.parse_args(argv)
+
+    def log(mensaje):
+        print(mensaje, file=sys.stderr, flush=True)
+
+    salida = {"entorno": entorno(), "resultados": {}}
+    for n in (int(t) for t in args.tamanos.split(",")):
+        log(f"{n} filas")
+        salida["resultados"][str(n)] = correr_tamano(n, args.semilla, not args.sin_sync,
+                                                      args.latencia_ms, log)
+    with open(args.salida, "w") as f:
+        json.dump(salida, f, indent=2)
+    log(f"Resultados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            referencia = json.load(f)
+        regresiones = comparar(salida, referencia, args.tolerancia)
+        for tamano, nombre, razon in regresiones:
+            log(f"REGRESIÓN {tamano} {nombre}: x{razon:.2f}")
+        if regresiones:
+            return 1
+        log("Sin regresiones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
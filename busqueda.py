@@ -0,0 +1,188 @@
+"""
+Planificador de búsqueda de registros
+Envía cada filtro al camino más barato: índice de numero, FTS5 o LIKE.
+También evalúa un filtro en memoria y guarda primeras páginas en una caché LRU
+"""
+
+import re
+import string
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from instrumentacion import contar
+
+
+def _limite_prefijo(prefijo):
+    """Menor cadena mayor que todas las que empiezan por `prefijo`"""
+    return prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+
+
+def _termino_fts(palabra):
+    return '"' + palabra.replace('"', '""') + '"*'
+
+
+def planificar(filtro, usar_fts=True, alias="ciudadanos", fts="ciudadanos_fts"):
+    """Devuelve (where_sql, params, camino) para filtrar la tabla ciudadanos.
+
+    - Solo dígitos: rango de prefijo sobre idx_ciudadanos_numero.
+    - Solo palabras: MATCH sobre ciudadanos_fts (prefijo por palabra, sin
+      mayúsculas ni tildes).
+    - Dígitos y palabras: ambas condiciones combinadas con AND.
+    - Cualquier otro caso (o sin FTS5): LIKE sobre las tres columnas.
+    `alias` y `fts` permiten filtrar la misma tabla en un archivo adjunto
+    (p. ej. "a0.ciudadanos" y "a0.ciudadanos_fts").
+    """
+    filtro = (filtro or "").strip()
+    if not filtro:
+        return "1", (), "todo"
+
+    tokens = filtro.split()
+    numeros = [t for t in tokens if t.isdigit()]
+    palabras = [t for t in tokens if t.isalpha()]
+
+    if len(numeros) + len(palabras) == len(tokens) and (usar_fts or not palabras):
+        condiciones = []
+        params = []
+        for numero in numeros:
+            condiciones.append(f"{alias}.numero >= ? AND {alias}.numero < ?")
+            params.extend((numero, _limite_prefijo(numero)))
+        if palabras:
+            condiciones.append(
+                f"{alias}.id IN (SELECT rowid FROM {fts} WHERE ciudadanos_fts MATCH ?)")
+            params.append(" ".join(_termino_fts(p) for p in palabras))
+        camino = "numero" if not palabras else ("fts" if not numeros else "numero+fts")
+        return " AND ".join(condiciones), tuple(params), camino
+
+    patron = f"%{filtro}%"
+    return (f"({alias}.numero LIKE ? OR {alias}.nombres LIKE ? OR {alias}.apellidos LIKE ?)",
+            (patron, patron, patron), "like")
+
+
+# ============================================
+# FILTRO EN MEMORIA
+# ============================================
+
+# LIKE de SQLite solo ignora mayúsculas en ASCII
+_ASCII_MINUSCULAS = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _fichas_fts(texto):
+    """Palabras como las indexa unicode61 remove_diacritics: sin tildes y en minúsculas"""
+    if not texto:
+        return []
+    sin_tildes = "".join(c for c in unicodedata.normalize("NFD", texto) if not unicodedata.combining(c))
+    return re.findall(r"[^\W_]+", sin_tildes.casefold())
+
+
+def _regex_like(filtro):
+    partes = filtro.translate(_ASCII_MINUSCULAS).split("%")
+    return re.compile(".*".join(".".join(map(re.escape, p.split("_"))) for p in partes), re.DOTALL)
+
+
+def predicado(filtro, usar_fts=True):
+    """Función (numero, nombres, apellidos) -> bool equivalente al WHERE de planificar"""
+    filtro = (filtro or "").strip()
+    _, _, camino = planificar(filtro, usar_fts=usar_fts)
+    if camino == "todo":
+        return lambda numero, nombres, apellidos: True
+
+    if camino == "like":
+        patron = _regex_like(filtro)
+
+        def coincide(numero, nombres, apellidos):
+            return any(v is not None and patron.search(v.translate(_ASCII_MINUSCULAS))
+                       for v in (numero, nombres, apellidos))
+        return coincide
+
+    tokens = filtro.split()
+    numeros = [t for t in tokens if t.isdigit()]
+    palabras = ["".join(_fichas_fts(t)) for t in tokens if t.isalpha()]
+
+    def coincide(numero, nombres, apellidos):
+        if not all((numero or "").startswith(n) for n in numeros):
+            return False
+        if not palabras:
+            return True
+        fichas = _fichas_fts(nombres) + _fichas_fts(apellidos)
+        return all(any(f.startswith(p) for f in fichas) for p in palabras)
+    return coincide
+
+
+def acota(corto, largo, usar_fts=True):
+    """True si todo lo que cumple `largo` cumple también `corto`.
+
+    Vale cuando `largo` extiende a `corto` y ambos van por LIKE o ambos por
+    numero/FTS: alargar un prefijo o agregar palabras solo quita filas.
+    """
+    corto = (corto or "").strip()
+    largo = (largo or "").strip()
+    if not corto:
+        return True
+    if not largo.startswith(corto):
+        return False
+    return (planificar(corto, usar_fts)[2] == "like") == (planificar(largo, usar_fts)[2] == "like")
+
+
+# ============================================
+# CACHÉ DE RESULTADOS
+# ============================================
+
+CAPACIDAD_CACHE = 32
+
+
+class CacheBusquedas:
+    """LRU de primeras páginas por (filtro, usar_fts).
+
+    Cada entrada es (filas, hay_mas). `invalidar()` la vacía y sube
+    `generacion`; una consulta que empezó antes de invalidar no se guarda, así
+    una lectura vieja no vuelve a entrar tras una escritura.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_CACHE):
+        self.capacidad = capacidad
+        self.generacion = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, filtro, usar_fts):
+        clave = ((filtro or "").strip(), usar_fts)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(clave)
+        contar("busqueda.cache_exacta")
+        return entrada
+
+    def ancestro(self, filtro, usar_fts):
+        """(filas, generacion) del filtro completo (sin más páginas) más largo
+        que acota a `filtro`, o None"""
+        filtro = (filtro or "").strip()
+        mejor = None
+        with self._lock:
+            for (corto, fts), (filas, hay_mas) in self._entradas.items():
+                if fts != usar_fts or hay_mas or (mejor is not None and len(corto) <= len(mejor[0])):
+                    continue
+                if acota(corto, filtro, usar_fts):
+                    mejor = (corto, filas)
+            if mejor is None:
+                return None
+            generacion = self.generacion
+        contar("busqueda.cache_acotada")
+        return mejor[1], generacion
+
+    def guardar(self, filtro, usar_fts, filas, hay_mas, generacion):
+        with self._lock:
+            if generacion != self.generacion:
+                return
+            clave = ((filtro or "").strip(), usar_fts)
+            self._entradas[clave] = (filas, hay_mas)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self):
+        with self._lock:
+            self.generacion += 1
+            self._entradas.clear()
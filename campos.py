@@ -0,0 +1,86 @@
+"""
+Campos de un ciudadano: columnas compactas en la DB y valores legibles fuera
+fecha_nacimiento es AAAAMMDD (INTEGER), sexo sigue ISO 5218 (1 M, 2 F) y el
+lugar de expedición se guarda como códigos DANE de departamento y municipio.
+Un valor que no encaja se guarda tal cual: como texto en la misma columna
+(SQLite lo permite) o, para el lugar, en lugar_texto
+"""
+
+import re
+
+import dane
+
+# Campos legibles: parser, diálogo, CSV y sincronización
+CAMPOS = ("numero", "nombres", "apellidos", "fecha_nacimiento", "sexo", "lugar_expedicion")
+# Columnas de ciudadanos en el mismo orden; legible() convierte de unas a otros
+COLUMNAS = "numero, nombres, apellidos, fecha_nacimiento, sexo, departamento, municipio, lugar_texto"
+
+# [0-9] y no \d: tiene que coincidir con los GLOB de la migración
+_FECHA = re.compile(r"([0-9]{4})-([0-9]{2})-([0-9]{2})")
+# "MMM-DD", como lo arman el parser y el decodificador por posiciones
+_LUGAR = re.compile(r"([0-9]{3})-([0-9]{2})")
+_SEXO_A_CODIGO = {"M": 1, "F": 2}
+_CODIGO_A_SEXO = {1: "M", 2: "F"}
+
+
+def fecha_a_columna(texto):
+    if not texto:
+        return None
+    m = _FECHA.fullmatch(texto)
+    return int(m.group(1) + m.group(2) + m.group(3)) if m else texto
+
+
+def fecha_legible(valor):
+    if isinstance(valor, int):
+        s = f"{valor:08d}"
+        return f"{s[0:4]}-{s[4:6]}-{s[6:8]}"
+    return valor or ""
+
+
+def sexo_a_columna(texto):
+    if not texto:
+        return None
+    return _SEXO_A_CODIGO.get(texto.upper(), texto)
+
+
+def sexo_legible(valor):
+    if valor is None:
+        return ""
+    return _CODIGO_A_SEXO.get(valor, valor)
+
+
+def lugar_a_columnas(texto):
+    """(departamento, municipio, lugar_texto) desde "MMM-DD" o un nombre de lugar_legible"""
+    if not texto:
+        return None, None, None
+    m = _LUGAR.fullmatch(texto)
+    if m:
+        return int(m.group(2)), int(m.group(1)), None
+    if texto[0].isalpha():
+        codigos = dane.codigos_de_nombre(texto)
+        if codigos is not None:
+            return codigos[0], codigos[1], None
+    return None, None, texto
+
+
+def lugar_legible(departamento, municipio, texto=None):
+    """Nombre DANE del lugar; si el código no está en la tabla, "MMM-DD" como antes"""
+    if texto is not None:
+        return texto
+    if departamento is None or municipio is None:
+        return ""
+    return dane.nombre_lugar(departamento, municipio) or f"{municipio:03d}-{departamento:02d}"
+
+
+def a_columnas(datos):
+    """Tupla en el orden de COLUMNAS para un dict con CAMPOS"""
+    return (datos["numero"], datos["nombres"], datos["apellidos"],
+            fecha_a_columna(datos["fecha_nacimiento"]), sexo_a_columna(datos["sexo"]),
+            *lugar_a_columnas(datos["lugar_expedicion"]))
+
+
+def legible(fila):
+    """Tupla en el orden de CAMPOS para una fila leída con COLUMNAS"""
+    numero, nombres, apellidos, fecha, sexo, departamento, municipio, texto = fila
+    return (numero, nombres, apellidos, fecha_legible(fecha), sexo_legible(sexo),
+            lugar_legible(departamento, municipio, texto))
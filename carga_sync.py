@@ -0,0 +1,225 @@
+"""
+Prueba de carga de la sincronización
+Simula N dispositivos que suben M registros cada uno, en paralelo, con el
+mismo transporte que usa la app (TransporteSync) y mide el rendimiento total
+y la latencia por lote (p50/p95/p99). Sin --servidor levanta servidor_sync.py
+en otro proceso sobre una DB temporal y verifica al final que no falte ni
+sobre ningún registro.
+
+    python carga_sync.py --dispositivos 20 --registros 5000 --reenvios 0.05
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from campos import CAMPOS
+from datos_sinteticos import generar_filas
+from sincronizacion import ErrorSinConexion, ErrorServidor
+from transporte_sync import TransporteSync
+
+ARRANQUE_S = 10
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def leer_estado(base_url):
+    """GET /api/estado del servidor de referencia"""
+    import requests
+
+    return requests.get(base_url + "/api/estado", timeout=10).json()
+
+
+@contextmanager
+def servidor_local(peticiones_por_transaccion=None):
+    """Lanza servidor_sync.py en otro proceso (no comparte el GIL con los clientes)"""
+    import requests
+
+    directorio = tempfile.mkdtemp(prefix="carga_sync_")
+    puerto = _puerto_libre()
+    comando = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "servidor_sync.py"),
+               "--db", os.path.join(directorio, "servidor.db"), "--host", "127.0.0.1", "--puerto", str(puerto)]
+    if peticiones_por_transaccion:
+        comando += ["--peticiones-por-transaccion", str(peticiones_por_transaccion)]
+    proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{puerto}"
+    try:
+        limite = time.monotonic() + ARRANQUE_S
+        while True:
+            try:
+                leer_estado(base_url)
+                break
+            except requests.ConnectionError:
+                if proceso.poll() is not None or time.monotonic() > limite:
+                    raise RuntimeError("El servidor de referencia no arrancó")
+                time.sleep(0.05)
+        yield base_url
+    finally:
+        proceso.terminate()
+        proceso.wait()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def preparar_dispositivo(indice, registros, tam_lote, formato, reenvios, rnd, corrida):
+    """Paquetes ya codificados de un dispositivo (fuera del cronómetro).
+
+    Con `reenvios` > 0 algunos lotes se repiten con el mismo lote_id, como
+    cuando la app no alcanza a leer la confirmación y reintenta.
+    """
+    transporte = TransporteSync("http://127.0.0.1:9", formato=formato)
+    dispositivo_id = f"{corrida}-{indice:04d}"
+    filas = [tuple(d[c] for c in CAMPOS) for d in generar_filas(registros, semilla=indice)]
+    paquetes = []
+    for desde in range(0, len(filas), tam_lote):
+        lote = filas[desde:desde + tam_lote]
+        meta = {
+            "dispositivo": f"carga-{indice}",
+            "dispositivo_id": dispositivo_id,
+            "timestamp": "",
+            "lote_id": f"{dispositivo_id}-{desde + 1}-{desde + len(lote)}",
+            "desde_seq": desde + 1,
+            "hasta_seq": desde + len(lote),
+        }
+        paquete = transporte.codificar(meta, iter(lote))
+        paquetes.append(paquete)
+        if rnd.random() < reenvios:
+            paquetes.append(paquete)
+    return paquetes
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))] if ordenadas else None
+
+
+def correr(base_url, dispositivos, registros, tam_lote=500, formato="ndjson", reenvios=0.0,
+           semilla=0, log=print):
+    rnd = random.Random(semilla)
+    corrida = uuid.uuid4().hex[:8]
+    log(f"Codificando {dispositivos} x {registros} registros ({formato})...")
+    trabajos = [preparar_dispositivo(i, registros, tam_lote, formato, reenvios, rnd, corrida)
+                for i in range(dispositivos)]
+
+    latencias = []
+    errores = []
+    registros_enviados = [0]
+    lock = threading.Lock()
+    salida = threading.Barrier(dispositivos + 1)
+
+    def dispositivo(paquetes):
+        transporte = TransporteSync(base_url, formato=formato, conexiones=1)
+        propias = []
+        enviados = 0
+        salida.wait()
+        try:
+            for paquete in paquetes:
+                inicio = time.perf_counter()
+                try:
+                    ok, _, mensaje = transporte.publicar(paquete)
+                except (ErrorSinConexion, ErrorServidor) as e:
+                    ok, mensaje = False, str(e)
+                propias.append(time.perf_counter() - inicio)
+                if ok:
+                    enviados += paquete.registros
+                else:
+                    with lock:
+                        errores.append(mensaje)
+        finally:
+            transporte.cerrar()
+            with lock:
+                latencias.extend(propias)
+                registros_enviados[0] += enviados
+
+    hilos = [threading.Thread(target=dispositivo, args=(p,), daemon=True) for p in trabajos]
+    for hilo in hilos:
+        hilo.start()
+    log("Enviando...")
+    salida.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    latencias.sort()
+    lotes = sum(len(p) for p in trabajos)
+    return {
+        "dispositivos": dispositivos,
+        "registros_por_dispositivo": registros,
+        "formato": formato,
+        "tam_lote": tam_lote,
+        "lotes": lotes,
+        "reenvios": lotes - sum(-(-registros // tam_lote) for _ in trabajos),
+        "errores": len(errores),
+        "primer_error": errores[0] if errores else None,
+        "segundos": round(segundos, 3),
+        "registros_s": round(registros_enviados[0] / segundos, 1) if segundos else None,
+        "lotes_s": round(len(latencias) / segundos, 1) if segundos else None,
+        "latencia_ms": {
+            nombre: round(_percentil(latencias, p) * 1000, 2) if latencias else None
+            for nombre, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor de sincronización")
+    parser.add_argument("--dispositivos", type=int, default=20)
+    parser.add_argument("--registros", type=int, default=5000, help="registros por dispositivo")
+    parser.add_argument("--tam-lote", type=int, default=500)
+    parser.add_argument("--formato", choices=("ndjson", "json"), default="ndjson")
+    parser.add_argument("--reenvios", type=float, default=0.0,
+                        help="proporción de lotes que se envían dos veces (0.05 = 5%%)")
+    parser.add_argument("--servidor", help="URL de un servidor ya levantado (sin esto se lanza uno local)")
+    parser.add_argument("--peticiones-por-transaccion", type=int,
+                        help="para el servidor local (por defecto el de servidor_sync.py)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="guardar el resultado en este JSON")
+    args = parser.parse_args(argv)
+
+    def log(mensaje):
+        print(mensaje, file=sys.stderr, flush=True)
+
+    def ejecutar(base_url, verificar):
+        antes = leer_estado(base_url)["registros"] if verificar else None
+        resultado = correr(base_url, args.dispositivos, args.registros, args.tam_lote,
+                           args.formato, args.reenvios, args.semilla, log)
+        if verificar:
+            estado = leer_estado(base_url)
+            resultado["servidor"] = {
+                "registros_nuevos": estado["registros"] - antes,
+                "esperados": args.dispositivos * args.registros,
+                "instrumentacion": estado.get("instrumentacion"),
+            }
+        return resultado
+
+    if args.servidor:
+        resultado = ejecutar(args.servidor.rstrip("/"), verificar=False)
+    else:
+        with servidor_local(args.peticiones_por_transaccion) as base_url:
+            resultado = ejecutar(base_url, verificar=True)
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+    servidor = resultado.get("servidor")
+    if resultado["errores"] or (servidor and servidor["registros_nuevos"] != servidor["esperados"]):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,12 @@
 """
 Inforeader Cédula - Versión Android con Kivy
 Adaptación de la aplicación de escritorio para dispositivos Android
+Solo la interfaz: la lógica vive en nucleo.py, que no depende de Kivy
 """
 
 import os
-import sqlite3
-import hashlib
-import csv
-import json
+import threading
+import time
 from datetime import datetime
 from functools import partial
 
@@ -18,297 +17,52 @@ from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 from kivy.uix.popup import Popup
-from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.spinner import Spinner
+from kivy.uix.scrollview import ScrollView
+from kivy.uix.camera import Camera
 from kivy.clock import Clock
 from kivy.properties import StringProperty, ObjectProperty
 from kivy.metrics import dp
 
-# Importaciones para cámara y códigos de barras
-try:
+# Nota: pyzbar/zxing-cpp no se empaquetan en el APK por tamaño; si están
+# instalados (escritorio) decodificacion_imagen los carga bajo demanda
+
+from nucleo import (ANDROID, get_app_dir, get_db, init_db, fts_disponible, cerrar_gestores, validar_usuario,
+                    guardar_en_db, guardar_lote_en_db, ids_por_numero, cargar_config,
+                    guardar_config, exportar_a_csv, sincronizar, parsear_datos,
+                    RegistroDuplicado, POLITICAS, POLITICA_DEFECTO, diagnostico,
+                    volcar_diagnostico, cache_busquedas, estadisticas, reconstruir_estadisticas,
+                    buscar_por_numero, obtener_registros, archivar_viejos, respaldar,
+                    respaldo_pendiente, listar_respaldos, restaurar_respaldo,
+                    entrenar_diccionario_crudos)
+from estadisticas import formatear as formatear_estadisticas
+import instrumentacion
+from instrumentacion import medido
+from paginacion import FuenteRegistros
+from duplicados import CacheEscaneosRecientes
+from escaneo_camara import TuberiaEscaneo, Fotograma
+from escritura_diferida import EscritorDiferido
+from exportacion import TrabajoExportacion
+from trabajador_sync import TrabajadorSync
+
+# Segundos que se esperan los reintentos del escritor diferido al pausar o salir
+ESPERA_ESCRITOR = 10
+
+
+def solicitar_permisos():
+    """Pide los permisos de Android al arrancar la app (no al importar el módulo)"""
+    if not ANDROID:
+        return
     from android.permissions import request_permissions, Permission
-    ANDROID = True
     request_permissions([
         Permission.CAMERA,
         Permission.WRITE_EXTERNAL_STORAGE,
         Permission.READ_EXTERNAL_STORAGE,
         Permission.INTERNET
     ])
-except ImportError:
-    ANDROID = False
-
-# Nota: pyzbar y opencv removidos para reducir tamaño del APK
-# La app usará solo el parser manual de códigos PDF417
-pyzbar_decode = None
-cv2 = None
-
-import requests
-
-# ============================================
-# FUNCIONES DE BASE DE DATOS (reutilizadas)
-# ============================================
-
-def get_app_dir():
-    """Directorio de la aplicación en Android o Desktop"""
-    if ANDROID:
-        from android.storage import app_storage_path
-        return app_storage_path()
-    return os.path.dirname(os.path.abspath(__file__))
-
-def get_db_path():
-    return os.path.join(get_app_dir(), "cedulas.db")
-
-def get_config_path():
-    return os.path.join(get_app_dir(), "config.json")
-
-def init_db():
-    conn = sqlite3.connect(get_db_path())
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS ciudadanos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        numero TEXT,
-        nombres TEXT,
-        apellidos TEXT,
-        fecha_nacimiento TEXT,
-        sexo TEXT,
-        lugar_expedicion TEXT
-    )
-    """)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS usuarios (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE,
-        password TEXT,
-        rol TEXT
-    )
-    """)
-    password_hash = hashlib.sha256("1234".encode()).hexdigest()
-    cursor.execute("INSERT OR IGNORE INTO usuarios (username, password, rol) VALUES (?, ?, ?)", 
-                   ("admin", password_hash, "admin"))
-    lector_hash = hashlib.sha256("lector".encode()).hexdigest()
-    cursor.execute("INSERT OR IGNORE INTO usuarios (username, password, rol) VALUES (?, ?, ?)", 
-                   ("lector", lector_hash, "lector"))
-    conn.commit()
-    conn.close()
-
-def validar_usuario(username, password):
-    conn = sqlite3.connect(get_db_path())
-    cursor = conn.cursor()
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
-    cursor.execute("SELECT rol FROM usuarios WHERE username=? AND password=?", (username, password_hash))
-    usuario = cursor.fetchone()
-    conn.close()
-    return usuario[0] if usuario else None
-
-def guardar_en_db(datos):
-    conn = sqlite3.connect(get_db_path())
-    cursor = conn.cursor()
-    cursor.execute("""
-    INSERT INTO ciudadanos (numero, nombres, apellidos, fecha_nacimiento, sexo, lugar_expedicion)
-    VALUES (?, ?, ?, ?, ?, ?)
-    """, (datos["numero"], datos["nombres"], datos["apellidos"],
-          datos["fecha_nacimiento"], datos["sexo"], datos["lugar_expedicion"]))
-    conn.commit()
-    conn.close()
-
-def obtener_registros(filtro=None):
-    conn = sqlite3.connect(get_db_path())
-    cursor = conn.cursor()
-    if filtro:
-        cursor.execute("""
-        SELECT numero, nombres, apellidos, fecha_nacimiento, sexo, lugar_expedicion
-        FROM ciudadanos
-        WHERE numero LIKE ? OR nombres LIKE ? OR apellidos LIKE ?
-        """, (f"%{filtro}%", f"%{filtro}%", f"%{filtro}%"))
-    else:
-        cursor.execute("SELECT numero, nombres, apellidos, fecha_nacimiento, sexo, lugar_expedicion FROM ciudadanos")
-    registros = cursor.fetchall()
-    conn.close()
-    return registros
-
-def cargar_config():
-    ruta = get_config_path()
-    if os.path.exists(ruta):
-        try:
-            with open(ruta, 'r') as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {"servidor": "", "puerto": 5000, "habilitado": False}
-
-def guardar_config(config):
-    ruta = get_config_path()
-    try:
-        with open(ruta, 'w') as f:
-            json.dump(config, f, indent=2)
-        return True
-    except Exception:
-        return False
-
-def exportar_a_csv(filtro=None):
-    try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        archivo = os.path.join(get_app_dir(), f"cedulas_export_{timestamp}.csv")
-        
-        registros = obtener_registros(filtro)
-        if not registros:
-            return None, "No hay registros para exportar"
-        
-        with open(archivo, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f, delimiter=',')
-            writer.writerow(["Número", "Nombres", "Apellidos", "Nacimiento", "Sexo", "Lugar Expedición"])
-            for registro in registros:
-                writer.writerow(registro)
-        
-        return archivo, f"Exportado {len(registros)} registros"
-    except Exception as e:
-        return None, f"Error exportando: {str(e)}"
-
-def sincronizar_con_servidor():
-    config = cargar_config()
-    if not config.get("habilitado"):
-        return False, "Sincronización deshabilitada"
-    
-    servidor = config.get("servidor", "").strip()
-    puerto = config.get("puerto", 5000)
-    if not servidor:
-        return False, "Servidor no configurado"
-    
-    try:
-        registros = obtener_registros()
-        if not registros:
-            return False, "No hay registros para sincronizar"
-        
-        datos = {
-            "dispositivo": "Android" if ANDROID else "Desktop",
-            "timestamp": datetime.now().isoformat(),
-            "registros": [
-                {
-                    "numero": r[0], "nombres": r[1], "apellidos": r[2],
-                    "fecha_nacimiento": r[3], "sexo": r[4], "lugar_expedicion": r[5]
-                }
-                for r in registros
-            ]
-        }
-        
-        url = f"http://{servidor}:{puerto}/api/sincronizar"
-        resp = requests.post(url, json=datos, timeout=10)
-        
-        if resp.status_code == 200:
-            return True, f"Sincronizados {len(registros)} registros"
-        else:
-            return False, f"Error servidor: {resp.status_code}"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-
-# ============================================
-# FUNCIONES PDF417 (reutilizadas)
-# ============================================
-
-def leer_pdf417_desde_imagen(imagen_path):
-    """
-    Lee código PDF417 desde archivo de imagen
-    Nota: En Android, opencv y pyzbar no están disponibles por tamaño.
-    Esta función retorna None y se debe usar entrada manual del código.
-    Para implementar lectura de imágenes, considera usar:
-    - ZXing nativo de Android (vía Pyjnius)
-    - Servicio web de decodificación
-    """
-    # Temporalmente deshabilitado para reducir tamaño de APK
-    # En producción, implementar con ZXing nativo o servicio web
-    return None
-
-def parsear_datos(data):
-    """Parser del código PDF417 colombiano (reutilizado del código original)"""
-    if not data:
-        return {
-            "numero": "",
-            "nombres": "",
-            "apellidos": "",
-            "fecha_nacimiento": "",
-            "sexo": "",
-            "lugar_expedicion": ""
-        }
-
-    s = data if isinstance(data, str) else data.decode("utf-8", errors="ignore")
-    
-    if "@" in s and len(s.split("@")) >= 4:
-        campos = [c.strip() for c in s.split("@")]
-        return {
-            "numero": campos[1] if len(campos) > 1 else "",
-            "nombres": campos[2] if len(campos) > 2 else "",
-            "apellidos": campos[3] if len(campos) > 3 else "",
-            "fecha_nacimiento": campos[4] if len(campos) > 4 else "",
-            "sexo": campos[5] if len(campos) > 5 else "",
-            "lugar_expedicion": campos[6] if len(campos) > 6 else ""
-        }
-
-    import re
-    patron_fecha = r'([MF])(\d{4})(\d{2})(\d{2})(\d{2})(\d{3})'
-    match = re.search(patron_fecha, s)
-    
-    if match:
-        genero = match.group(1)
-        year = match.group(2)
-        month = match.group(3)
-        day = match.group(4)
-        municipio = match.group(5)
-        departamento = match.group(6)
-        
-        prefijo = s[:match.start()]
-        numeros_candidatos = re.findall(r'\d{10,}', prefijo)
-        
-        documento = ""
-        if numeros_candidatos:
-            numeros_con_posicion = [(m.start(), m.group()) for m in re.finditer(r'\d{10,}', prefijo)]
-            if len(numeros_con_posicion) > 1:
-                documento = numeros_con_posicion[-1][1]
-            else:
-                documento = numeros_candidatos[-1]
-        
-        palabras_raw = re.findall(r'[A-Z]+', s)
-        palabras = []
-        for p in palabras_raw:
-            if len(p) >= 3 and p not in ["DSK", "PUB", "PUBDSK"]:
-                palabras.append(p)
-        
-        apellido1 = palabras[0] if len(palabras) > 0 else ""
-        apellido2 = palabras[1] if len(palabras) > 1 else ""
-        nombre1 = palabras[2] if len(palabras) > 2 else ""
-        nombre2 = palabras[3] if len(palabras) > 3 else ""
-        
-        apellidos = " ".join([p for p in [apellido1, apellido2] if p])
-        nombres = " ".join([p for p in [nombre1, nombre2] if p])
-        
-        fecha = ""
-        try:
-            y = int(year) if year.isdigit() else 0
-            m = int(month) if month.isdigit() else 0
-            d = int(day) if day.isdigit() else 0
-            if 1900 <= y <= 2100 and 1 <= m <= 12 and 1 <= d <= 31:
-                fecha = f"{year}-{month}-{day}"
-        except Exception:
-            pass
-        
-        return {
-            "numero": documento,
-            "nombres": nombres.title(),
-            "apellidos": apellidos.title(),
-            "fecha_nacimiento": fecha,
-            "sexo": "M" if genero.upper() == "M" else "F",
-            "lugar_expedicion": f"{departamento}-{municipio}".strip("-") if departamento or municipio else ""
-        }
-    
-    return {
-        "numero": "",
-        "nombres": "",
-        "apellidos": "",
-        "fecha_nacimiento": "",
-        "sexo": "",
-        "lugar_expedicion": ""
-    }
 
 # ============================================
 # PANTALLAS KIVY
@@ -378,6 +132,9 @@ class LoginScreen(Screen):
 
 class MainScreen(Screen):
     """Pantalla principal"""
+    ESPERA_BUSQUEDA = 0.3   # segundos sin teclear antes de buscar
+    ARCHIVADOS_MAX = 200    # filas del archivo que se muestran sin paginar
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.layout = BoxLayout(orientation='vertical', padding=dp(10), spacing=dp(10))
@@ -413,6 +170,8 @@ class MainScreen(Screen):
         self.btn_exportar = Button(text='📊 Exportar', background_color=(0.9, 0.6, 0.2, 1))
         self.btn_exportar.bind(on_press=self.exportar_csv)
         btn_layout.add_widget(self.btn_exportar)
+        self.exportacion = None
+        self.escaneos_recientes = CacheEscaneosRecientes()
         
         self.btn_sync = Button(text='🔄 Sincronizar', background_color=(0.6, 0.3, 0.9, 1))
         self.btn_sync.bind(on_press=self.sincronizar)
@@ -431,6 +190,10 @@ class MainScreen(Screen):
             multiline=False,
             size_hint_x=0.7
         )
+        self.search_input.bind(text=self._al_escribir_busqueda, on_text_validate=self.buscar)
+        self._busqueda_pendiente = None
+        self._busqueda_seq = 0
+        self._busqueda_en_curso = False
         search_layout.add_widget(self.search_input)
         btn_search = Button(text='🔍', size_hint_x=0.15)
         btn_search.bind(on_press=self.buscar)
@@ -440,12 +203,21 @@ class MainScreen(Screen):
         search_layout.add_widget(btn_clear)
         self.layout.add_widget(search_layout)
         
-        # Tabla de registros (ScrollView)
-        scroll = ScrollView(size_hint_y=0.49)
-        self.registros_layout = GridLayout(cols=1, spacing=dp(2), size_hint_y=None)
-        self.registros_layout.bind(minimum_height=self.registros_layout.setter('height'))
-        scroll.add_widget(self.registros_layout)
-        self.layout.add_widget(scroll)
+        # Tabla de registros (RecycleView: solo se crean los botones visibles)
+        self.fuente = FuenteRegistros(get_db, fts_disponible, cache=cache_busquedas)
+        self.registros_view = RecycleView(size_hint_y=0.49)
+        self.registros_view.viewclass = 'Button'
+        registros_layout = RecycleBoxLayout(
+            orientation='vertical',
+            spacing=dp(2),
+            default_size=(None, dp(40)),
+            default_size_hint=(1, None),
+            size_hint_y=None
+        )
+        registros_layout.bind(minimum_height=registros_layout.setter('height'))
+        self.registros_view.add_widget(registros_layout)
+        self.registros_view.bind(scroll_y=self._al_desplazar)
+        self.layout.add_widget(self.registros_view)
         
         # Estado
         self.status_label = Label(
@@ -481,6 +253,14 @@ class MainScreen(Screen):
             self.btn_config.disabled = True
         
         self.cargar_registros()
+        
+        # La sincronización automática corre en segundo plano si está habilitada
+        if cargar_config().get("habilitado"):
+            app.sync.iniciar()
+    
+    def mostrar_estado(self, mensaje):
+        """Actualiza status_label desde cualquier hilo"""
+        Clock.schedule_once(lambda dt: setattr(self.status_label, 'text', mensaje))
     
     def procesar_codigo(self, instance):
         """Procesar código escaneado"""
@@ -491,14 +271,39 @@ class MainScreen(Screen):
         
         datos = parsear_datos(codigo)
         self.scanner_input.text = ''
+        crudo = codigo
+        
+        if not datos.get('numero') and codigo.isdigit():
+            # Número tecleado a mano: se completa con el registro local o el
+            # descargado de otro punto (consulta por clave, sin red)
+            crudo = None
+            encontrado = buscar_por_numero(codigo)
+            if encontrado is None:
+                datos = dict(datos, numero=codigo)
+            else:
+                datos, origen = encontrado
+                self.status_label.text = {'remoto': 'Registrado en otro punto',
+                                          'archivo': 'Registrado aquí (archivado)'}.get(origen, 'Ya registrado aquí')
         
         if datos.get('numero'):
-            self.mostrar_dialogo_datos(datos, codigo)
+            if self.descartar_repetido(datos['numero']):
+                return
+            self.mostrar_dialogo_datos(datos, crudo)
         else:
             self.status_label.text = '✗ No se pudo parsear el código'
     
+    def descartar_repetido(self, numero):
+        """True si el mismo número se escaneó hace unos segundos (doble disparo)"""
+        hace = self.escaneos_recientes.repetido(numero)
+        if hace is None:
+            return False
+        self.status_label.text = f'Ya escaneado hace {hace:.0f} s: {numero}'
+        return True
+    
     def mostrar_dialogo_datos(self, datos, raw_data):
-        """Muestra popup con datos para confirmar"""
+        """Muestra popup con datos para confirmar.
+        raw_data (el código leído, o None si se tecleó el número) se guarda
+        comprimido junto al registro para poder re-parsearlo."""
         content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
         
         content.add_widget(Label(text='Datos Decodificados:', size_hint_y=0.1, bold=True))
@@ -528,9 +333,27 @@ class MainScreen(Screen):
             if not datos_editados.get('numero'):
                 self.status_label.text = '✗ Número requerido'
                 return
-            guardar_en_db(datos_editados)
+            if raw_data:
+                datos_editados['crudo'] = raw_data
+                # Lo corregido a mano no se pisa al re-parsear
+                datos_editados['editado'] = any(
+                    datos_editados[key] != str(datos.get(key, '')).strip() for key in campos)
+            app = App.get_running_app()
+            if app.escritor is not None:
+                # Escritura diferida: la lista se actualiza al confirmar el lote
+                app.escritor.encolar(datos_editados)
+                self.status_label.text = f'✓ En cola: {datos_editados["numero"]}'
+                popup.dismiss()
+                return
+            try:
+                rowid = guardar_en_db(datos_editados)
+            except RegistroDuplicado:
+                self.status_label.text = f'✗ Ya registrado: {datos_editados["numero"]}'
+                popup.dismiss()
+                return
             self.status_label.text = f'✓ Guardado: {datos_editados["numero"]}'
-            self.cargar_registros()
+            self.registro_guardado(rowid)
+            app.sync.notificar_cambio()
             popup.dismiss()
         
         btn_save = Button(text='💾 Guardar', background_color=(0.2, 0.8, 0.2, 1))
@@ -545,18 +368,81 @@ class MainScreen(Screen):
         popup.open()
     
     def abrir_camara(self, instance):
-        """TODO: Implementar captura con cámara"""
-        self.status_label.text = 'Cámara: en desarrollo'
-        # Nota: Requiere plyer o android.camera
+        """Escaneo continuo: la cámara alimenta la tubería y la decodificación va en otro hilo"""
+        tuberia = TuberiaEscaneo(parsear_datos, al_detectar=None)
+        if not tuberia.disponible:
+            self.status_label.text = 'Cámara: sin decodificador, usa entrada manual o scanner físico'
+            return
+        try:
+            camara = Camera(play=True, resolution=(1280, 720))
+        except Exception as e:
+            self.status_label.text = f'Cámara no disponible: {str(e)}'
+            return
+        
+        content = BoxLayout(orientation='vertical', spacing=dp(5))
+        content.add_widget(camara)
+        btn_cerrar = Button(text='❌ Cerrar', size_hint_y=0.12, background_color=(0.8, 0.2, 0.2, 1))
+        content.add_widget(btn_cerrar)
+        popup = Popup(title='Enfoca el código de la cédula', content=content, size_hint=(0.95, 0.9))
+        
+        def capturar(dt):
+            # Solo se lee la textura (costoso) cuando la tubería va a usarla
+            textura = camara.texture
+            if textura is None or not tuberia.quiere_fotograma():
+                return
+            ancho, alto = textura.size
+            tuberia.ofrecer(Fotograma(textura.pixels, ancho, alto, 'RGBA', time.monotonic()))
+        
+        evento = Clock.schedule_interval(capturar, 1 / 30.)
+        
+        def cerrar(*args):
+            evento.cancel()
+            tuberia.detener()
+            camara.play = False
+        
+        def al_detectar(datos, crudo, latencia_ms):
+            def mostrar(dt):
+                popup.dismiss()
+                if self.descartar_repetido(datos['numero']):
+                    return
+                self.status_label.text = f'✓ Leído en {int(latencia_ms)} ms'
+                self.mostrar_dialogo_datos(datos, crudo)
+            Clock.schedule_once(mostrar)
+        
+        tuberia.al_detectar = al_detectar
+        popup.bind(on_dismiss=cerrar)
+        btn_cerrar.bind(on_press=popup.dismiss)
+        popup.open()
+        tuberia.iniciar()
     
     def exportar_csv(self, instance):
+        # Un segundo toque mientras exporta cancela la exportación
+        if self.exportacion is not None and self.exportacion.activo:
+            self.exportacion.cancelar()
+            return
         filtro = self.search_input.text.strip() or None
-        archivo, mensaje = exportar_a_csv(filtro)
-        self.status_label.text = mensaje
+        
+        def al_terminar(archivo, mensaje):
+            def aplicar(dt):
+                self.exportacion = None
+                self.btn_exportar.text = '📊 Exportar'
+                self.status_label.text = mensaje
+            Clock.schedule_once(aplicar)
+        
+        self.exportacion = TrabajoExportacion(
+            partial(exportar_a_csv, filtro),
+            progreso=lambda total: self.mostrar_estado(f'Exportando... {total} registros'),
+            al_terminar=al_terminar
+        )
+        self.btn_exportar.text = '✖ Cancelar'
+        self.status_label.text = 'Exportando...'
+        self.exportacion.iniciar()
     
     def sincronizar(self, instance):
-        exito, mensaje = sincronizar_con_servidor()
-        self.status_label.text = mensaje
+        sync = App.get_running_app().sync
+        sync.iniciar()
+        sync.solicitar()
+        self.status_label.text = 'Sincronización solicitada...'
     
     def abrir_config(self, instance):
         """Abrir pantalla de configuración"""
@@ -569,36 +455,165 @@ class MainScreen(Screen):
         self.search_input.text = ''
         self.cargar_registros()
     
+    def _al_escribir_busqueda(self, instance, texto):
+        # Cada tecla reinicia la espera: solo se consulta al dejar de escribir
+        if self._busqueda_pendiente is not None:
+            self._busqueda_pendiente.cancel()
+        self._busqueda_pendiente = Clock.schedule_once(
+            lambda dt: self.cargar_registros(), self.ESPERA_BUSQUEDA)
+    
+    @staticmethod
+    def _fila_a_item(reg):
+        return {'text': f"{reg[1]} - {reg[2]} {reg[3]}", 'disabled': False}
+    
+    @medido("ui.cargar_registros")
     def cargar_registros(self):
-        """Carga registros en la lista"""
+        """Carga la primera página del filtro: desde la caché al instante, o consultando en otro hilo"""
+        if self._busqueda_pendiente is not None:
+            self._busqueda_pendiente.cancel()
+            self._busqueda_pendiente = None
         filtro = self.search_input.text.strip() or None
-        registros = obtener_registros(filtro)
+        self._busqueda_seq += 1
+        seq = self._busqueda_seq
+        
+        pagina = self.fuente.desde_cache(filtro)
+        if pagina is not None:
+            self._busqueda_en_curso = False
+            self._mostrar_pagina(pagina)
+            return
+        
+        self._busqueda_en_curso = True
         
-        self.registros_layout.clear_widgets()
+        def trabajo():
+            try:
+                pagina = self.fuente.consultar(filtro)
+            except Exception as e:
+                pagina = None
+                self.mostrar_estado(f'✗ Error buscando: {e}')
+            Clock.schedule_once(lambda dt: self._resultado_busqueda(seq, pagina))
+        threading.Thread(target=trabajo, name="busqueda", daemon=True).start()
+    
+    def _resultado_busqueda(self, seq, pagina):
+        # Si se lanzó otra búsqueda después, este resultado ya no corresponde al texto
+        if seq != self._busqueda_seq:
+            return
+        self._busqueda_en_curso = False
+        if pagina is not None:
+            self._mostrar_pagina(pagina)
+    
+    def _mostrar_pagina(self, pagina):
+        registros = self.fuente.aplicar(pagina)
         
         if not registros:
-            self.registros_layout.add_widget(Label(
-                text='No hay registros',
-                size_hint_y=None,
-                height=dp(40)
-            ))
+            self.registros_view.data = [{'text': 'No hay registros', 'disabled': True}]
+            filtro = self.search_input.text.strip()
+            if filtro:
+                self._buscar_en_archivo(filtro, self._busqueda_seq)
             return
         
-        for reg in registros:
-            texto = f"{reg[0]} - {reg[1]} {reg[2]}"
-            btn = Button(
-                text=texto,
-                size_hint_y=None,
-                height=dp(40), usando ZXing o plyer"""
-        self.status_label.text = 'Cámara: Usa entrada manual o scanner físico'
-        # Implementación futura:
-        # 1. Usar pyjnius para llamar ZXing de Android
-        # 2. O usar plyer.camera para capturar y enviar a servicio web
-        # 3. O implementar lector nativo con kivy-garden x
-            )
-            self.registros_layout.add_widget(btn)
+        self.registros_view.data = [self._fila_a_item(reg) for reg in registros]
+        self.registros_view.scroll_y = 1
+    
+    def _buscar_en_archivo(self, filtro, seq):
+        """Sin coincidencias en ciudadanos: consulta los archivos por año en otro hilo"""
+        def trabajo():
+            try:
+                filas = obtener_registros(filtro, remotos=False, archivados=True)
+            except Exception as e:
+                filas = []
+                self.mostrar_estado(f'✗ Error buscando en el archivo: {e}')
+            Clock.schedule_once(lambda dt: self._mostrar_archivados(seq, filas))
+        threading.Thread(target=trabajo, name="busqueda_archivo", daemon=True).start()
+    
+    def _mostrar_archivados(self, seq, filas):
+        # Solo lectura: las filas archivadas no están en la lista paginada
+        if seq != self._busqueda_seq or not filas:
+            return
+        self.registros_view.data = [{'text': f"{reg[0]} - {reg[1]} {reg[2]} (archivo)", 'disabled': True}
+                                    for reg in filas[:self.ARCHIVADOS_MAX]]
+        self.registros_view.scroll_y = 1
+    
+    def registro_guardado(self, rowid):
+        """Actualiza solo la fila afectada en vez de recargar la lista"""
+        if self._busqueda_en_curso:
+            # La consulta en vuelo pudo leer antes de esta escritura: se repite
+            self.cargar_registros()
+            return
+        cambio = self.fuente.registro_guardado(rowid)
+        if cambio is None:
+            return
+        data = self.registros_view.data
+        if cambio[0] == 'cambio':
+            data[cambio[1]] = self._fila_a_item(cambio[2])
+            return
+        _, fila, descartadas = cambio
+        if data and data[0].get('disabled'):
+            data.clear()
+        if descartadas:
+            del data[:descartadas]
+        data.append(self._fila_a_item(fila))
+    
+    def lote_guardado(self, lista):
+        """Llamado desde el hilo del escritor diferido al confirmar un lote"""
+        numeros = [d["numero"] for d in lista]
+        App.get_running_app().sync.notificar_cambio()
+        Clock.schedule_once(lambda dt: self._mostrar_guardados(numeros))
+    
+    def _mostrar_guardados(self, numeros):
+        for rowid in ids_por_numero(numeros):
+            self.registro_guardado(rowid)
+    
+    def lote_fallido(self, lista, error):
+        # El escritor conserva el lote y lo reintenta: esto solo avisa
+        self.mostrar_estado(f'✗ {len(lista)} registros sin guardar todavía, reintentando: {error}')
+    
+    def _alto_fila(self):
+        return dp(40) + dp(2)
+    
+    def _al_desplazar(self, instance, valor):
+        # Cerca del final o del inicio se pide la página contigua
+        if valor <= 0.05 and self.fuente.hay_siguiente:
+            self._cargar_pagina(adelante=True)
+        elif valor >= 0.95 and self.fuente.hay_anterior:
+            self._cargar_pagina(adelante=False)
+    
+    def _cargar_pagina(self, adelante):
+        rv = self.registros_view
+        data = rv.data
+        alto = self._alto_fila()
+        visible = rv.height
+        contenido = max(len(data) * alto, visible)
+        desplazado = (1 - rv.scroll_y) * max(contenido - visible, 0)
+        
+        if adelante:
+            nuevas, descartadas = self.fuente.avanzar()
+            if not nuevas:
+                return
+            if descartadas:
+                del data[:descartadas]
+            data.extend(self._fila_a_item(reg) for reg in nuevas)
+            desplazado -= descartadas * alto
+        else:
+            nuevas, descartadas = self.fuente.retroceder()
+            if not nuevas:
+                return
+            if descartadas:
+                del data[-descartadas:]
+            data[0:0] = [self._fila_a_item(reg) for reg in nuevas]
+            desplazado += len(nuevas) * alto
+        
+        # Mantener en pantalla las mismas filas tras mover la ventana
+        contenido = max(len(data) * alto, visible)
+        if contenido > visible:
+            rv.scroll_y = min(1, max(0, 1 - desplazado / (contenido - visible)))
     
     def logout(self, instance):
+        app = App.get_running_app()
+        if app.escritor is not None:
+            app.escritor.vaciar(ESPERA_ESCRITOR)
+        app.sync.detener()
+        if self.exportacion is not None:
+            self.exportacion.cancelar()
         self.manager.current = 'login'
 
 class ConfigScreen(Screen):
@@ -639,7 +654,18 @@ class ConfigScreen(Screen):
         hab_layout.add_widget(self.habilitado_spinner)
         layout.add_widget(hab_layout)
         
-        layout.add_widget(Label(size_hint_y=0.46))
+        # Política ante números repetidos
+        dup_layout = BoxLayout(orientation='horizontal', size_hint_y=0.08, spacing=dp(5))
+        dup_layout.add_widget(Label(text='Duplicados:', size_hint_x=0.3))
+        self.duplicados_spinner = Spinner(
+            text=POLITICA_DEFECTO,
+            values=POLITICAS,
+            size_hint_x=0.7
+        )
+        dup_layout.add_widget(self.duplicados_spinner)
+        layout.add_widget(dup_layout)
+        
+        layout.add_widget(Label(size_hint_y=0.38))
         
         # Botones
         btn_layout = BoxLayout(orientation='horizontal', size_hint_y=0.1, spacing=dp(10))
@@ -648,6 +674,18 @@ class ConfigScreen(Screen):
         btn_save.bind(on_press=self.guardar)
         btn_layout.add_widget(btn_save)
         
+        btn_diag = Button(text='📈 Diagnóstico', background_color=(0.3, 0.5, 0.8, 1))
+        btn_diag.bind(on_press=self.abrir_diagnostico)
+        btn_layout.add_widget(btn_diag)
+        
+        btn_stats = Button(text='📊 Estadísticas', background_color=(0.9, 0.6, 0.2, 1))
+        btn_stats.bind(on_press=self.abrir_estadisticas)
+        btn_layout.add_widget(btn_stats)
+        
+        btn_respaldos = Button(text='🗄 Respaldos', background_color=(0.2, 0.6, 0.6, 1))
+        btn_respaldos.bind(on_press=self.abrir_respaldos)
+        btn_layout.add_widget(btn_respaldos)
+        
         btn_back = Button(text='← Volver', background_color=(0.5, 0.5, 0.5, 1))
         btn_back.bind(on_press=self.volver)
         btn_layout.add_widget(btn_back)
@@ -665,21 +703,394 @@ class ConfigScreen(Screen):
         self.servidor_input.text = config.get('servidor', '')
         self.puerto_input.text = str(config.get('puerto', 5000))
         self.habilitado_spinner.text = 'Sí' if config.get('habilitado') else 'No'
+        self.duplicados_spinner.text = config.get('duplicados', POLITICA_DEFECTO)
     
     def guardar(self, instance):
-        config = {
+        # Se conservan las claves opcionales que no aparecen en esta pantalla
+        config = cargar_config()
+        config.update({
             'servidor': self.servidor_input.text.strip(),
             'puerto': int(self.puerto_input.text or '5000'),
-            'habilitado': self.habilitado_spinner.text == 'Sí'
-        }
+            'habilitado': self.habilitado_spinner.text == 'Sí',
+            'duplicados': self.duplicados_spinner.text
+        })
         if guardar_config(config):
             self.status_label.text = '✓ Guardado correctamente'
         else:
             self.status_label.text = '✗ Error al guardar'
     
+    def abrir_diagnostico(self, instance):
+        self.manager.current = 'diagnostico'
+    
+    def abrir_estadisticas(self, instance):
+        self.manager.current = 'estadisticas'
+    
+    def abrir_respaldos(self, instance):
+        self.manager.current = 'respaldos'
+    
     def volver(self, instance):
         self.manager.current = 'main'
 
+def _megas(n):
+    return f"{n / (1024 * 1024):.1f} MB"
+
+def formatear_diagnostico(datos):
+    """Texto de columnas fijas para la pantalla de diagnóstico"""
+    filas = datos["filas"]
+    sync = datos["sync"]
+    lineas = [
+        f"Registros: {filas.get('ciudadanos', 0)}   Visitas: {filas.get('visitas', 0)}",
+        f"Pendientes de sincronizar: {sync['pendientes']}",
+        f"Última sincronización: {sync['ultima'] or 'nunca'}",
+        f"DB: {_megas(datos['db_bytes'])} (+ WAL {_megas(datos['wal_bytes'])})",
+        f"Archivo: {datos['archivo']['archivos']} años, {_megas(datos['archivo']['bytes'])}",
+        f"Último respaldo: {datos['ultimo_respaldo'] or 'nunca'}",
+        "",
+    ]
+    medicion = datos["instrumentacion"]
+    if not medicion["metricas"]:
+        lineas.append("Sin mediciones" + ("" if medicion["activa"] else " (medición apagada)"))
+    else:
+        lineas.append(f"{'Operación':<26}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}")
+        for nombre, m in medicion["metricas"].items():
+            lineas.append(f"{nombre[:26]:<26}{m['n']:>6}{m['p50_ms']:>9.2f}{m['p95_ms']:>9.2f}")
+    for nombre, valor in medicion["contadores"].items():
+        lineas.append(f"{nombre}: {valor}")
+    return "\n".join(lineas)
+
+class DiagnosticoScreen(Screen):
+    """Latencias, tamaño de la base y cola de sincronización"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        layout = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(10))
+        
+        layout.add_widget(Label(
+            text='Diagnóstico',
+            size_hint_y=0.08,
+            font_size=dp(20),
+            bold=True
+        ))
+        
+        med_layout = BoxLayout(orientation='horizontal', size_hint_y=0.08, spacing=dp(5))
+        med_layout.add_widget(Label(text='Medición:', size_hint_x=0.3))
+        self.medicion_spinner = Spinner(text='No', values=('Sí', 'No'), size_hint_x=0.7)
+        self.medicion_spinner.bind(text=self.cambiar_medicion)
+        med_layout.add_widget(self.medicion_spinner)
+        layout.add_widget(med_layout)
+        
+        scroll = ScrollView(size_hint_y=0.58)
+        self.reporte_label = Label(
+            text='',
+            font_name='RobotoMono-Regular',
+            font_size=dp(12),
+            halign='left',
+            valign='top',
+            size_hint_y=None
+        )
+        self.reporte_label.bind(
+            width=lambda l, w: setattr(l, 'text_size', (w, None)),
+            texture_size=lambda l, t: setattr(l, 'height', t[1])
+        )
+        scroll.add_widget(self.reporte_label)
+        layout.add_widget(scroll)
+        
+        btn_layout = GridLayout(cols=2, size_hint_y=0.18, spacing=dp(5))
+        
+        btn_actualizar = Button(text='🔄 Actualizar', background_color=(0.2, 0.7, 0.3, 1))
+        btn_actualizar.bind(on_press=lambda *a: self.actualizar())
+        btn_layout.add_widget(btn_actualizar)
+        
+        btn_json = Button(text='💾 Exportar JSON', background_color=(0.9, 0.6, 0.2, 1))
+        btn_json.bind(on_press=self.exportar_json)
+        btn_layout.add_widget(btn_json)
+        
+        self.btn_perfil = Button(text='⏺ Perfil', background_color=(0.6, 0.3, 0.9, 1))
+        self.btn_perfil.bind(on_press=self.alternar_perfil)
+        btn_layout.add_widget(self.btn_perfil)
+        
+        btn_back = Button(text='← Volver', background_color=(0.5, 0.5, 0.5, 1))
+        btn_back.bind(on_press=self.volver)
+        btn_layout.add_widget(btn_back)
+        
+        layout.add_widget(btn_layout)
+        
+        self.status_label = Label(text='', size_hint_y=0.08, color=(0, 0.8, 0, 1))
+        layout.add_widget(self.status_label)
+        
+        self.add_widget(layout)
+    
+    def on_enter(self):
+        self.medicion_spinner.text = 'Sí' if instrumentacion.activa() else 'No'
+        self.actualizar()
+    
+    def actualizar(self):
+        """Los COUNT(*) pueden tardar con muchas filas: se calculan fuera de la UI"""
+        def trabajo():
+            try:
+                texto = formatear_diagnostico(diagnostico())
+            except Exception as e:
+                texto = f"Error: {e}"
+            Clock.schedule_once(lambda dt: setattr(self.reporte_label, 'text', texto))
+        threading.Thread(target=trabajo, name="diagnostico", daemon=True).start()
+    
+    def cambiar_medicion(self, spinner, texto):
+        activa = texto == 'Sí'
+        if activa == instrumentacion.activa():
+            return
+        instrumentacion.activar(activa)
+        guardar_config(dict(cargar_config(), diagnostico=activa))
+    
+    def exportar_json(self, instance):
+        try:
+            ruta = volcar_diagnostico()
+        except Exception as e:
+            self.status_label.text = f'✗ Error: {e}'
+            return
+        self.status_label.text = f'✓ {os.path.basename(ruta)}'
+    
+    def alternar_perfil(self, instance):
+        if not instrumentacion.perfil_activo():
+            instrumentacion.iniciar_perfil()
+            self.btn_perfil.text = '⏹ Detener perfil'
+            self.status_label.text = 'Perfilando el hilo de la interfaz...'
+            return
+        ruta = os.path.join(get_app_dir(), f"perfil_{datetime.now():%Y%m%d_%H%M%S}.prof")
+        instrumentacion.detener_perfil(ruta)
+        self.btn_perfil.text = '⏺ Perfil'
+        self.status_label.text = f'✓ {os.path.basename(ruta)} (+ .txt)'
+    
+    def volver(self, instance):
+        self.manager.current = 'config'
+
+class EstadisticasScreen(Screen):
+    """Totales por sexo, edad, lugar de expedición y día"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        layout = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(10))
+        
+        layout.add_widget(Label(
+            text='Estadísticas',
+            size_hint_y=0.08,
+            font_size=dp(20),
+            bold=True
+        ))
+        
+        scroll = ScrollView(size_hint_y=0.66)
+        self.reporte_label = Label(
+            text='',
+            font_name='RobotoMono-Regular',
+            font_size=dp(12),
+            halign='left',
+            valign='top',
+            size_hint_y=None
+        )
+        self.reporte_label.bind(
+            width=lambda l, w: setattr(l, 'text_size', (w, None)),
+            texture_size=lambda l, t: setattr(l, 'height', t[1])
+        )
+        scroll.add_widget(self.reporte_label)
+        layout.add_widget(scroll)
+        
+        btn_layout = BoxLayout(orientation='horizontal', size_hint_y=0.1, spacing=dp(10))
+        
+        btn_actualizar = Button(text='🔄 Actualizar', background_color=(0.2, 0.7, 0.3, 1))
+        btn_actualizar.bind(on_press=lambda *a: self.actualizar())
+        btn_layout.add_widget(btn_actualizar)
+        
+        self.btn_reconstruir = Button(text='🛠 Reconstruir', background_color=(0.6, 0.3, 0.9, 1))
+        self.btn_reconstruir.bind(on_press=self.reconstruir)
+        btn_layout.add_widget(self.btn_reconstruir)
+        
+        btn_back = Button(text='← Volver', background_color=(0.5, 0.5, 0.5, 1))
+        btn_back.bind(on_press=self.volver)
+        btn_layout.add_widget(btn_back)
+        
+        layout.add_widget(btn_layout)
+        
+        self.status_label = Label(text='', size_hint_y=0.08, color=(0, 0.8, 0, 1))
+        layout.add_widget(self.status_label)
+        
+        self.add_widget(layout)
+    
+    def on_enter(self):
+        self.actualizar()
+    
+    def actualizar(self):
+        """Leer los resúmenes es inmediato; la consulta va en un hilo como el resto"""
+        def trabajo():
+            try:
+                texto = formatear_estadisticas(estadisticas())
+            except Exception as e:
+                texto = f"Error: {e}"
+            Clock.schedule_once(lambda dt: setattr(self.reporte_label, 'text', texto))
+        threading.Thread(target=trabajo, name="estadisticas", daemon=True).start()
+    
+    def reconstruir(self, instance):
+        """Recorre todos los registros: solo tras una carga masiva o si los totales no cuadran"""
+        self.btn_reconstruir.disabled = True
+        self.status_label.text = 'Reconstruyendo...'
+        
+        def trabajo():
+            try:
+                reconstruir_estadisticas()
+                mensaje = '✓ Resúmenes reconstruidos'
+            except Exception as e:
+                mensaje = f'✗ Error: {e}'
+            
+            def terminar(dt):
+                self.btn_reconstruir.disabled = False
+                self.status_label.text = mensaje
+                self.actualizar()
+            Clock.schedule_once(terminar)
+        threading.Thread(target=trabajo, name="reconstruir_estadisticas", daemon=True).start()
+    
+    def volver(self, instance):
+        self.manager.current = 'config'
+
+class RespaldosScreen(Screen):
+    """Respaldos en caliente de la base y restauración de uno de ellos"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        layout = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(10))
+        
+        layout.add_widget(Label(
+            text='Respaldos',
+            size_hint_y=0.08,
+            font_size=dp(20),
+            bold=True
+        ))
+        
+        scroll = ScrollView(size_hint_y=0.56)
+        self.lista_label = Label(
+            text='',
+            font_name='RobotoMono-Regular',
+            font_size=dp(12),
+            halign='left',
+            valign='top',
+            size_hint_y=None
+        )
+        self.lista_label.bind(
+            width=lambda l, w: setattr(l, 'text_size', (w, None)),
+            texture_size=lambda l, t: setattr(l, 'height', t[1])
+        )
+        scroll.add_widget(self.lista_label)
+        layout.add_widget(scroll)
+        
+        sel_layout = BoxLayout(orientation='horizontal', size_hint_y=0.08, spacing=dp(5))
+        sel_layout.add_widget(Label(text='Respaldo:', size_hint_x=0.3))
+        self.respaldo_spinner = Spinner(text='', values=(), size_hint_x=0.7)
+        sel_layout.add_widget(self.respaldo_spinner)
+        layout.add_widget(sel_layout)
+        
+        btn_layout = BoxLayout(orientation='horizontal', size_hint_y=0.1, spacing=dp(10))
+        
+        self.btn_respaldar = Button(text='💾 Respaldar ahora', background_color=(0.2, 0.7, 0.3, 1))
+        self.btn_respaldar.bind(on_press=self.respaldar)
+        btn_layout.add_widget(self.btn_respaldar)
+        
+        self.btn_restaurar = Button(text='♻ Restaurar', background_color=(0.9, 0.3, 0.3, 1))
+        self.btn_restaurar.bind(on_press=self.confirmar_restaurar)
+        btn_layout.add_widget(self.btn_restaurar)
+        
+        btn_back = Button(text='← Volver', background_color=(0.5, 0.5, 0.5, 1))
+        btn_back.bind(on_press=self.volver)
+        btn_layout.add_widget(btn_back)
+        
+        layout.add_widget(btn_layout)
+        
+        self.status_label = Label(text='', size_hint_y=0.08, color=(0, 0.8, 0, 1))
+        layout.add_widget(self.status_label)
+        
+        self.add_widget(layout)
+        self._rutas = {}
+    
+    def on_enter(self):
+        self.actualizar()
+    
+    def actualizar(self):
+        respaldos = listar_respaldos()
+        # El nombre del archivo es único; la fecha al segundo no lo es
+        self._rutas = {os.path.basename(ruta): ruta for _, ruta, _ in respaldos}
+        self.lista_label.text = "\n".join(
+            f"{fecha:%Y-%m-%d %H:%M:%S}  {_megas(tamano):>9}  {os.path.basename(ruta)}"
+            for fecha, ruta, tamano in respaldos) or "Sin respaldos"
+        self.respaldo_spinner.values = list(self._rutas)
+        if self.respaldo_spinner.text not in self._rutas:
+            self.respaldo_spinner.text = next(iter(self._rutas), '')
+    
+    def _ocupado(self, ocupado, mensaje):
+        self.btn_respaldar.disabled = ocupado
+        self.btn_restaurar.disabled = ocupado
+        self.status_label.text = mensaje
+    
+    def respaldar(self, instance):
+        """La copia va por pasos en otro hilo: se puede seguir escaneando mientras tanto"""
+        self._ocupado(True, 'Respaldando...')
+        
+        def progreso(copiadas, total):
+            Clock.schedule_once(lambda dt: setattr(
+                self.status_label, 'text', f'Respaldando... {100 * copiadas // max(total, 1)}%'))
+        
+        def trabajo():
+            try:
+                ruta = respaldar(progreso=progreso)
+                mensaje = f'✓ {os.path.basename(ruta)}'
+            except Exception as e:
+                mensaje = f'✗ Error: {e}'
+            
+            def terminar(dt):
+                self._ocupado(False, mensaje)
+                self.actualizar()
+            Clock.schedule_once(terminar)
+        threading.Thread(target=trabajo, name="respaldo", daemon=True).start()
+    
+    def confirmar_restaurar(self, instance):
+        etiqueta = self.respaldo_spinner.text
+        ruta = self._rutas.get(etiqueta)
+        if ruta is None:
+            self.status_label.text = 'Elige un respaldo'
+            return
+        
+        content = BoxLayout(orientation='vertical', padding=dp(10), spacing=dp(10))
+        content.add_widget(Label(
+            text=f'Se reemplazará la base por el respaldo del {etiqueta}.\n'
+                 'La base actual se respalda antes.'
+        ))
+        botones = BoxLayout(orientation='horizontal', size_hint_y=0.3, spacing=dp(10))
+        btn_si = Button(text='Restaurar', background_color=(0.9, 0.3, 0.3, 1))
+        btn_no = Button(text='Cancelar', background_color=(0.5, 0.5, 0.5, 1))
+        botones.add_widget(btn_si)
+        botones.add_widget(btn_no)
+        content.add_widget(botones)
+        
+        popup = Popup(title='Restaurar respaldo', content=content, size_hint=(0.9, 0.5))
+        btn_si.bind(on_press=lambda *a: (popup.dismiss(), self.restaurar(ruta)))
+        btn_no.bind(on_press=popup.dismiss)
+        popup.open()
+    
+    def restaurar(self, ruta):
+        self._ocupado(True, 'Restaurando...')
+        app = App.get_running_app()
+        # Lo que espera en la cola de escritura va a la base actual (y a su respaldo)
+        if app.escritor is not None:
+            app.escritor.vaciar(ESPERA_ESCRITOR)
+        
+        def trabajo():
+            try:
+                previo = restaurar_respaldo(ruta)
+                mensaje = f'✓ Restaurado (la base anterior quedó en {os.path.basename(previo)})'
+            except Exception as e:
+                mensaje = f'✗ Error: {e}'
+            
+            def terminar(dt):
+                self._ocupado(False, mensaje)
+                self.actualizar()
+            Clock.schedule_once(terminar)
+        threading.Thread(target=trabajo, name="restaurar", daemon=True).start()
+    
+    def volver(self, instance):
+        self.manager.current = 'config'
+
 # ============================================
 # APLICACIÓN PRINCIPAL
 # ============================================
@@ -689,16 +1100,88 @@ class CedulasAndroidApp(App):
     current_username = StringProperty('')
     
     def build(self):
+        solicitar_permisos()
         # Inicializar base de datos
         init_db()
         
         # Crear screen manager
         sm = ScreenManager()
         sm.add_widget(LoginScreen(name='login'))
-        sm.add_widget(MainScreen(name='main'))
+        main = MainScreen(name='main')
+        sm.add_widget(main)
         sm.add_widget(ConfigScreen(name='config'))
+        sm.add_widget(DiagnosticoScreen(name='diagnostico'))
+        sm.add_widget(EstadisticasScreen(name='estadisticas'))
+        sm.add_widget(RespaldosScreen(name='respaldos'))
+        
+        config = cargar_config()
+        instrumentacion.activar(config.get("diagnostico", False))
+        self.sync = TrabajadorSync(
+            sincronizar,
+            al_estado=main.mostrar_estado,
+            intervalo=config.get("intervalo_sync", 300)
+        )
+        self.escritor = None
+        if config.get("escritura_diferida"):
+            self.escritor = EscritorDiferido(
+                guardar_lote_en_db,
+                max_lote=config.get("lote_escritura", 100),
+                max_espera_ms=config.get("espera_escritura_ms", 250),
+                al_guardar=main.lote_guardado,
+                al_error=main.lote_fallido,
+                reintentar=True
+            )
+        
+        # Archivar registros viejos y armar el diccionario de los códigos sin frenar el arranque
+        self._archivo_cancelado = threading.Event()
+        threading.Thread(target=self._mantenimiento, args=(main,), name="mantenimiento", daemon=True).start()
+        
+        # Respaldo programado: se revisa cada hora si ya toca
+        self._respaldo_cancelado = threading.Event()
+        self._hilo_respaldo = None
+        Clock.schedule_interval(lambda dt: self._respaldo_programado(main), 3600)
+        Clock.schedule_once(lambda dt: self._respaldo_programado(main), 60)
         
         return sm
+    
+    def _respaldo_programado(self, main):
+        if self._hilo_respaldo is not None and self._hilo_respaldo.is_alive():
+            return
+        if not respaldo_pendiente():
+            return
+        
+        def trabajo():
+            try:
+                respaldar(cancelado=self._respaldo_cancelado.is_set)
+            except Exception as e:
+                main.mostrar_estado(f'✗ Error en el respaldo: {e}')
+        self._hilo_respaldo = threading.Thread(target=trabajo, name="respaldo", daemon=True)
+        self._hilo_respaldo.start()
+    
+    def _mantenimiento(self, main):
+        try:
+            movidas = archivar_viejos(cancelado=self._archivo_cancelado.is_set)
+            entrenar_diccionario_crudos()
+        except Exception as e:
+            main.mostrar_estado(f'✗ Error en el mantenimiento: {e}')
+            return
+        if movidas:
+            main.mostrar_estado(f'Archivados {sum(movidas.values())} registros viejos')
+    
+    def on_pause(self):
+        # Escribir la cola y volcar el WAL antes de que Android pueda matar el proceso
+        if self.escritor is not None:
+            self.escritor.vaciar(ESPERA_ESCRITOR)
+        get_db().checkpoint()
+        return True
+    
+    def on_stop(self):
+        self._archivo_cancelado.set()
+        self._respaldo_cancelado.set()
+        if self.escritor is not None:
+            self.escritor.detener(ESPERA_ESCRITOR)
+        self.sync.detener(esperar=True)
+        cerrar_gestores()
 
 if __name__ == '__main__':
     CedulasAndroidApp().run()
@@ -0,0 +1,290 @@
+"""
+Código PDF417 original de cada registro, comprimido
+Se guarda junto al registro (tabla crudos) para volver a parsearlo cuando
+mejore el parser. Los códigos de una cédula y otra se parecen mucho, así
+que se comprimen con zlib usando como diccionario (zdict) una muestra de
+los propios códigos: ~480 bytes quedan en ~50. reparsear() pasa los
+guardados por el parser actual en un pool de procesos y corrige las filas
+que cambian
+
+    python crudos.py --db cedulas.db --reparsear --procesos 4 --simular
+    python crudos.py --db cedulas.db --entrenar
+"""
+
+import argparse
+import json
+import os
+import sys
+import zlib
+from itertools import tee
+
+from campos import CAMPOS, COLUMNAS, a_columnas, legible
+from db_esquema import id_diccionario
+
+NIVEL = 6
+MUESTRAS_DICCIONARIO = 200    # códigos guardados antes de armar el diccionario
+DICCIONARIO_MAX = 32 * 1024   # zlib solo mira los últimos 32 KiB del zdict
+FILAS_POR_TRANSACCION = 1000
+
+_diccionarios = {}            # id -> datos; el id sale del contenido (id_diccionario)
+
+_GUARDAR = """
+INSERT OR {conflicto} INTO crudos (ciudadano_id, diccionario, texto, editado, dato)
+SELECT id, ?, ?, ?, ? FROM ciudadanos WHERE numero = ?
+"""
+
+# Datos que llegan sin código (a mano, CSV) reemplazan los del parser
+_MARCAR_EDITADO = "UPDATE crudos SET editado = 1 WHERE ciudadano_id = (SELECT id FROM ciudadanos WHERE numero = ?)"
+
+_COLUMNAS_EDITABLES = [c for c in COLUMNAS.split(", ") if c != "numero"]
+# Solo si la fila sigue como se leyó: una edición o un reescaneo en medio ganan
+_ACTUALIZAR = (f"UPDATE ciudadanos SET {', '.join(f'{c} = ?' for c in _COLUMNAS_EDITABLES)} "
+               f"WHERE id = ? AND {' AND '.join(f'{c} IS ?' for c in COLUMNAS.split(', '))}")
+
+
+# ============================================
+# COMPRESIÓN
+# ============================================
+
+def _compresor(diccionario):
+    if diccionario:
+        return zlib.compressobj(NIVEL, zlib.DEFLATED, -15, zdict=diccionario)
+    return zlib.compressobj(NIVEL, zlib.DEFLATED, -15)
+
+
+def comprimir(crudo, diccionario=None):
+    """(texto, dato): deflate sin cabecera del código, como str o bytes"""
+    texto = isinstance(crudo, str)
+    datos = crudo.encode("utf-8", "surrogatepass") if texto else bytes(crudo)
+    compresor = _compresor(diccionario)
+    return texto, compresor.compress(datos) + compresor.flush()
+
+
+def descomprimir(texto, dato, diccionario=None):
+    """El código tal como llegó al parser (str o bytes)"""
+    if diccionario:
+        descompresor = zlib.decompressobj(-15, zdict=diccionario)
+    else:
+        descompresor = zlib.decompressobj(-15)
+    datos = descompresor.decompress(dato) + descompresor.flush()
+    return datos.decode("utf-8", "surrogatepass") if texto else datos
+
+
+def construir_diccionario(muestras):
+    """zdict con las muestras concatenadas; las últimas (más cerca del final) pesan más"""
+    partes = []
+    largo = 0
+    for muestra in reversed(muestras):
+        datos = muestra.encode("utf-8", "surrogatepass") if isinstance(muestra, str) else bytes(muestra)
+        if largo + len(datos) > DICCIONARIO_MAX:
+            break
+        partes.append(datos)
+        largo += len(datos)
+    return b"".join(reversed(partes))
+
+
+def diccionario(conn, id_dic):
+    if id_dic is None:
+        return None
+    datos = _diccionarios.get(id_dic)
+    if datos is None:
+        datos = conn.execute("SELECT datos FROM crudos_diccionarios WHERE id = ?", (id_dic,)).fetchone()[0]
+        _diccionarios[id_dic] = datos
+    return datos
+
+
+def vigente(conn):
+    """(id, datos) del diccionario más reciente o (None, None)"""
+    fila = conn.execute("SELECT id FROM crudos_diccionarios ORDER BY creado DESC LIMIT 1").fetchone()
+    if fila is None:
+        return None, None
+    return fila[0], diccionario(conn, fila[0])
+
+
+def entrenar(conn, muestras=MUESTRAS_DICCIONARIO, forzar=False):
+    """Crea un diccionario con los últimos códigos guardados; devuelve su id o None.
+
+    Sin `forzar` solo lo hace la primera vez y si ya hay `muestras` códigos.
+    Los guardados antes siguen con su diccionario (o sin ninguno).
+    """
+    if not forzar and conn.execute("SELECT 1 FROM crudos_diccionarios LIMIT 1").fetchone():
+        return None
+    filas = conn.execute("SELECT diccionario, texto, dato FROM crudos ORDER BY ciudadano_id DESC LIMIT ?",
+                         (muestras,)).fetchall()
+    if not filas or (not forzar and len(filas) < muestras):
+        return None
+    codigos = [_leer_guardado(conn, id_dic, texto, dato) for id_dic, texto, dato in reversed(filas)]
+    datos = construir_diccionario([c for c in codigos if c is not None])
+    id_nuevo = id_diccionario(datos)
+    # Si sale igual a uno anterior solo vuelve a ser el vigente
+    conn.execute("""
+    INSERT INTO crudos_diccionarios (id, datos, creado)
+    VALUES (?, ?, (SELECT COALESCE(MAX(creado), 0) + 1 FROM crudos_diccionarios))
+    ON CONFLICT (id) DO UPDATE SET creado = excluded.creado
+    """, (id_nuevo, datos))
+    return id_nuevo
+
+
+# ============================================
+# GUARDAR Y LEER
+# ============================================
+
+def guardar(conn, lista, reemplazar=True):
+    """Guarda el "crudo" de los dicts de `lista` en la fila de su número.
+
+    "editado" marca que los datos guardados no son los del parser; lo mismo
+    pasa con las filas reemplazadas por un dict sin "crudo". Con
+    `reemplazar` False (los repetidos se omitieron) no se toca lo que ya
+    tuviera la fila.
+    """
+    if reemplazar:
+        sin_codigo = [(d["numero"],) for d in lista if not d.get("crudo")]
+        if sin_codigo:
+            conn.executemany(_MARCAR_EDITADO, sin_codigo)
+    lista = [d for d in lista if d.get("crudo")]
+    if not lista:
+        return
+    id_vigente, datos_diccionario = vigente(conn)
+    sql = _GUARDAR.format(conflicto="REPLACE" if reemplazar else "IGNORE")
+    filas = []
+    for d in lista:
+        texto, dato = comprimir(d["crudo"], datos_diccionario)
+        filas.append((id_vigente, texto, int(bool(d.get("editado"))), dato, d["numero"]))
+    conn.executemany(sql, filas)
+
+
+def leer(conn, ciudadano_id):
+    """Código original de un registro o None"""
+    fila = conn.execute("SELECT diccionario, texto, dato FROM crudos WHERE ciudadano_id = ?",
+                        (ciudadano_id,)).fetchone()
+    if fila is None:
+        return None
+    return descomprimir(fila[1], fila[2], diccionario(conn, fila[0]))
+
+
+# ============================================
+# RE-PARSEO
+# ============================================
+
+def _leer_guardado(conn, id_dic, texto, dato):
+    try:
+        return descomprimir(texto, dato, diccionario(conn, id_dic))
+    except zlib.error:
+        return None     # dañado o comprimido con otro diccionario
+
+
+def _guardados(gestor, tam_pagina, cancelado):
+    """(id, columnas, código) de los registros con código y sin edición manual, por páginas.
+
+    El código es None si no se pudo descomprimir.
+    """
+    ultimo = 0
+    while cancelado is None or not cancelado():
+        with gestor.lectura() as conn:
+            filas = conn.execute(f"""
+            SELECT r.ciudadano_id, r.diccionario, r.texto, r.dato, {', '.join(f'c.{c}' for c in COLUMNAS.split(', '))}
+            FROM crudos r JOIN ciudadanos c ON c.id = r.ciudadano_id
+            WHERE r.ciudadano_id > ? AND r.editado = 0 ORDER BY r.ciudadano_id LIMIT ?
+            """, (ultimo, tam_pagina)).fetchall()
+            if not filas:
+                return
+            pagina = [(id_, tuple(columnas), _leer_guardado(conn, id_dic, texto, dato))
+                      for id_, id_dic, texto, dato, *columnas in filas]
+        yield from pagina
+        ultimo = filas[-1][0]
+
+
+def reparsear(gestor, procesos=None, aplicar=True, tam_lote=FILAS_POR_TRANSACCION,
+              progreso=None, cancelado=None):
+    """Vuelve a parsear los códigos guardados y corrige las filas que cambian.
+
+    El parseo va en `procesos` procesos (parsear_lote); las correcciones, en
+    transacciones de `tam_lote` filas. No se tocan los registros editados a
+    mano ni aquellos cuyo número cambia (es la clave con el servidor: solo
+    se informa).
+    Con `aplicar` False solo informa. Devuelve un dict con los totales y
+    cuántas veces cambió cada campo.
+    """
+    from parser_pdf417 import parsear_lote
+
+    informe = {"revisados": 0, "distintos": 0, "actualizados": 0, "sin_lectura": 0,
+               "campos": dict.fromkeys(CAMPOS, 0)}
+    pendientes = []
+
+    def escribir():
+        with gestor.escritura() as conn:
+            informe["actualizados"] += conn.executemany(_ACTUALIZAR, pendientes).rowcount
+        pendientes.clear()
+
+    guardados, codigos = tee(_guardados(gestor, tam_lote, cancelado))
+    # Los ilegibles pasan al parser como b"" para no desalinear las dos secuencias
+    entrada = (b"" if c is None else c for _, _, c in codigos)
+    for (id_, columnas, codigo), datos in zip(guardados, parsear_lote(entrada, procesos=procesos)):
+        informe["revisados"] += 1
+        if codigo is None or not datos.get("numero"):
+            informe["sin_lectura"] += 1
+            continue
+        nuevas = a_columnas(datos)
+        if nuevas == columnas:
+            continue
+        informe["distintos"] += 1
+        for campo, antes, despues in zip(CAMPOS, legible(columnas), legible(nuevas)):
+            if antes != despues:
+                informe["campos"][campo] += 1
+        if aplicar and nuevas[0] == columnas[0]:
+            pendientes.append((*nuevas[1:], id_, *columnas))
+            if len(pendientes) >= tam_lote:
+                escribir()
+        if progreso is not None and informe["revisados"] % tam_lote == 0:
+            progreso(informe["revisados"], informe["distintos"])
+    if pendientes:
+        escribir()
+    if progreso is not None:
+        progreso(informe["revisados"], informe["distintos"])
+    return informe
+
+
+def formatear(informe):
+    lineas = [f"Revisados: {informe['revisados']}   Distintos: {informe['distintos']}   "
+              f"Actualizados: {informe['actualizados']}   Sin lectura: {informe['sin_lectura']}"]
+    lineas.extend(f"  {campo:<20}{n:>8}" for campo, n in informe["campos"].items() if n)
+    if informe["campos"]["numero"]:
+        lineas.append("Los registros con otro número no se cambian: revisarlos a mano")
+    return "\n".join(lineas)
+
+
+def main(argv=None):
+    from db_conexion import GestorConexiones
+    from db_esquema import crear_esquema_base, migrar
+
+    parser = argparse.ArgumentParser(description="Re-parseo de los códigos PDF417 guardados")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "cedulas.db"))
+    parser.add_argument("--reparsear", action="store_true")
+    parser.add_argument("--simular", action="store_true", help="solo contar diferencias, sin escribir")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count())
+    parser.add_argument("--entrenar", action="store_true",
+                        help="crear un diccionario nuevo con los últimos códigos guardados")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    gestor = GestorConexiones(args.db)
+    try:
+        with gestor.escritura() as conn:
+            crear_esquema_base(conn)
+            migrar(conn)
+            if args.entrenar:
+                id_nuevo = entrenar(conn, forzar=True)
+                print(f"Diccionario {id_nuevo}" if id_nuevo else "No hay códigos guardados")
+        if args.reparsear:
+            informe = reparsear(gestor, procesos=args.procesos, aplicar=not args.simular,
+                                progreso=lambda n, d: print(f"\r{n} revisados, {d} distintos",
+                                                            end="", file=sys.stderr))
+            print(file=sys.stderr)
+            print(json.dumps(informe, indent=2, ensure_ascii=False) if args.json else formatear(informe))
+    finally:
+        gestor.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""
+Tabla DANE (DIVIPOLA) de departamentos y municipios
+Se lee de dane.json la primera vez que se pide un nombre y queda en memoria.
+El JSON trae todos los departamentos y los municipios principales; para la
+tabla completa basta con agregar entradas "DDMMM": "Nombre"
+"""
+
+import json
+import os
+from functools import lru_cache
+
+RUTA_TABLA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dane.json")
+
+
+@lru_cache(maxsize=None)
+def _tabla():
+    with open(RUTA_TABLA, encoding="utf-8") as f:
+        datos = json.load(f)
+    departamentos = {int(codigo): nombre for codigo, nombre in datos["departamentos"].items()}
+    municipios = {(int(codigo[:2]), int(codigo[2:])): nombre for codigo, nombre in datos["municipios"].items()}
+    return departamentos, municipios
+
+
+def departamento(codigo):
+    return _tabla()[0].get(codigo)
+
+
+@lru_cache(maxsize=4096)
+def nombre_lugar(departamento, municipio):
+    """'Municipio (Departamento)', o None si el código no está en la tabla"""
+    departamentos, municipios = _tabla()
+    dep = departamentos.get(departamento)
+    mun = municipios.get((departamento, municipio))
+    if dep is None or mun is None:
+        return None
+    return mun if mun == dep else f"{mun} ({dep})"
+
+
+@lru_cache(maxsize=None)
+def _por_nombre():
+    return {nombre_lugar(*codigo).casefold(): codigo for codigo in _tabla()[1]}
+
+
+def codigos_de_nombre(texto):
+    """(departamento, municipio) de un nombre producido por nombre_lugar, o None"""
+    return _por_nombre().get(texto.strip().casefold())
@@ -0,0 +1,128 @@
+"""
+Datos sintéticos de cédulas para benchmarks y pruebas de carga
+Personas aleatorias (reproducibles por semilla), sus códigos PDF417 crudos en
+el diseño por posiciones y en el formato que resuelve el parser heurístico
+"""
+
+import random
+
+from decodificador_cedula import DISENOS
+
+NOMBRES = (
+    "JUAN", "CARLOS", "ANDRES", "JOSE", "LUIS", "JORGE", "DIEGO", "MIGUEL", "DAVID", "SANTIAGO",
+    "MARIA", "ANA", "LUZ", "CLAUDIA", "SANDRA", "PAOLA", "DIANA", "LAURA", "CAROLINA", "VALENTINA",
+    "ALEJANDRO", "CAMILO", "FERNANDO", "GLORIA", "MARTHA", "NUBIA", "YOLANDA", "ESPERANZA",
+)
+APELLIDOS = (
+    "RODRIGUEZ", "GOMEZ", "GONZALEZ", "MARTINEZ", "GARCIA", "LOPEZ", "HERNANDEZ", "SANCHEZ",
+    "RAMIREZ", "PEREZ", "DIAZ", "MUÑOZ", "ROJAS", "MORENO", "JIMENEZ", "VARGAS", "CASTRO",
+    "ORTIZ", "RUIZ", "OSORIO", "CARDENAS", "QUINTERO", "CASTAÑO", "MEJIA", "ZAPATA", "VALENCIA",
+)
+# Códigos DANE de departamento (2 dígitos) presentes en la cédula
+DEPARTAMENTOS = (
+    "05", "08", "11", "13", "15", "17", "18", "19", "20", "23", "25", "27", "41", "44", "47",
+    "50", "52", "54", "63", "66", "68", "70", "73", "76", "81", "85", "86", "88", "91", "94",
+)
+GRUPOS_SANGUINEOS = ("O+", "O-", "A+", "A-", "B+", "AB+")
+
+LARGO_REGISTRO = 531
+_DISENO = DISENOS[0]
+
+
+def generar_persona(rnd, numero=None):
+    """Persona aleatoria con los campos en crudo (mayúsculas, sin formatear)"""
+    año = rnd.randint(1940, 2006)
+    return {
+        "numero": str(numero if numero is not None else rnd.randint(10 ** 6, 1_999_999_999)),
+        "apellido1": rnd.choice(APELLIDOS),
+        "apellido2": rnd.choice(APELLIDOS) if rnd.random() < 0.95 else "",
+        "nombre1": rnd.choice(NOMBRES),
+        "nombre2": rnd.choice(NOMBRES) if rnd.random() < 0.6 else "",
+        "sexo": rnd.choice("MF"),
+        "fecha": f"{año}{rnd.randint(1, 12):02d}{rnd.randint(1, 28):02d}",
+        "departamento": rnd.choice(DEPARTAMENTOS),
+        "municipio": f"{rnd.choice((1, 1, 1, 88, 147, 360, 615)):03d}",
+        "sangre": rnd.choice(GRUPOS_SANGUINEOS),
+    }
+
+
+def esperado(persona):
+    """dict que parsear_datos devuelve para el código por posiciones de `persona`.
+
+    Del código heurístico solo se garantiza el número: ese parser toma las
+    cuatro primeras palabras y pierde las letras fuera de A-Z.
+    """
+    f = persona["fecha"]
+    apellidos = " ".join(p for p in (persona["apellido1"], persona["apellido2"]) if p)
+    nombres = " ".join(p for p in (persona["nombre1"], persona["nombre2"]) if p)
+    return {
+        "numero": persona["numero"],
+        "nombres": nombres.title(),
+        "apellidos": apellidos.title(),
+        "fecha_nacimiento": f"{f[0:4]}-{f[4:6]}-{f[6:8]}",
+        "sexo": persona["sexo"],
+        "lugar_expedicion": f"{persona['municipio']}-{persona['departamento']}",
+    }
+
+
+def _poner(buf, rango, texto):
+    campo = texto.encode("latin-1")[:rango[1] - rango[0]]
+    buf[rango[0]:rango[0] + len(campo)] = campo
+
+
+def codigo_por_posiciones(persona, rnd):
+    """Registro crudo de ~530 bytes con el diseño cc_amarilla_v1, relleno con NUL"""
+    d = _DISENO
+    buf = bytearray(LARGO_REGISTRO)
+    cabecera = f"{rnd.randint(10 ** 9, 10 ** 10 - 1)}{rnd.randint(10 ** 7, 10 ** 8 - 1)}PubDSK_1"
+    _poner(buf, (0, d.numero[0]), cabecera)
+    _poner(buf, d.numero, persona["numero"].rjust(d.numero[1] - d.numero[0], "0"))
+    _poner(buf, d.apellido1, persona["apellido1"])
+    _poner(buf, d.apellido2, persona["apellido2"])
+    _poner(buf, d.nombre1, persona["nombre1"])
+    _poner(buf, d.nombre2, persona["nombre2"])
+    buf[d.sexo - 1] = ord("0")
+    buf[d.sexo] = ord(persona["sexo"])
+    _poner(buf, d.fecha, persona["fecha"])
+    _poner(buf, d.lugar_a, persona["departamento"])
+    _poner(buf, d.lugar_b, persona["municipio"])
+    _poner(buf, (d.lugar_b[1], d.lugar_b[1] + 2), persona["sangre"])
+    return bytes(buf)
+
+
+def codigo_heuristico(persona, rnd):
+    """Código en texto con separadores NUL, sin posiciones fijas (lo resuelve el parser heurístico).
+
+    El número va con 10 dígitos, como lo exige el parser para distinguirlo.
+    """
+    partes = [
+        f"{rnd.randint(10 ** 7, 10 ** 8 - 1)}PUBDSK{rnd.randint(0, 99)}",
+        f"{rnd.randint(10 ** 9, 10 ** 10 - 1)}",
+        f"{persona['numero'].rjust(10, '0')}{persona['apellido1']}",
+        persona["apellido2"] or "DE",
+        persona["nombre1"],
+        persona["nombre2"] or "NN",
+        f"0{persona['sexo']}{persona['fecha']}{persona['departamento']}"
+        f"{persona['municipio']}{persona['sangre']}",
+    ]
+    return "\x00".join(partes).encode("latin-1") + b"\x00\x00"
+
+
+def generar_codigos(n, semilla=0, proporcion_heuristica=0.0):
+    """Entrega (codigo_crudo, persona) para `n` personas con números únicos"""
+    rnd = random.Random(semilla)
+    base = 1_000_000_000
+    for i in range(n):
+        persona = generar_persona(rnd, numero=base + i * 7 + rnd.randint(0, 6))
+        if rnd.random() < proporcion_heuristica:
+            yield codigo_heuristico(persona, rnd), persona
+        else:
+            yield codigo_por_posiciones(persona, rnd), persona
+
+
+def generar_filas(n, semilla=0, inicio=0):
+    """Entrega `n` dicts listos para guardar_lote_en_db, con números únicos"""
+    rnd = random.Random(semilla)
+    for i in range(inicio, inicio + n):
+        persona = generar_persona(rnd, numero=1_000_000_000 + i * 7 + rnd.randint(0, 6))
+        yield esperado(persona)
@@ -0,0 +1,219 @@
+"""
+Gestor de conexiones SQLite compartidas
+Una conexión de escritura y un pool pequeño de conexiones de lectura en modo WAL
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Valores pensados para teléfonos de gama baja: caché y mmap moderados
+LECTORES_MAX = 3
+CACHE_KIB = 4096                  # PRAGMA cache_size (negativo = KiB)
+MMAP_BYTES = 32 * 1024 * 1024     # PRAGMA mmap_size
+BUSY_TIMEOUT_MS = 5000
+SENTENCIAS_EN_CACHE = 128         # sentencias preparadas por conexión
+CACHE_CARGA_KIB = 65536           # cache_size durante importaciones masivas
+
+
+class GestorConexiones:
+    """Mantiene viva una conexión de escritura y un pool de lectores sobre la misma DB.
+
+    La conexión de escritura está protegida por un RLock, por lo que las
+    transacciones pueden anidarse desde el mismo hilo. Las conexiones de lectura
+    se crean bajo demanda hasta `lectores` y se reutilizan entre hilos.
+    """
+
+    def __init__(self, ruta, lectores=LECTORES_MAX, cache_kib=CACHE_KIB, mmap_bytes=MMAP_BYTES):
+        self.ruta = ruta
+        self.cache_kib = cache_kib
+        self.mmap_bytes = mmap_bytes
+        self._lock_escritura = threading.RLock()
+        self._lock_pool = threading.Lock()
+        self._escritor = None
+        self._profundidad = 0
+        self._lectores = queue.LifoQueue()
+        self._lectores_max = max(1, lectores)
+        self._lectores_creados = 0
+        self._cerrado = False
+
+    def _abrir(self, solo_lectura=False):
+        conn = sqlite3.connect(
+            self.ruta,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=SENTENCIAS_EN_CACHE,
+        )
+        if not solo_lectura:
+            # journal_mode es persistente en el archivo; basta con fijarlo al escribir
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if solo_lectura:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _conexion_escritura(self):
+        if self._cerrado:
+            raise sqlite3.ProgrammingError("Gestor de conexiones cerrado")
+        if self._escritor is None:
+            self._escritor = self._abrir()
+        return self._escritor
+
+    @contextmanager
+    def escritura(self):
+        """Transacción de escritura (BEGIN IMMEDIATE ... COMMIT / ROLLBACK)"""
+        with self._lock_escritura:
+            conn = self._conexion_escritura()
+            externa = self._profundidad == 0
+            if externa:
+                conn.execute("BEGIN IMMEDIATE")
+            self._profundidad += 1
+            try:
+                yield conn
+            except BaseException:
+                self._profundidad -= 1
+                if externa:
+                    conn.execute("ROLLBACK")
+                raise
+            self._profundidad -= 1
+            if externa:
+                conn.execute("COMMIT")
+
+    @contextmanager
+    def carga_masiva(self, cache_kib=CACHE_CARGA_KIB):
+        """Pragmas de carga masiva para la conexión de escritura mientras dure el bloque.
+
+        synchronous=OFF deja de esperar al fsync: una caída del sistema puede
+        perder las últimas transacciones (no corromper la DB en WAL). Pensado
+        para importaciones que se pueden repetir, no para el uso normal.
+        """
+        with self._lock_escritura:
+            conn = self._conexion_escritura()
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(f"PRAGMA cache_size=-{int(cache_kib)}")
+            try:
+                yield self
+            finally:
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(f"PRAGMA cache_size=-{int(self.cache_kib)}")
+
+    @contextmanager
+    def adjunta(self, ruta, alias):
+        """ATTACH de otra base en la conexión de escritura mientras dure el bloque.
+
+        ATTACH no se admite dentro de una transacción: se abre antes de
+        escritura() y mantiene el bloqueo de escritura hasta el DETACH.
+        """
+        with self._lock_escritura:
+            if self._profundidad:
+                raise sqlite3.OperationalError("ATTACH dentro de una transacción")
+            conn = self._conexion_escritura()
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (ruta,))
+            try:
+                yield conn
+            finally:
+                conn.execute(f"DETACH DATABASE {alias}")
+
+    @contextmanager
+    def lectura(self):
+        """Presta una conexión de solo lectura del pool"""
+        conn = self._tomar_lector()
+        try:
+            yield conn
+        finally:
+            self._devolver_lector(conn)
+
+    def _tomar_lector(self):
+        if self._cerrado:
+            raise sqlite3.ProgrammingError("Gestor de conexiones cerrado")
+        try:
+            return self._lectores.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock_pool:
+            if self._lectores_creados < self._lectores_max:
+                self._lectores_creados += 1
+                crear = True
+            else:
+                crear = False
+        if crear:
+            try:
+                return self._abrir(solo_lectura=True)
+            except Exception:
+                with self._lock_pool:
+                    self._lectores_creados -= 1
+                raise
+        return self._lectores.get()
+
+    def _devolver_lector(self, conn):
+        if self._cerrado:
+            conn.close()
+            return
+        self._lectores.put(conn)
+
+    def checkpoint(self, modo="PASSIVE"):
+        """Vuelca el WAL al archivo principal (p. ej. al pausar la app)"""
+        with self._lock_escritura:
+            if self._escritor is not None and self._profundidad == 0:
+                self._escritor.execute(f"PRAGMA wal_checkpoint({modo})")
+
+    def vacuum(self):
+        """VACUUM fuera de toda transacción: devuelve al sistema las páginas libres"""
+        with self._lock_escritura:
+            if self._profundidad:
+                raise sqlite3.OperationalError("VACUUM dentro de una transacción")
+            self._conexion_escritura().execute("VACUUM")
+
+    def restaurar(self, origen):
+        """Reemplaza el contenido de la DB con el de la conexión `origen` (API de backup)"""
+        with self._lock_escritura:
+            if self._profundidad:
+                raise sqlite3.OperationalError("Restauración dentro de una transacción")
+            conn = self._conexion_escritura()
+            origen.backup(conn)
+            # La copia trae su propio modo de diario en la cabecera
+            conn.execute("PRAGMA journal_mode=WAL")
+
+    def cerrar(self):
+        """Cierra todas las conexiones; las prestadas se cierran al devolverse"""
+        self._cerrado = True
+        with self._lock_escritura:
+            if self._escritor is not None:
+                try:
+                    self._escritor.execute("PRAGMA optimize")
+                except sqlite3.Error:
+                    pass
+                self._escritor.close()
+                self._escritor = None
+        while True:
+            try:
+                self._lectores.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_gestores = {}
+_lock_gestores = threading.Lock()
+
+
+def obtener_gestor(ruta):
+    """Devuelve el gestor compartido para la ruta indicada (uno por archivo)"""
+    with _lock_gestores:
+        gestor = _gestores.get(ruta)
+        if gestor is None or gestor._cerrado:
+            gestor = GestorConexiones(ruta)
+            _gestores[ruta] = gestor
+        return gestor
+
+
+def cerrar_gestores():
+    with _lock_gestores:
+        for gestor in _gestores.values():
+            gestor.cerrar()
+        _gestores.clear()
@@ -0,0 +1,534 @@
+"""
+Esquema y migraciones de la base de datos de cédulas
+Las migraciones se aplican en orden y se registran en PRAGMA user_version
+"""
+
+import sqlite3
+from contextlib import contextmanager
+
+
+def crear_esquema_base(conn):
+    """Tablas originales de la app (idempotente)"""
+    import hashlib
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ciudadanos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT,
+        nombres TEXT,
+        apellidos TEXT,
+        fecha_nacimiento TEXT,
+        sexo TEXT,
+        lugar_expedicion TEXT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password TEXT,
+        rol TEXT
+    )
+    """)
+    password_hash = hashlib.sha256("1234".encode()).hexdigest()
+    conn.execute("INSERT OR IGNORE INTO usuarios (username, password, rol) VALUES (?, ?, ?)",
+                 ("admin", password_hash, "admin"))
+    lector_hash = hashlib.sha256("lector".encode()).hexdigest()
+    conn.execute("INSERT OR IGNORE INTO usuarios (username, password, rol) VALUES (?, ?, ?)",
+                 ("lector", lector_hash, "lector"))
+
+
+def tiene_tabla(conn, nombre):
+    fila = conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (nombre,)).fetchone()
+    return fila is not None
+
+
+# Claves de los resúmenes; {f} es el prefijo de la fila ("new.", "old." o "").
+# 0 es "sin dato", como el 0 de ISO 5218 para el sexo
+_CLAVE_SEXO = "CASE WHEN {f}sexo IN (1, 2) THEN {f}sexo ELSE 0 END"
+_CLAVE_LUGAR = "COALESCE({f}departamento, 0), COALESCE({f}municipio, 0)"
+_CLAVE_ANIO = "CASE WHEN typeof({f}fecha_nacimiento) = 'integer' THEN {f}fecha_nacimiento / 10000 ELSE 0 END"
+_HOY = "CAST(strftime('%Y%m%d', 'now', 'localtime') AS INTEGER)"
+
+
+def _resumenes_en_bloque(where, tabla="ciudadanos"):
+    """Sentencias que suman a los resúmenes las filas de `tabla` que cumplen `where`"""
+    return (
+        f"""INSERT INTO resumen_sexo (sexo, total)
+        SELECT {_CLAVE_SEXO.format(f="")}, COUNT(*) FROM {tabla} WHERE {where} GROUP BY 1
+        ON CONFLICT(sexo) DO UPDATE SET total = total + excluded.total""",
+        f"""INSERT INTO resumen_lugar (departamento, municipio, total)
+        SELECT {_CLAVE_LUGAR.format(f="")}, COUNT(*) FROM {tabla} WHERE {where} GROUP BY 1, 2
+        ON CONFLICT(departamento, municipio) DO UPDATE SET total = total + excluded.total""",
+        f"""INSERT INTO resumen_nacimiento (anio, total)
+        SELECT {_CLAVE_ANIO.format(f="")}, COUNT(*) FROM {tabla} WHERE {where} GROUP BY 1
+        ON CONFLICT(anio) DO UPDATE SET total = total + excluded.total""",
+    )
+
+
+# Disparadores AFTER INSERT de una fila que en cargas grandes conviene
+# reemplazar por INSERT ... SELECT sobre las filas nuevas (id > ?)
+_DISPARADORES_DIFERIBLES = {
+    "ciudadanos_fts_ai": ("""
+        INSERT INTO ciudadanos_fts(rowid, nombres, apellidos)
+        SELECT id, nombres, apellidos FROM ciudadanos WHERE id > ?""",),
+    "ciudadanos_outbox_ai": ("""
+        INSERT INTO sync_outbox (ciudadano_id) SELECT id FROM ciudadanos WHERE id > ? ORDER BY id""",),
+    "ciudadanos_resumen_ai": _resumenes_en_bloque("id > ?") + (f"""
+        INSERT INTO resumen_dia (dia, nuevos)
+        SELECT {_HOY}, COUNT(*) FROM ciudadanos WHERE id > ? GROUP BY 1
+        ON CONFLICT(dia) DO UPDATE SET nuevos = nuevos + excluded.nuevos""",),
+}
+
+
+@contextmanager
+def insercion_masiva(conn):
+    """Suspende los disparadores de inserción por fila y los aplica en bloque al salir.
+
+    Debe usarse dentro de una transacción: el DROP/CREATE TRIGGER es parte de
+    ella, así que un fallo a mitad deja los disparadores como estaban.
+    """
+    ultimo = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ciudadanos").fetchone()[0]
+    suspendidos = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name IN (%s)"
+        % ",".join("?" * len(_DISPARADORES_DIFERIBLES)), tuple(_DISPARADORES_DIFERIBLES)
+    ).fetchall()
+    for nombre, _ in suspendidos:
+        conn.execute(f"DROP TRIGGER {nombre}")
+    yield conn
+    for nombre, sql in suspendidos:
+        for sentencia in _DISPARADORES_DIFERIBLES[nombre]:
+            conn.execute(sentencia, (ultimo,))
+        conn.execute(sql)
+
+
+@contextmanager
+def _sin_disparador(conn, nombre):
+    fila = conn.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name=?", (nombre,)).fetchone()
+    if fila is not None:
+        conn.execute(f"DROP TRIGGER {nombre}")
+    yield conn
+    if fila is not None:
+        conn.execute(fila[0])
+
+
+def borrado_sin_resumenes(conn):
+    """Borrados de ciudadanos que no descuentan de los resúmenes.
+
+    Para filas que pasan a un archivo (archivo.py): siguen existiendo y las
+    estadísticas las cuentan. Igual que insercion_masiva, dentro de una transacción.
+    """
+    return _sin_disparador(conn, "ciudadanos_resumen_ad")
+
+
+def alta_sin_resumenes(conn):
+    """Inserciones en ciudadanos que no suman a los resúmenes.
+
+    Para filas que vuelven de un archivo: las estadísticas ya las contaban.
+    """
+    return _sin_disparador(conn, "ciudadanos_resumen_ai")
+
+
+# ============================================
+# MIGRACIONES
+# ============================================
+
+def _m001_indices_busqueda(conn):
+    """Índice B-tree sobre numero y tabla FTS5 sobre nombres/apellidos"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ciudadanos_numero ON ciudadanos(numero)")
+    try:
+        # remove_diacritics 2: 'Pérez', 'PEREZ' y 'perez' producen el mismo token
+        conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS ciudadanos_fts USING fts5(
+            nombres, apellidos,
+            content='ciudadanos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite compilado sin FTS5: la búsqueda usa el camino LIKE
+        return
+    _crear_disparadores_fts(conn)
+    # Indexar los registros que ya existían antes de la migración
+    conn.execute("INSERT INTO ciudadanos_fts(ciudadanos_fts) VALUES ('rebuild')")
+
+
+def _crear_disparadores_fts(conn):
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS ciudadanos_fts_ai AFTER INSERT ON ciudadanos BEGIN
+        INSERT INTO ciudadanos_fts(rowid, nombres, apellidos)
+        VALUES (new.id, new.nombres, new.apellidos);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS ciudadanos_fts_ad AFTER DELETE ON ciudadanos BEGIN
+        INSERT INTO ciudadanos_fts(ciudadanos_fts, rowid, nombres, apellidos)
+        VALUES ('delete', old.id, old.nombres, old.apellidos);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS ciudadanos_fts_au AFTER UPDATE OF nombres, apellidos ON ciudadanos BEGIN
+        INSERT INTO ciudadanos_fts(ciudadanos_fts, rowid, nombres, apellidos)
+        VALUES ('delete', old.id, old.nombres, old.apellidos);
+        INSERT INTO ciudadanos_fts(rowid, nombres, apellidos)
+        VALUES (new.id, new.nombres, new.apellidos);
+    END
+    """)
+
+
+def _m002_outbox_sincronizacion(conn):
+    """Cola de cambios pendientes de enviar al servidor y marca de agua"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sync_outbox (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        ciudadano_id INTEGER NOT NULL,
+        creado TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sync_estado (
+        clave TEXT PRIMARY KEY,
+        valor TEXT
+    )
+    """)
+    _crear_disparadores_outbox(conn)
+    # Los registros previos nunca tuvieron confirmación: se encolan una vez
+    conn.execute("INSERT INTO sync_outbox (ciudadano_id) SELECT id FROM ciudadanos ORDER BY id")
+
+
+def _crear_disparadores_outbox(conn):
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS ciudadanos_outbox_ai AFTER INSERT ON ciudadanos BEGIN
+        INSERT INTO sync_outbox (ciudadano_id) VALUES (new.id);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS ciudadanos_outbox_au AFTER UPDATE ON ciudadanos BEGIN
+        INSERT INTO sync_outbox (ciudadano_id) VALUES (new.id);
+    END
+    """)
+
+
+def _m003_numero_unico(conn):
+    """Un registro por número: fusiona duplicados y crea el índice UNIQUE"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS visitas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ciudadano_id INTEGER NOT NULL,
+        fecha TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_visitas_ciudadano ON visitas(ciudadano_id)")
+    # NULL no choca en un índice UNIQUE; '' sí
+    conn.execute("UPDATE ciudadanos SET numero = NULL WHERE numero = ''")
+    # Cada fila duplicada queda como visita (sin fecha conocida) del registro más reciente
+    conn.execute("""
+    INSERT INTO visitas (ciudadano_id, fecha)
+    SELECT k.id_final, NULL FROM ciudadanos c
+    JOIN (SELECT numero, MAX(id) AS id_final FROM ciudadanos
+          WHERE numero IS NOT NULL GROUP BY numero HAVING COUNT(*) > 1) k
+      ON c.numero = k.numero
+    """)
+    conn.execute("""
+    DELETE FROM ciudadanos WHERE numero IS NOT NULL AND id NOT IN
+        (SELECT MAX(id) FROM ciudadanos WHERE numero IS NOT NULL GROUP BY numero)
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_ciudadanos_numero")
+    conn.execute("CREATE UNIQUE INDEX idx_ciudadanos_numero ON ciudadanos(numero)")
+
+
+def _m004_esquema_compacto(conn):
+    """Fecha AAAAMMDD, sexo ISO 5218 y lugar en códigos DANE (ver campos.py).
+
+    SQLite no cambia tipos de columna: se reconstruye la tabla conservando los
+    id (outbox, visitas y FTS siguen apuntando a las mismas filas) y se
+    recrean índice y disparadores. Lo que no tiene el formato esperado se
+    conserva como texto, igual que campos.a_columnas.
+    """
+    fila = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'ciudadanos'").fetchone()
+    ultimo_id = fila[0] if fila else 0
+    conn.execute("""
+    CREATE TABLE ciudadanos_compacta (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT,
+        nombres TEXT,
+        apellidos TEXT,
+        fecha_nacimiento INTEGER,   -- AAAAMMDD
+        sexo INTEGER,               -- ISO 5218: 1 M, 2 F
+        departamento INTEGER,       -- DANE, 2 dígitos
+        municipio INTEGER,          -- DANE, 3 dígitos dentro del departamento
+        lugar_texto TEXT            -- solo si el lugar no vino como código
+    )
+    """)
+    conn.execute("""
+    INSERT INTO ciudadanos_compacta
+        (id, numero, nombres, apellidos, fecha_nacimiento, sexo, departamento, municipio, lugar_texto)
+    SELECT id, numero, nombres, apellidos,
+        CASE WHEN fecha_nacimiento GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+             THEN CAST(substr(fecha_nacimiento, 1, 4) || substr(fecha_nacimiento, 6, 2)
+                       || substr(fecha_nacimiento, 9, 2) AS INTEGER)
+             ELSE NULLIF(fecha_nacimiento, '') END,
+        CASE upper(sexo) WHEN 'M' THEN 1 WHEN 'F' THEN 2 ELSE NULLIF(sexo, '') END,
+        CASE WHEN lugar_expedicion GLOB '[0-9][0-9][0-9]-[0-9][0-9]'
+             THEN CAST(substr(lugar_expedicion, 5, 2) AS INTEGER) END,
+        CASE WHEN lugar_expedicion GLOB '[0-9][0-9][0-9]-[0-9][0-9]'
+             THEN CAST(substr(lugar_expedicion, 1, 3) AS INTEGER) END,
+        CASE WHEN lugar_expedicion GLOB '[0-9][0-9][0-9]-[0-9][0-9]'
+             THEN NULL ELSE NULLIF(lugar_expedicion, '') END
+    FROM ciudadanos ORDER BY id
+    """)
+    conn.execute("DROP TABLE ciudadanos")
+    conn.execute("ALTER TABLE ciudadanos_compacta RENAME TO ciudadanos")
+    # Que AUTOINCREMENT no reutilice ids de filas borradas antes de la migración
+    if ultimo_id and not conn.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'ciudadanos'", (ultimo_id,)).rowcount:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('ciudadanos', ?)", (ultimo_id,))
+    conn.execute("CREATE UNIQUE INDEX idx_ciudadanos_numero ON ciudadanos(numero)")
+    if tiene_tabla(conn, "ciudadanos_fts"):
+        _crear_disparadores_fts(conn)
+    _crear_disparadores_outbox(conn)
+
+
+def _m005_resumenes(conn):
+    """Totales por sexo, lugar, año de nacimiento y día que mantienen los disparadores.
+
+    Leerlos cuesta lo mismo con mil registros que con un millón: las tablas
+    tienen una fila por clave, no por ciudadano.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS resumen_sexo (
+        sexo INTEGER PRIMARY KEY,       -- ISO 5218; 0 sin dato
+        total INTEGER NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS resumen_lugar (
+        departamento INTEGER,           -- DANE; 0 sin código
+        municipio INTEGER,
+        total INTEGER NOT NULL,
+        PRIMARY KEY (departamento, municipio)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS resumen_nacimiento (
+        anio INTEGER PRIMARY KEY,       -- 0 sin fecha
+        total INTEGER NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS resumen_dia (
+        dia INTEGER PRIMARY KEY,        -- AAAAMMDD, hora local
+        nuevos INTEGER NOT NULL DEFAULT 0,
+        visitas INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    _crear_disparadores_resumen(conn)
+    reconstruir_resumenes(conn)
+
+
+def _crear_disparadores_resumen(conn):
+    def sumar(f):
+        return f"""
+        INSERT INTO resumen_sexo (sexo, total) VALUES ({_CLAVE_SEXO.format(f=f)}, 1)
+            ON CONFLICT(sexo) DO UPDATE SET total = total + 1;
+        INSERT INTO resumen_lugar (departamento, municipio, total) VALUES ({_CLAVE_LUGAR.format(f=f)}, 1)
+            ON CONFLICT(departamento, municipio) DO UPDATE SET total = total + 1;
+        INSERT INTO resumen_nacimiento (anio, total) VALUES ({_CLAVE_ANIO.format(f=f)}, 1)
+            ON CONFLICT(anio) DO UPDATE SET total = total + 1;"""
+
+    def restar(f):
+        return f"""
+        UPDATE resumen_sexo SET total = total - 1 WHERE sexo = {_CLAVE_SEXO.format(f=f)};
+        UPDATE resumen_lugar SET total = total - 1
+            WHERE (departamento, municipio) = ({_CLAVE_LUGAR.format(f=f)});
+        UPDATE resumen_nacimiento SET total = total - 1 WHERE anio = {_CLAVE_ANIO.format(f=f)};"""
+
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS ciudadanos_resumen_ai AFTER INSERT ON ciudadanos BEGIN{sumar("new.")}
+        INSERT INTO resumen_dia (dia, nuevos) VALUES ({_HOY}, 1)
+            ON CONFLICT(dia) DO UPDATE SET nuevos = nuevos + 1;
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS ciudadanos_resumen_ad AFTER DELETE ON ciudadanos BEGIN{restar("old.")}
+    END
+    """)
+    # El upsert reescribe todas las columnas: solo cuenta si alguna clave cambió
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS ciudadanos_resumen_au
+    AFTER UPDATE OF fecha_nacimiento, sexo, departamento, municipio ON ciudadanos
+    WHEN old.fecha_nacimiento IS NOT new.fecha_nacimiento OR old.sexo IS NOT new.sexo
+        OR old.departamento IS NOT new.departamento OR old.municipio IS NOT new.municipio
+    BEGIN{restar("old.")}{sumar("new.")}
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS visitas_resumen_ai AFTER INSERT ON visitas
+    WHEN new.fecha IS NOT NULL BEGIN
+        INSERT INTO resumen_dia (dia, visitas)
+        VALUES (CAST(strftime('%Y%m%d', new.fecha, 'localtime') AS INTEGER), 1)
+            ON CONFLICT(dia) DO UPDATE SET visitas = visitas + 1;
+    END
+    """)
+
+
+def sumar_a_resumenes(conn, tabla):
+    """Suma a los resúmenes todas las filas de `tabla` (p. ej. la de un archivo adjunto)"""
+    for sentencia in _resumenes_en_bloque("1", tabla):
+        conn.execute(sentencia)
+
+
+def reconstruir_resumenes(conn, archivos=()):
+    """Recalcula los resúmenes desde ciudadanos y visitas.
+
+    `archivos` son los alias de archivos adjuntos (ATTACH) cuyas filas
+    también cuentan. resumen_dia.nuevos queda como está: solo los
+    disparadores conocen el día de alta de los registros previos a la
+    columna registrado.
+    """
+    for tabla in ("resumen_sexo", "resumen_lugar", "resumen_nacimiento"):
+        conn.execute(f"DELETE FROM {tabla}")
+    for tabla in ("main.ciudadanos", *(f"{alias}.ciudadanos" for alias in archivos)):
+        sumar_a_resumenes(conn, tabla)
+    conn.execute("UPDATE resumen_dia SET visitas = 0")
+    conn.execute("""
+    INSERT INTO resumen_dia (dia, visitas)
+    SELECT CAST(strftime('%Y%m%d', fecha, 'localtime') AS INTEGER), COUNT(*)
+    FROM visitas WHERE fecha IS NOT NULL GROUP BY 1
+    ON CONFLICT(dia) DO UPDATE SET visitas = excluded.visitas
+    """)
+
+
+def _m006_cache_remota(conn):
+    """Registros de otros dispositivos descargados del servidor (ver sincronizacion.py).
+
+    Mismas columnas compactas que ciudadanos; `version` es la del servidor y
+    ordena el descarte cuando la caché supera su tope.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS cache_remota (
+        numero TEXT PRIMARY KEY,
+        nombres TEXT,
+        apellidos TEXT,
+        fecha_nacimiento INTEGER,
+        sexo INTEGER,
+        departamento INTEGER,
+        municipio INTEGER,
+        lugar_texto TEXT,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_remota_version ON cache_remota(version)")
+
+
+def _m007_fecha_registro(conn):
+    """Día de alta (AAAAMMDD) de cada registro, para archivar los viejos.
+
+    Los registros anteriores no la conocen: cuentan desde hoy. El UPDATE no
+    debe reencolarlos para sincronizar, así que el disparador de la outbox
+    se retira mientras dura.
+    """
+    conn.execute("ALTER TABLE ciudadanos ADD COLUMN registrado INTEGER")
+    conn.execute("DROP TRIGGER IF EXISTS ciudadanos_outbox_au")
+    conn.execute(f"UPDATE ciudadanos SET registrado = {_HOY}")
+    _crear_disparadores_outbox(conn)
+
+
+def crear_tablas_crudos(conn, esquema="main"):
+    """Tablas del código original comprimido (crudos.py); también en los archivos adjuntos"""
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {esquema}.crudos (
+        ciudadano_id INTEGER PRIMARY KEY,
+        diccionario INTEGER,
+        texto INTEGER NOT NULL,
+        editado INTEGER NOT NULL DEFAULT 0,
+        dato BLOB NOT NULL
+    )
+    """)
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {esquema}.crudos_diccionarios (
+        id INTEGER PRIMARY KEY,     -- id_diccionario(datos)
+        datos BLOB NOT NULL
+    )
+    """)
+
+
+def id_diccionario(datos):
+    """id de un zdict derivado de su contenido (63 bits de SHA-256).
+
+    Un mismo id es siempre el mismo diccionario en cualquier base: la
+    restaurada de un respaldo, los archivos por año o la caché de crudos.py.
+    """
+    import hashlib
+
+    return int.from_bytes(hashlib.sha256(datos).digest()[:8], "big") >> 1
+
+
+def _m008_crudos(conn):
+    """Código PDF417 tal como se leyó, comprimido, para volver a parsearlo.
+
+    `diccionario` es el zdict de zlib usado (NULL: sin diccionario),
+    `texto` dice si se leyó como str (teclado o lector) o como bytes, y
+    `editado` marca los registros corregidos a mano, que no se re-parsean.
+    """
+    crear_tablas_crudos(conn)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS ciudadanos_crudos_ad AFTER DELETE ON ciudadanos BEGIN
+        DELETE FROM crudos WHERE ciudadano_id = old.id;
+    END
+    """)
+
+
+def _m009_diccionarios_por_contenido(conn):
+    """Diccionarios de crudos con id derivado del contenido (id_diccionario).
+
+    Con ids 1, 2... un respaldo restaurado o un archivo podían tener otro
+    zdict bajo el mismo id y los códigos dejaban de descomprimirse. `creado`
+    conserva el orden de los viejos para saber cuál es el vigente.
+    """
+    conn.execute("ALTER TABLE crudos_diccionarios ADD COLUMN creado INTEGER NOT NULL DEFAULT 0")
+    for viejo, datos in conn.execute("SELECT id, datos FROM crudos_diccionarios ORDER BY id").fetchall():
+        nuevo = id_diccionario(datos)
+        if conn.execute("SELECT 1 FROM crudos_diccionarios WHERE id = ?", (nuevo,)).fetchone():
+            # El mismo zdict entrenado dos veces: queda una fila, la más reciente
+            conn.execute("DELETE FROM crudos_diccionarios WHERE id = ?", (viejo,))
+            conn.execute("UPDATE crudos_diccionarios SET creado = ? WHERE id = ?", (viejo, nuevo))
+        else:
+            conn.execute("UPDATE crudos_diccionarios SET id = ?, creado = ? WHERE id = ?", (nuevo, viejo, viejo))
+        conn.execute("UPDATE crudos SET diccionario = ? WHERE diccionario = ?", (nuevo, viejo))
+
+
+MIGRACIONES = [
+    _m001_indices_busqueda,
+    _m002_outbox_sincronizacion,
+    _m003_numero_unico,
+    _m004_esquema_compacto,
+    _m005_resumenes,
+    _m006_cache_remota,
+    _m007_fecha_registro,
+    _m008_crudos,
+    _m009_diccionarios_por_contenido,
+]
+
+# Migraciones que reescriben ciudadanos entera: conviene un VACUUM después
+_REESCRIBEN_TABLAS = {4}
+
+
+def migrar(conn):
+    """Aplica las migraciones pendientes dentro de la transacción actual.
+
+    Devuelve los números de las migraciones aplicadas.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    aplicadas = []
+    for numero, migracion in enumerate(MIGRACIONES, start=1):
+        if version < numero:
+            migracion(conn)
+            conn.execute(f"PRAGMA user_version={numero}")
+            aplicadas.append(numero)
+    return aplicadas
+
+
+def requiere_vacuum(aplicadas):
+    """True si alguna migración aplicada dejó muchas páginas libres"""
+    return any(numero in _REESCRIBEN_TABLAS for numero in aplicadas)
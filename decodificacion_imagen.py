@@ -0,0 +1,215 @@
+"""
+Lectura de PDF417 desde imágenes
+Backends intercambiables (zxing-cpp, pyzbar) con preprocesado rápido en Pillow
+y modo por lotes para carpetas de fotos
+"""
+
+import os
+from abc import ABC, abstractmethod
+
+EXTENSIONES = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+LADO_MAX = 1600          # px: las fotos de teléfono se reducen antes de decodificar
+RADIO_BINARIZACION = 15  # px del promedio local para la binarización adaptativa
+SESGO_BINARIZACION = 10
+
+
+class BackendDecodificador(ABC):
+    """Interfaz de un decodificador de PDF417 sobre imágenes PIL en escala de grises"""
+
+    nombre = ""
+
+    @abstractmethod
+    def decodificar(self, imagen):
+        """Devuelve los bytes crudos del primer PDF417 encontrado o None"""
+
+
+class BackendZxing(BackendDecodificador):
+    nombre = "zxing-cpp"
+
+    def __init__(self):
+        import zxingcpp
+        self._zxing = zxingcpp
+        self._formato = zxingcpp.BarcodeFormat.PDF417
+
+    def decodificar(self, imagen):
+        for resultado in self._zxing.read_barcodes(imagen, formats=self._formato):
+            if resultado.valid:
+                return bytes(resultado.bytes)
+        return None
+
+
+class BackendPyzbar(BackendDecodificador):
+    nombre = "pyzbar"
+
+    def __init__(self):
+        from pyzbar import pyzbar
+        self._pyzbar = pyzbar
+        self._simbolos = [pyzbar.ZBarSymbol.PDF417]
+
+    def decodificar(self, imagen):
+        for resultado in self._pyzbar.decode(imagen, symbols=self._simbolos):
+            return resultado.data
+        return None
+
+
+# En orden de preferencia: zxing-cpp lee PDF417 mucho mejor que zbar
+BACKENDS = (BackendZxing, BackendPyzbar)
+
+_backend = None
+
+
+def obtener_backend(nombre=None):
+    """Primer backend instalado (o el pedido por nombre); None si no hay ninguno"""
+    global _backend
+    if nombre is None and _backend is not None:
+        return _backend
+    for clase in BACKENDS:
+        if nombre is not None and clase.nombre != nombre:
+            continue
+        try:
+            backend = clase()
+        except ImportError:
+            continue
+        if nombre is None:
+            _backend = backend
+        return backend
+    return None
+
+
+# ============================================
+# PREPROCESADO
+# ============================================
+
+def cargar_gris(fuente, lado_max=LADO_MAX):
+    """Abre la imagen en escala de grises y reducida.
+
+    Para JPEG, `draft` hace que el decodificador entregue directamente una
+    versión en gris a 1/2, 1/4 u 1/8 de tamaño, que es lo más caro de evitar.
+    """
+    from PIL import Image
+
+    imagen = fuente if isinstance(fuente, Image.Image) else Image.open(fuente)
+    if imagen.format == "JPEG":
+        imagen.draft("L", (lado_max, lado_max))
+    imagen = imagen.convert("L")
+    if max(imagen.size) > lado_max:
+        imagen.thumbnail((lado_max, lado_max), Image.BILINEAR)
+    return imagen
+
+
+def binarizar_adaptativo(imagen, radio=RADIO_BINARIZACION, sesgo=SESGO_BINARIZACION):
+    """Umbral local: blanco si el píxel supera el promedio de su vecindad menos `sesgo`"""
+    from PIL import ImageChops, ImageFilter
+
+    promedio = imagen.filter(ImageFilter.BoxBlur(radio))
+    # (pixel - promedio) + 128 + sesgo, recortado a [0, 255]
+    diferencia = ImageChops.subtract(imagen, promedio, 1.0, 128 + sesgo)
+    return diferencia.point(lambda v: 255 if v > 128 else 0)
+
+
+def _candidatos(imagen):
+    """Variantes en orden de coste creciente; se generan solo si hacen falta"""
+    from PIL import Image
+
+    yield imagen
+    binaria = binarizar_adaptativo(imagen)
+    yield binaria
+    ancho, alto = imagen.size
+    # Regiones de interés: en el reverso de la cédula el código ocupa una franja
+    for arriba, abajo in ((0.0, 0.55), (0.45, 1.0), (0.2, 0.8)):
+        caja = (0, int(alto * arriba), ancho, int(alto * abajo))
+        yield binaria.crop(caja)
+    # Foto tomada en vertical
+    yield binaria.transpose(Image.Transpose.ROTATE_90)
+
+
+def decodificar_imagen(fuente, backend=None):
+    """Bytes crudos del PDF417 de una ruta o imagen PIL; None si no se lee"""
+    backend = backend or obtener_backend()
+    if backend is None:
+        return None
+    for candidato in _candidatos(cargar_gris(fuente)):
+        datos = backend.decodificar(candidato)
+        if datos:
+            return datos
+    return None
+
+
+# ============================================
+# MODO POR LOTES
+# ============================================
+
+_backend_proceso = None
+
+
+def _iniciar_proceso(nombre):
+    global _backend_proceso
+    _backend_proceso = obtener_backend(nombre)
+
+
+def _decodificar_archivo(ruta):
+    try:
+        return ruta, decodificar_imagen(ruta, _backend_proceso), None
+    except Exception as e:
+        return ruta, None, str(e)
+
+
+def listar_imagenes(directorio):
+    with os.scandir(directorio) as entradas:
+        for entrada in entradas:
+            if entrada.is_file() and entrada.name.lower().endswith(EXTENSIONES):
+                yield entrada.path
+
+
+def decodificar_carpeta(directorio, procesos=None, backend=None, tam_bloque=8):
+    """Decodifica todas las imágenes de `directorio` y entrega (ruta, datos, error).
+
+    Con `procesos` > 1 las fotos se reparten en un pool de procesos; cada
+    proceso carga su backend una sola vez.
+    """
+    nombre = backend.nombre if backend is not None else None
+    rutas = listar_imagenes(directorio)
+    if not procesos or procesos <= 1:
+        _iniciar_proceso(nombre)
+        for ruta in rutas:
+            yield _decodificar_archivo(ruta)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso,
+                             initargs=(nombre,)) as pool:
+        yield from pool.map(_decodificar_archivo, rutas, chunksize=tam_bloque)
+
+
+def importar_carpeta(directorio, guardar_lote, parsear, procesos=None, tam_lote=500, progreso=None):
+    """Decodifica una carpeta, parsea cada código y guarda por lotes.
+
+    `guardar_lote(lista_de_dicts)` escribe en una sola transacción.
+    Devuelve (guardados, fallidos) donde fallidos es una lista de (ruta, motivo).
+    """
+    guardados = 0
+    fallidos = []
+    pendientes = []
+    for ruta, datos, error in decodificar_carpeta(directorio, procesos=procesos):
+        if datos is None:
+            fallidos.append((ruta, error or "PDF417 no encontrado"))
+            continue
+        registro = parsear(datos)
+        if not registro.get("numero"):
+            fallidos.append((ruta, "No se pudo parsear el código"))
+            continue
+        registro["crudo"] = datos
+        pendientes.append(registro)
+        if len(pendientes) >= tam_lote:
+            guardar_lote(pendientes)
+            guardados += len(pendientes)
+            pendientes = []
+            if progreso is not None:
+                progreso(guardados, len(fallidos))
+    if pendientes:
+        guardar_lote(pendientes)
+        guardados += len(pendientes)
+    if progreso is not None:
+        progreso(guardados, len(fallidos))
+    return guardados, fallidos
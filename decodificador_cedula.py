@@ -0,0 +1,106 @@
+"""
+Decodificador por posiciones fijas del PDF417 de la cédula colombiana
+Lee los campos directamente de bytes/memoryview, sin regex ni decodificar todo
+"""
+
+from collections import namedtuple
+
+# Posiciones [inicio, fin) en bytes del registro crudo (relleno con NUL)
+Diseno = namedtuple("Diseno", [
+    "nombre", "largo_min",
+    "numero", "apellido1", "apellido2", "nombre1", "nombre2",
+    "sexo", "fecha", "lugar_a", "lugar_b",
+])
+
+DISENOS = (
+    # Cédula amarilla con hologramas (registro de ~530 bytes)
+    Diseno("cc_amarilla_v1", 168,
+           numero=(48, 58), apellido1=(58, 81), apellido2=(81, 104),
+           nombre1=(104, 127), nombre2=(127, 150),
+           sexo=151, fecha=(152, 160), lugar_a=(160, 162), lugar_b=(162, 165)),
+)
+
+_RELLENO = b"\x00 "
+_DIGITOS = b"0123456789"
+_M, _F = ord("M"), ord("F")
+
+
+def _texto(buf, rango):
+    campo = bytes(buf[rango[0]:rango[1]]).strip(_RELLENO)
+    try:
+        return campo.decode("utf-8")
+    except UnicodeDecodeError:
+        return campo.decode("latin-1")
+
+
+def _digitos(buf, rango):
+    """bytes del campo si todos son dígitos ASCII, si no None"""
+    campo = bytes(buf[rango[0]:rango[1]])
+    return campo if campo.isdigit() else None
+
+
+def _sin_digitos(buf, rango):
+    campo = bytes(buf[rango[0]:rango[1]])
+    return len(campo.translate(None, _DIGITOS)) == len(campo)
+
+
+def _fecha_valida(fecha):
+    y, m, d = int(fecha[0:4]), int(fecha[4:6]), int(fecha[6:8])
+    return 1900 <= y <= 2100 and 1 <= m <= 12 and 1 <= d <= 31
+
+
+def detectar_diseno(buf):
+    """Devuelve el Diseno que valida sobre `buf` o None si no se reconoce"""
+    n = len(buf)
+    for diseno in DISENOS:
+        if n < diseno.largo_min:
+            continue
+        if buf[diseno.sexo] not in (_M, _F):
+            continue
+        numero = bytes(buf[diseno.numero[0]:diseno.numero[1]]).strip(_RELLENO)
+        if not numero.isdigit() or not numero.strip(b"0"):
+            continue
+        fecha = _digitos(buf, diseno.fecha)
+        if fecha is None or not _fecha_valida(fecha):
+            continue
+        if _digitos(buf, diseno.lugar_a) is None or _digitos(buf, diseno.lugar_b) is None:
+            continue
+        if not bytes(buf[diseno.apellido1[0]:diseno.apellido1[1]]).strip(_RELLENO):
+            continue
+        if not all(_sin_digitos(buf, rango) for rango in
+                   (diseno.apellido1, diseno.apellido2, diseno.nombre1, diseno.nombre2)):
+            continue
+        return diseno
+    return None
+
+
+def decodificar(data):
+    """Decodifica un registro crudo (bytes, bytearray o memoryview).
+
+    Devuelve el dict de campos de parsear_datos o None si el diseño no se
+    reconoce, para que el llamador use el parser heurístico.
+    """
+    buf = memoryview(data).cast("B") if not isinstance(data, (bytes, bytearray)) else data
+    diseno = detectar_diseno(buf)
+    if diseno is None:
+        return None
+
+    numero = bytes(buf[diseno.numero[0]:diseno.numero[1]]).strip(_RELLENO).lstrip(b"0").decode("ascii")
+    apellidos = " ".join(p for p in (_texto(buf, diseno.apellido1), _texto(buf, diseno.apellido2)) if p)
+    nombres = " ".join(p for p in (_texto(buf, diseno.nombre1), _texto(buf, diseno.nombre2)) if p)
+
+    fecha = bytes(buf[diseno.fecha[0]:diseno.fecha[1]]).decode("ascii")
+    fecha_nacimiento = f"{fecha[0:4]}-{fecha[4:6]}-{fecha[6:8]}"
+
+    # Mismo orden "lugar_b-lugar_a" que produce el parser heurístico
+    lugar_a = bytes(buf[diseno.lugar_a[0]:diseno.lugar_a[1]]).decode("ascii")
+    lugar_b = bytes(buf[diseno.lugar_b[0]:diseno.lugar_b[1]]).decode("ascii")
+
+    return {
+        "numero": numero,
+        "nombres": nombres.title(),
+        "apellidos": apellidos.title(),
+        "fecha_nacimiento": fecha_nacimiento,
+        "sexo": chr(buf[diseno.sexo]),
+        "lugar_expedicion": f"{lugar_b}-{lugar_a}"
+    }
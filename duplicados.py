@@ -0,0 +1,124 @@
+"""
+Control de duplicados por número de documento
+Política de inserción (rechazar, actualizar o registrar visita) y caché en
+memoria de escaneos recientes para descartar dobles lecturas sin ir a la DB
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import crudos
+from campos import COLUMNAS, a_columnas
+
+RECHAZAR = "rechazar"
+ACTUALIZAR = "actualizar"
+VISITAS = "visitas"
+POLITICAS = (RECHAZAR, ACTUALIZAR, VISITAS)
+POLITICA_DEFECTO = RECHAZAR
+
+VENTANA_SEGUNDOS = 5
+CAPACIDAD_CACHE = 256
+
+
+class RegistroDuplicado(Exception):
+    """El número ya está registrado y la política es rechazar"""
+
+
+# registrado es el día de alta; el upsert no lo toca
+_INSERTAR = f"""
+INSERT INTO ciudadanos ({COLUMNAS}, registrado)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, CAST(strftime('%Y%m%d', 'now', 'localtime') AS INTEGER))
+"""
+
+_INSERTAR_O_IGNORAR = _INSERTAR.replace("INSERT INTO", "INSERT OR IGNORE INTO")
+
+_UPSERT = _INSERTAR + """
+ON CONFLICT(numero) DO UPDATE SET
+    nombres=excluded.nombres, apellidos=excluded.apellidos,
+    fecha_nacimiento=excluded.fecha_nacimiento, sexo=excluded.sexo,
+    departamento=excluded.departamento, municipio=excluded.municipio,
+    lugar_texto=excluded.lugar_texto
+"""
+
+_VISITA = "INSERT INTO visitas (ciudadano_id) SELECT id FROM ciudadanos WHERE numero = ?"
+
+
+def _valores(datos):
+    return a_columnas(datos)
+
+
+def insertar(conn, datos, politica=POLITICA_DEFECTO, archivados=()):
+    """Inserta un registro según la política y devuelve el id de la fila afectada.
+
+    `archivados` son números que ya están en un archivo (archivo.numeros_archivados):
+    con RECHAZAR cuentan como repetidos igual que los de la tabla caliente.
+    """
+    if politica == RECHAZAR:
+        if datos["numero"] in archivados:
+            raise RegistroDuplicado(datos["numero"])
+        try:
+            rowid = conn.execute(_INSERTAR, _valores(datos)).lastrowid
+        except sqlite3.IntegrityError:
+            raise RegistroDuplicado(datos["numero"])
+        crudos.guardar(conn, [datos])
+        return rowid
+    conn.execute(_UPSERT, _valores(datos))
+    crudos.guardar(conn, [datos])
+    if politica == VISITAS:
+        conn.execute(_VISITA, (datos["numero"],))
+    # lastrowid no es fiable cuando el upsert actualiza
+    return conn.execute("SELECT id FROM ciudadanos WHERE numero = ?", (datos["numero"],)).fetchone()[0]
+
+
+def insertar_lote(conn, lista, politica=POLITICA_DEFECTO, archivados=()):
+    """Versión executemany de `insertar`; con RECHAZAR se omiten los duplicados.
+
+    Un número repetido dentro de `lista` se escribe una sola vez con sus
+    últimos datos (con VISITAS cada aparición sigue siendo una visita).
+    Devuelve cuántas filas nuevas o modificadas hubo.
+    """
+    if politica == RECHAZAR and archivados:
+        lista = [d for d in lista if d["numero"] not in archivados]
+    valores = [_valores(d) for d in lista]
+    if politica == RECHAZAR:
+        nuevas = conn.executemany(_INSERTAR_O_IGNORAR, valores).rowcount
+        # Un repetido omitido no reemplaza el código de la fila que ya estaba
+        crudos.guardar(conn, lista, reemplazar=False)
+        return nuevas
+    # Bajo insercion_masiva el upsert de una fila nueva del mismo lote
+    # dispararía los *_au contra FTS y resúmenes que aún no la tienen
+    unicos = list({d["numero"]: d for d in lista}.values())
+    cambios = conn.executemany(_UPSERT, [_valores(d) for d in unicos]).rowcount
+    crudos.guardar(conn, unicos)
+    if politica == VISITAS:
+        conn.executemany(_VISITA, [(v[0],) for v in valores])
+    return cambios
+
+
+class CacheEscaneosRecientes:
+    """Números vistos en los últimos `ventana` segundos (LRU acotado, seguro entre hilos)"""
+
+    def __init__(self, ventana=VENTANA_SEGUNDOS, capacidad=CAPACIDAD_CACHE, reloj=time.monotonic):
+        self.ventana = ventana
+        self.capacidad = capacidad
+        self._reloj = reloj
+        self._vistos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def repetido(self, numero):
+        """Registra el escaneo y devuelve los segundos desde el anterior si cae en la ventana"""
+        ahora = self._reloj()
+        with self._lock:
+            anterior = self._vistos.pop(numero, None)
+            self._vistos[numero] = ahora
+            if len(self._vistos) > self.capacidad:
+                self._vistos.popitem(last=False)
+        if anterior is not None and ahora - anterior < self.ventana:
+            return ahora - anterior
+        return None
+
+    def olvidar(self, numero):
+        with self._lock:
+            self._vistos.pop(numero, None)
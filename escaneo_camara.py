@@ -0,0 +1,167 @@
+"""
+Escaneo continuo de fotogramas de cámara
+Ranura de un solo fotograma (descarta los viejos), política de salto de
+fotogramas y decodificación en un hilo aparte sobre una ROI reducida
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from decodificacion_imagen import obtener_backend, binarizar_adaptativo
+from decodificador_cedula import detectar_diseno
+
+LADO_MAX_ROI = 1024
+SALTAR_FOTOGRAMAS = 2        # intentar 1 de cada N fotogramas ofrecidos
+INTERVALO_MIN = 0.05         # s mínimos entre intentos de decodificación
+CONFIRMACIONES = 2           # lecturas iguales exigidas si el diseño no es conocido
+
+# datos: bytes crudos; modo: modo PIL ("RGBA", "RGB", "L"); instante: time.monotonic()
+Fotograma = namedtuple("Fotograma", ["datos", "ancho", "alto", "modo", "instante"])
+
+
+def a_imagen_roi(fotograma, roi=(0.0, 0.15, 1.0, 0.85), lado_max=LADO_MAX_ROI):
+    """Convierte el fotograma a gris, recorta la ROI (fracciones) y reduce"""
+    from PIL import Image
+
+    imagen = Image.frombuffer(fotograma.modo, (fotograma.ancho, fotograma.alto),
+                              fotograma.datos, "raw", fotograma.modo, 0, 1)
+    x0, y0, x1, y1 = roi
+    imagen = imagen.crop((int(fotograma.ancho * x0), int(fotograma.alto * y0),
+                          int(fotograma.ancho * x1), int(fotograma.alto * y1)))
+    imagen = imagen.convert("L")
+    if max(imagen.size) > lado_max:
+        imagen.thumbnail((lado_max, lado_max), Image.NEAREST)
+    return imagen
+
+
+class FuenteArchivos:
+    """Fuente de fotogramas a partir de imágenes (pruebas o demostraciones)"""
+
+    def __init__(self, imagenes, fps=30):
+        self.imagenes = list(imagenes)
+        self.periodo = 1.0 / fps
+
+    def __iter__(self):
+        from PIL import Image
+
+        for imagen in self.imagenes:
+            if not isinstance(imagen, Image.Image):
+                imagen = Image.open(imagen)
+            imagen = imagen.convert("RGB")
+            yield Fotograma(imagen.tobytes(), imagen.width, imagen.height, "RGB", time.monotonic())
+            time.sleep(self.periodo)
+
+
+class TuberiaEscaneo:
+    """Recibe fotogramas con `ofrecer` y decodifica en un hilo propio.
+
+    Solo se guarda el fotograma más reciente: si llega uno nuevo mientras el
+    hilo trabaja, el anterior se descarta. `al_detectar(datos, crudo, latencia_ms)`
+    se llama desde el hilo de trabajo una sola vez por sesión; la UI debe
+    reenviarlo con Clock.schedule_once.
+    """
+
+    def __init__(self, parsear, al_detectar, backend=None, saltar=SALTAR_FOTOGRAMAS,
+                 intervalo_min=INTERVALO_MIN, confirmaciones=CONFIRMACIONES, roi=(0.0, 0.15, 1.0, 0.85)):
+        self.parsear = parsear
+        self.al_detectar = al_detectar
+        self.backend = backend or obtener_backend()
+        self.saltar = max(1, saltar)
+        self.intervalo_min = intervalo_min
+        self.confirmaciones = max(1, confirmaciones)
+        self.roi = roi
+        self._cond = threading.Condition()
+        self._fotograma = None
+        self._ocupado = False
+        self._activo = False
+        self._hilo = None
+        self._contador = 0
+        self._ultimo_intento = 0.0
+        self.estadisticas = {"ofrecidos": 0, "descartados": 0, "intentos": 0, "latencia_ms": None}
+
+    @property
+    def disponible(self):
+        return self.backend is not None
+
+    def iniciar(self):
+        if self.backend is None:
+            raise RuntimeError("No hay decodificador de imágenes instalado")
+        with self._cond:
+            if self._activo:
+                return
+            self._activo = True
+            self._fotograma = None
+            self._contador = 0
+        self._hilo = threading.Thread(target=self._bucle, name="escaneo", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        with self._cond:
+            self._activo = False
+            self._fotograma = None
+            self._cond.notify_all()
+
+    def quiere_fotograma(self):
+        """True si vale la pena capturar ahora (evita leer la textura en vano)"""
+        if not self._activo or self._ocupado:
+            return False
+        if time.monotonic() - self._ultimo_intento < self.intervalo_min:
+            return False
+        self._contador += 1
+        return self._contador % self.saltar == 0
+
+    def ofrecer(self, fotograma):
+        with self._cond:
+            if not self._activo:
+                return
+            self.estadisticas["ofrecidos"] += 1
+            if self._fotograma is not None:
+                self.estadisticas["descartados"] += 1
+            self._fotograma = fotograma
+            self._cond.notify()
+
+    def _bucle(self):
+        lecturas = {}
+        while True:
+            with self._cond:
+                while self._activo and self._fotograma is None:
+                    self._cond.wait()
+                if not self._activo:
+                    return
+                fotograma, self._fotograma = self._fotograma, None
+                self._ocupado = True
+            try:
+                crudo = self._decodificar(fotograma)
+            finally:
+                self._ocupado = False
+                self._ultimo_intento = time.monotonic()
+            if not crudo:
+                continue
+            datos = self.parsear(crudo)
+            if not datos.get("numero"):
+                continue
+            # Diseño reconocido por posiciones: confiable a la primera;
+            # si no, exigir varias lecturas idénticas
+            if detectar_diseno(crudo) is None:
+                lecturas[crudo] = lecturas.get(crudo, 0) + 1
+                if lecturas[crudo] < self.confirmaciones:
+                    continue
+            with self._cond:
+                if not self._activo:
+                    return
+                self._activo = False
+            latencia = (time.monotonic() - fotograma.instante) * 1000
+            self.estadisticas["latencia_ms"] = round(latencia, 1)
+            self.al_detectar(datos, crudo, latencia)
+            return
+
+    def _decodificar(self, fotograma):
+        self.estadisticas["intentos"] += 1
+        imagen = a_imagen_roi(fotograma, self.roi)
+        crudo = self.backend.decodificar(imagen)
+        # Con poca luz el umbral local suele salvar la lectura; se alterna
+        # para no duplicar el coste de cada intento
+        if not crudo and self.estadisticas["intentos"] % 2 == 0:
+            crudo = self.backend.decodificar(binarizar_adaptativo(imagen))
+        return crudo
@@ -0,0 +1,161 @@
+"""
+Escritura diferida (write-behind) de registros
+Los registros confirmados se acumulan en memoria y un hilo los escribe con
+executemany en una sola transacción cada N registros o T milisegundos
+
+Garantías ante fallos:
+- Lo que `encolar` aceptó pero aún no se escribió vive solo en memoria: si
+  el proceso muere se pierde. La ventana máxima es `max_lote` registros o
+  `max_espera_ms` milisegundos.
+- Un lote escrito es una transacción: entra completo o no entra.
+- Si `guardar_lote` falla, por defecto el lote se descarta tras avisar a
+  `al_error`. Con `reintentar` (la app: DB bloqueada, disco lleno) vuelve
+  al frente de la cola y se reintenta con espera exponencial de
+  REINTENTO_INICIAL hasta REINTENTO_MAX segundos; `al_error` solo avisa y
+  lo único que se pierde es lo que `detener(timeout)` devuelve sin escribir.
+  Un lote que falla siempre (datos inválidos) bloquea la cola: no conviene
+  reintentar si otros llamadores comparten el escritor.
+- Con WAL y synchronous=NORMAL un lote confirmado sobrevive a un cierre
+  forzado de la app; ante un corte de energía del teléfono pueden perderse
+  los últimos lotes hasta el siguiente checkpoint.
+- `vaciar()` (llamado en on_pause/on_stop) escribe todo lo pendiente antes
+  de devolver el control.
+"""
+
+import threading
+import time
+
+MAX_LOTE = 100
+MAX_ESPERA_MS = 250
+REINTENTO_INICIAL = 0.5
+REINTENTO_MAX = 30.0
+
+
+class EscritorDiferido:
+    """Cola en memoria con un hilo escritor.
+
+    `guardar_lote(lista)` escribe en una transacción. `al_guardar(lista)` y
+    `al_error(lista, excepcion)` se llaman desde el hilo escritor; con
+    `reintentar` el lote sigue en la cola tras `al_error` y se reintenta.
+    """
+
+    def __init__(self, guardar_lote, max_lote=MAX_LOTE, max_espera_ms=MAX_ESPERA_MS,
+                 al_guardar=None, al_error=None, reintentar=False):
+        self.guardar_lote = guardar_lote
+        self.reintentar = reintentar
+        self.max_lote = max(1, max_lote)
+        self.max_espera = max_espera_ms / 1000.0
+        self.al_guardar = al_guardar or (lambda lista: None)
+        self.al_error = al_error or (lambda lista, error: None)
+        self._cond = threading.Condition()
+        self._pendientes = []
+        self._primero = None          # instante del registro más antiguo en cola
+        self._escribiendo = 0
+        self._reintento = None        # instante del próximo intento tras un fallo
+        self._vaciar = False
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, name="escritor", daemon=True)
+        self._hilo.start()
+
+    def encolar(self, datos):
+        with self._cond:
+            if not self._activo:
+                raise RuntimeError("Escritor diferido detenido")
+            if not self._pendientes:
+                self._primero = time.monotonic()
+            self._pendientes.append(datos)
+            if len(self._pendientes) >= self.max_lote or len(self._pendientes) == 1:
+                self._cond.notify_all()
+
+    @property
+    def pendientes(self):
+        with self._cond:
+            return len(self._pendientes) + self._escribiendo
+
+    def vaciar(self, timeout=None):
+        """Escribe ya lo pendiente y espera a que quede en la DB"""
+        fin = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._vaciar = True
+            self._cond.notify_all()
+            while self._pendientes or self._escribiendo:
+                restante = None if fin is None else fin - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante)
+            return True
+
+    def detener(self, timeout=None):
+        """Vacía la cola y termina el hilo.
+
+        Si en `timeout` segundos los reintentos no lograron escribir todo,
+        devuelve la lista de registros que quedaron sin guardar.
+        """
+        self.vaciar(timeout)
+        with self._cond:
+            self._activo = False
+            self._cond.notify_all()
+        self._hilo.join()
+        with self._cond:
+            return list(self._pendientes)
+
+    def _bucle(self):
+        fallos = 0
+        while True:
+            with self._cond:
+                while True:
+                    # Detenido: termina al vaciar la cola o al fallar otra vez
+                    if not self._activo and (not self._pendientes or fallos):
+                        return
+                    if self._pendientes:
+                        if fallos:
+                            espera = self._reintento - time.monotonic()
+                            if espera <= 0:
+                                break
+                        else:
+                            espera = self._primero + self.max_espera - time.monotonic()
+                            if self._vaciar or len(self._pendientes) >= self.max_lote or espera <= 0:
+                                break
+                        self._cond.wait(espera)
+                    else:
+                        self._vaciar = False
+                        self._cond.wait()
+                lote = self._pendientes[:self.max_lote]
+                del self._pendientes[:self.max_lote]
+                self._primero = time.monotonic() if self._pendientes else None
+                self._escribiendo = len(lote)
+            try:
+                self.guardar_lote(lote)
+            except Exception as e:
+                if self.reintentar:
+                    fallos += 1
+                    self._devolver(lote, fallos)
+                    self.al_error(lote, e)
+                    continue
+                try:
+                    self.al_error(lote, e)
+                finally:
+                    self._terminado()
+            else:
+                fallos = 0
+                try:
+                    self.al_guardar(lote)
+                finally:
+                    self._terminado()
+
+    def _devolver(self, lote, fallos):
+        with self._cond:
+            # Al frente de la cola: se reintenta en orden, no se pierde
+            self._pendientes[:0] = lote
+            if self._primero is None:
+                self._primero = time.monotonic()
+            self._reintento = time.monotonic() + min(REINTENTO_MAX, REINTENTO_INICIAL * 2 ** (fallos - 1))
+            self._escribiendo = 0
+            self._cond.notify_all()
+
+    def _terminado(self):
+        with self._cond:
+            self._escribiendo = 0
+            if not self._pendientes:
+                self._vaciar = False
+            self._cond.notify_all()
@@ -0,0 +1,107 @@
+"""
+Estadísticas para supervisores: totales por sexo, lugar de expedición, edad y día
+Se leen de las tablas resumen_* que mantienen los disparadores (db_esquema),
+así que no recorren ciudadanos. Tras una carga hecha por fuera de la app o si
+los totales no cuadran, --reconstruir los recalcula
+
+    python estadisticas.py --db cedulas.db
+    python estadisticas.py --db cedulas.db --reconstruir --json
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+from campos import fecha_legible, lugar_legible, sexo_legible
+
+# (desde, hasta) en años cumplidos en el año en curso; None es sin límite
+BANDAS_EDAD = ((0, 17), (18, 25), (26, 35), (36, 45), (46, 60), (61, None))
+DIAS = 30
+SIN_DATO = "Sin dato"
+
+
+def _banda(edad):
+    for desde, hasta in BANDAS_EDAD:
+        if edad >= desde and (hasta is None or edad <= hasta):
+            return f"{desde}+" if hasta is None else f"{desde}-{hasta}"
+    return SIN_DATO
+
+
+def leer(conn, hoy=None, dias=DIAS):
+    """Totales desde los resúmenes; cada lista es de pares (etiqueta, total).
+
+    La edad se calcula con el año de nacimiento (puede adelantarse un año
+    a la cumplida) y por_dia trae los últimos `dias` días con actividad.
+    """
+    hoy = hoy or date.today()
+    por_sexo = [(sexo_legible(sexo) if sexo else SIN_DATO, total) for sexo, total in conn.execute(
+        "SELECT sexo, total FROM resumen_sexo WHERE total > 0 ORDER BY sexo = 0, sexo")]
+    por_lugar = [(lugar_legible(dep, mun) if dep else SIN_DATO, total) for dep, mun, total in conn.execute(
+        "SELECT departamento, municipio, total FROM resumen_lugar WHERE total > 0 ORDER BY total DESC")]
+
+    por_edad = dict.fromkeys([_banda(desde) for desde, _ in BANDAS_EDAD] + [SIN_DATO], 0)
+    for anio, total in conn.execute("SELECT anio, total FROM resumen_nacimiento WHERE total > 0"):
+        por_edad[_banda(hoy.year - anio) if anio else SIN_DATO] += total
+
+    desde = int((hoy - timedelta(days=dias - 1)).strftime("%Y%m%d"))
+    por_dia = [(fecha_legible(dia), nuevos, visitas) for dia, nuevos, visitas in conn.execute(
+        "SELECT dia, nuevos, visitas FROM resumen_dia WHERE dia >= ? ORDER BY dia DESC", (desde,))]
+    return {
+        "total": sum(total for _, total in por_sexo),
+        "por_sexo": por_sexo,
+        "por_edad": [(banda, total) for banda, total in por_edad.items() if total],
+        "por_lugar": por_lugar,
+        "por_dia": por_dia,
+    }
+
+
+def formatear(datos, lugares=15):
+    """Texto de columnas fijas (pantalla de estadísticas y salida de la CLI)"""
+    lineas = [f"Registros: {datos['total']}", ""]
+    for titulo, filas in (("Sexo", datos["por_sexo"]), ("Edad", datos["por_edad"]),
+                          ("Lugar de expedición", datos["por_lugar"][:lugares])):
+        lineas.append(f"{titulo:<30}{'total':>8}")
+        lineas.extend(f"  {etiqueta[:28]:<28}{total:>8}" for etiqueta, total in filas)
+        if titulo.startswith("Lugar") and len(datos["por_lugar"]) > lugares:
+            otros = sum(total for _, total in datos["por_lugar"][lugares:])
+            lineas.append(f"  {'Otros':<28}{otros:>8}")
+        lineas.append("")
+    lineas.append(f"{'Día':<22}{'nuevos':>8}{'visitas':>8}")
+    lineas.extend(f"  {dia:<20}{nuevos:>8}{visitas:>8}" for dia, nuevos, visitas in datos["por_dia"])
+    if not datos["por_dia"]:
+        lineas.append("  Sin actividad reciente")
+    return "\n".join(lineas)
+
+
+def main(argv=None):
+    from db_conexion import GestorConexiones
+    from archivo import directorio_archivo, reconstruir_resumenes_con_archivos
+    from db_esquema import crear_esquema_base, migrar
+
+    parser = argparse.ArgumentParser(description="Totales por sexo, edad, lugar y día")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "cedulas.db"))
+    parser.add_argument("--reconstruir", action="store_true",
+                        help="recalcular los resúmenes desde ciudadanos (y sus archivos) y visitas")
+    parser.add_argument("--dias", type=int, default=DIAS)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    gestor = GestorConexiones(args.db)
+    try:
+        with gestor.escritura() as conn:
+            crear_esquema_base(conn)
+            migrar(conn)
+        if args.reconstruir:
+            reconstruir_resumenes_con_archivos(gestor, directorio_archivo(args.db))
+        with gestor.lectura() as conn:
+            datos = leer(conn, dias=args.dias)
+    finally:
+        gestor.cerrar()
+    print(json.dumps(datos, indent=2, ensure_ascii=False) if args.json else formatear(datos))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
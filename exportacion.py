@@ -0,0 +1,123 @@
+"""
+Exportación CSV en streaming
+Recorre el cursor con fetchmany, escribe con buffer y opcionalmente gzip y
+archivos partidos; pensada para correr en un hilo con progreso y cancelación
+"""
+
+import csv
+import gzip
+import os
+import threading
+from datetime import datetime
+
+from campos import COLUMNAS, legible
+
+ENCABEZADOS = ["Número", "Nombres", "Apellidos", "Nacimiento", "Sexo", "Lugar Expedición"]
+FILAS_POR_LOTE = 1000
+BUFFER_BYTES = 1 << 16
+
+
+class ExportacionCancelada(Exception):
+    pass
+
+
+def _abrir(ruta, comprimir):
+    if comprimir:
+        return gzip.open(ruta, "wt", newline="", encoding="utf-8", compresslevel=6)
+    return open(ruta, "w", newline="", encoding="utf-8", buffering=BUFFER_BYTES)
+
+
+def exportar_stream(gestor, where, params, directorio, comprimir=False, filas_por_archivo=0,
+                    progreso=None, cancelado=None, prefijo="cedulas_export"):
+    """Escribe el resultado de `where` en uno o varios CSV sin cargarlo entero.
+
+    Devuelve (archivos, total). Si se cancela, borra lo escrito y lanza
+    ExportacionCancelada. La memoria usada no depende del número de filas.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    extension = ".csv.gz" if comprimir else ".csv"
+    archivos = []
+    total = 0
+    f = None
+    en_archivo = 0
+
+    def siguiente_archivo():
+        nombre = f"{prefijo}_{timestamp}"
+        if filas_por_archivo:
+            nombre += f"_{len(archivos) + 1:03d}"
+        ruta = os.path.join(directorio, nombre + extension)
+        archivos.append(ruta)
+        salida = _abrir(ruta, comprimir)
+        escritor = csv.writer(salida, delimiter=",")
+        escritor.writerow(ENCABEZADOS)
+        return salida, escritor
+
+    try:
+        with gestor.lectura() as conn:
+            cursor = conn.execute(f"SELECT {COLUMNAS} FROM ciudadanos WHERE {where} ORDER BY id", params)
+            while True:
+                if cancelado is not None and cancelado():
+                    raise ExportacionCancelada()
+                lote = cursor.fetchmany(FILAS_POR_LOTE)
+                if not lote:
+                    break
+                pendientes = lote
+                while pendientes:
+                    if f is None or (filas_por_archivo and en_archivo >= filas_por_archivo):
+                        if f is not None:
+                            f.close()
+                        f, escritor = siguiente_archivo()
+                        en_archivo = 0
+                    cupo = filas_por_archivo - en_archivo if filas_por_archivo else len(pendientes)
+                    escritor.writerows(map(legible, pendientes[:cupo]))
+                    en_archivo += len(pendientes[:cupo])
+                    pendientes = pendientes[cupo:]
+                total += len(lote)
+                if progreso is not None:
+                    progreso(total)
+    except BaseException:
+        if f is not None:
+            f.close()
+        for ruta in archivos:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        raise
+    if f is not None:
+        f.close()
+    return archivos, total
+
+
+class TrabajoExportacion:
+    """Ejecuta una exportación en un hilo propio.
+
+    `exportar(progreso, cancelado)` devuelve (archivo, mensaje). `progreso(total)`
+    y `al_terminar(archivo, mensaje)` se llaman desde el hilo de trabajo; la UI
+    debe reenviarlos con Clock.schedule_once.
+    """
+
+    def __init__(self, exportar, progreso=None, al_terminar=None):
+        self._exportar = exportar
+        self._progreso = progreso
+        self._al_terminar = al_terminar or (lambda archivo, mensaje: None)
+        self._cancelado = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._ejecutar, name="exportacion", daemon=True)
+        self._hilo.start()
+
+    def cancelar(self):
+        self._cancelado.set()
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def _ejecutar(self):
+        try:
+            archivo, mensaje = self._exportar(progreso=self._progreso, cancelado=self._cancelado.is_set)
+        except Exception as e:
+            archivo, mensaje = None, f"Error exportando: {str(e)}"
+        self._al_terminar(archivo, mensaje)
@@ -0,0 +1,197 @@
+"""
+Importación masiva por línea de comandos (sin Kivy)
+Carga CSV con las columnas de la exportación y volcados de códigos PDF417
+crudos (uno por línea) en transacciones grandes
+
+    python importar_cli.py historico.csv volcado_escaner.txt --db cedulas.db
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import sys
+import time
+from itertools import tee
+
+import archivo
+from db_conexion import GestorConexiones
+from campos import CAMPOS
+from db_esquema import crear_esquema_base, migrar, insercion_masiva
+from duplicados import insertar_lote, POLITICAS, POLITICA_DEFECTO, RECHAZAR
+from exportacion import ENCABEZADOS
+from parser_pdf417 import parsear_lote
+
+FILAS_POR_TRANSACCION = 20000
+
+
+def _abrir_binario(ruta):
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, "rb")
+    return open(ruta, "rb")
+
+
+def detectar_formato(ruta):
+    """'csv' si la primera línea es el encabezado de la exportación, si no 'crudo'"""
+    nombre = ruta[:-3] if ruta.endswith(".gz") else ruta
+    if nombre.lower().endswith(".csv"):
+        return "csv"
+    with _abrir_binario(ruta) as f:
+        primera = f.readline().decode("utf-8-sig", errors="ignore").strip()
+    return "csv" if primera == ",".join(ENCABEZADOS) else "crudo"
+
+
+def leer_csv(ruta):
+    """Entrega (linea_original, datos o None, motivo) por cada fila del CSV"""
+    with io.TextIOWrapper(_abrir_binario(ruta), encoding="utf-8-sig", newline="") as f:
+        for fila in csv.reader(f):
+            if not fila or fila == ENCABEZADOS:
+                continue
+            if len(fila) != len(CAMPOS):
+                yield fila, None, f"{len(fila)} columnas"
+                continue
+            datos = dict(zip(CAMPOS, (c.strip() for c in fila)))
+            if not datos["numero"]:
+                yield fila, None, "sin número"
+                continue
+            yield fila, datos, None
+
+
+def leer_crudo(ruta, procesos=None):
+    """Entrega (linea_original, datos o None, motivo) por cada código del volcado.
+
+    Las líneas se parsean en paralelo con parsear_lote; `tee` solo retiene las
+    que están en vuelo, no el archivo entero.
+    """
+    def lineas():
+        with _abrir_binario(ruta) as f:
+            for linea in f:
+                linea = linea.rstrip(b"\r\n")
+                if linea.strip():
+                    yield linea
+
+    originales, a_parsear = tee(lineas())
+    for linea, datos in zip(originales, parsear_lote(a_parsear, procesos=procesos)):
+        if datos.get("numero"):
+            datos["crudo"] = linea
+            yield linea, datos, None
+        else:
+            yield linea, None, "no se pudo parsear"
+
+
+class Rechazos:
+    """Archivo de rechazos con el mismo formato de la entrada más el motivo"""
+
+    def __init__(self, ruta, formato):
+        self.ruta = ruta
+        self.formato = formato
+        self.total = 0
+        self._f = None
+        self._csv = None
+
+    def agregar(self, linea, motivo):
+        if self._f is None:
+            if self.formato == "csv":
+                self._f = open(self.ruta, "w", newline="", encoding="utf-8")
+                self._csv = csv.writer(self._f)
+                self._csv.writerow(ENCABEZADOS + ["Motivo"])
+            else:
+                self._f = open(self.ruta, "wb")
+        if self._csv is not None:
+            self._csv.writerow(list(linea) + [motivo])
+        else:
+            self._f.write(motivo.encode() + b"\t" + linea + b"\n")
+        self.total += 1
+
+    def cerrar(self):
+        if self._f is not None:
+            self._f.close()
+
+
+def _guardar(gestor, lista, politica):
+    archivados = archivo.numeros_archivados(gestor, archivo.directorio_archivo(gestor.ruta),
+                                            (d["numero"] for d in lista), recuperar=politica != RECHAZAR)
+    # FTS y outbox se llenan con un INSERT ... SELECT por lote en vez de por fila
+    with gestor.escritura() as conn, insercion_masiva(conn):
+        return insertar_lote(conn, lista, politica, archivados)
+
+
+def importar(gestor, registros, rechazos, politica=POLITICA_DEFECTO,
+             tam_lote=FILAS_POR_TRANSACCION, progreso=None):
+    """Guarda los registros en transacciones de `tam_lote` filas.
+
+    Devuelve (leidos, guardados); guardados no cuenta los duplicados omitidos.
+    """
+    leidos = guardados = 0
+    pendientes = []
+    with gestor.carga_masiva():
+        for linea, datos, motivo in registros:
+            leidos += 1
+            if datos is None:
+                rechazos.agregar(linea, motivo)
+                continue
+            pendientes.append(datos)
+            if len(pendientes) >= tam_lote:
+                guardados += _guardar(gestor, pendientes, politica)
+                pendientes = []
+                if progreso is not None:
+                    progreso(leidos, guardados)
+        if pendientes:
+            guardados += _guardar(gestor, pendientes, politica)
+    return leidos, guardados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa CSV exportados y volcados PDF417 crudos")
+    parser.add_argument("entradas", nargs="+", help="archivos .csv, .txt (uno o varios, admite .gz)")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "cedulas.db"))
+    parser.add_argument("--formato", choices=("auto", "csv", "crudo"), default="auto")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count(),
+                        help="procesos para parsear códigos crudos (1 = sin paralelismo)")
+    parser.add_argument("--lote", type=int, default=FILAS_POR_TRANSACCION, help="filas por transacción")
+    parser.add_argument("--duplicados", choices=POLITICAS, default=POLITICA_DEFECTO)
+    parser.add_argument("--rechazos", help="archivo de rechazos (por defecto <entrada>.rechazos)")
+    args = parser.parse_args(argv)
+    if args.rechazos and len(args.entradas) > 1:
+        parser.error("--rechazos solo se admite con una entrada")
+
+    gestor = GestorConexiones(args.db)
+    with gestor.escritura() as conn:
+        crear_esquema_base(conn)
+        migrar(conn)
+
+    total_rechazos = 0
+    try:
+        for ruta in args.entradas:
+            formato = detectar_formato(ruta) if args.formato == "auto" else args.formato
+            registros = leer_csv(ruta) if formato == "csv" else leer_crudo(ruta, args.procesos)
+            rechazos = Rechazos(args.rechazos or ruta + ".rechazos", formato)
+            inicio = time.perf_counter()
+
+            def progreso(leidos, guardados):
+                transcurrido = time.perf_counter() - inicio
+                print(f"\r  {leidos} leídas, {guardados} guardadas, "
+                      f"{leidos / transcurrido:,.0f} filas/s", end="", file=sys.stderr)
+
+            print(f"{ruta} ({formato})", file=sys.stderr)
+            try:
+                leidos, guardados = importar(gestor, registros, rechazos, args.duplicados,
+                                             args.lote, progreso)
+            finally:
+                rechazos.cerrar()
+            transcurrido = time.perf_counter() - inicio
+            omitidos = leidos - guardados - rechazos.total
+            print(f"\r  {leidos} leídas, {guardados} guardadas, {omitidos} duplicadas, "
+                  f"{rechazos.total} rechazadas en {transcurrido:.1f} s "
+                  f"({leidos / max(transcurrido, 1e-9):,.0f} filas/s)", file=sys.stderr)
+            if rechazos.total:
+                print(f"  Rechazos en {rechazos.ruta}", file=sys.stderr)
+            total_rechazos += rechazos.total
+    finally:
+        gestor.cerrar()
+    return 1 if total_rechazos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
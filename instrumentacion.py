@@ -0,0 +1,165 @@
+"""
+Instrumentación de los caminos críticos
+Cronómetros con percentiles, contadores y captura opcional con cProfile.
+Apagada, cada función medida solo paga una llamada extra y leer un booleano
+(~0.3 µs, frente a 20 µs del parser o 100 µs de un guardado)
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+MUESTRAS_MAX = 1024      # últimas duraciones por métrica para los percentiles
+
+
+_activa = False
+_lock = threading.Lock()
+_metricas = {}           # nombre -> _Metrica
+_contadores = {}
+_perfil = None
+
+
+class _Metrica:
+    __slots__ = ("n", "total", "maximo", "muestras")
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.muestras = deque(maxlen=MUESTRAS_MAX)
+
+
+def activar(activa=True):
+    global _activa
+    _activa = bool(activa)
+
+
+def activa():
+    return _activa
+
+
+def registrar(nombre, segundos):
+    with _lock:
+        metrica = _metricas.get(nombre)
+        if metrica is None:
+            metrica = _metricas[nombre] = _Metrica()
+        metrica.n += 1
+        metrica.total += segundos
+        if segundos > metrica.maximo:
+            metrica.maximo = segundos
+        metrica.muestras.append(segundos)
+
+
+def contar(nombre, cantidad=1):
+    if not _activa:
+        return
+    with _lock:
+        _contadores[nombre] = _contadores.get(nombre, 0) + cantidad
+
+
+def medido(nombre):
+    """Decorador: registra la duración de cada llamada bajo `nombre`"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _activa:
+                return funcion(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                registrar(nombre, time.perf_counter() - inicio)
+        return envoltura
+    return decorador
+
+
+class cronometro:
+    """`with cronometro("nombre"):` para medir un bloque"""
+
+    __slots__ = ("nombre", "inicio")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.inicio = None
+
+    def __enter__(self):
+        if _activa:
+            self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.inicio is not None:
+            registrar(self.nombre, time.perf_counter() - self.inicio)
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+
+
+def resumen():
+    """{"metricas": {nombre: {n, total_ms, p50_ms, p95_ms, max_ms}}, "contadores": {...}}"""
+    with _lock:
+        copia = {nombre: (m.n, m.total, m.maximo, sorted(m.muestras)) for nombre, m in _metricas.items()}
+        contadores = dict(_contadores)
+    metricas = {}
+    for nombre, (n, total, maximo, ordenadas) in sorted(copia.items()):
+        metricas[nombre] = {
+            "n": n,
+            "total_ms": round(total * 1000, 3),
+            "p50_ms": round(_percentil(ordenadas, 0.50) * 1000, 3),
+            "p95_ms": round(_percentil(ordenadas, 0.95) * 1000, 3),
+            "max_ms": round(maximo * 1000, 3),
+        }
+    return {"activa": _activa, "metricas": metricas, "contadores": contadores}
+
+
+def reiniciar():
+    with _lock:
+        _metricas.clear()
+        _contadores.clear()
+
+
+def volcar_json(ruta, extra=None):
+    """Escribe el resumen (más `extra`) en `ruta` para recogerlo del dispositivo"""
+    datos = dict(extra or {}, instrumentacion=resumen(), generado=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+    return ruta
+
+
+# ============================================
+# PERFIL CON cProfile
+# ============================================
+
+def perfil_activo():
+    return _perfil is not None
+
+
+def iniciar_perfil():
+    """Empieza a perfilar el hilo que llama (en la app, el hilo de la UI)"""
+    global _perfil
+    import cProfile
+
+    if _perfil is None:
+        _perfil = cProfile.Profile()
+        _perfil.enable()
+
+
+def detener_perfil(ruta, lineas=40):
+    """Detiene el perfil, guarda `ruta` (.prof) y `ruta`.txt con las funciones más costosas"""
+    global _perfil
+    import io
+    import pstats
+
+    if _perfil is None:
+        return None
+    perfil, _perfil = _perfil, None
+    perfil.disable()
+    perfil.dump_stats(ruta)
+    texto = io.StringIO()
+    pstats.Stats(perfil, stream=texto).sort_stats("cumulative").print_stats(lineas)
+    with open(ruta + ".txt", "w", encoding="utf-8") as f:
+        f.write(texto.getvalue())
+    return ruta
@@ -0,0 +1,521 @@
+"""
+Núcleo de la app sin interfaz
+Base de datos, configuración, parser, exportación y sincronización sin Kivy;
+requests, csv/gzip y los decodificadores de imagen se importan al usarse
+"""
+
+import os
+import json
+from functools import lru_cache
+
+from db_conexion import obtener_gestor, cerrar_gestores
+from db_esquema import crear_esquema_base, migrar, requiere_vacuum, tiene_tabla
+from busqueda import planificar, predicado, CacheBusquedas
+from campos import CAMPOS, COLUMNAS, legible
+from parser_pdf417 import parsear_datos as _parsear_datos
+from duplicados import insertar, insertar_lote, RegistroDuplicado, POLITICAS, POLITICA_DEFECTO, RECHAZAR
+import archivo
+import crudos
+import respaldo
+import instrumentacion
+from instrumentacion import medido, contar
+
+# python-for-android define ANDROID_ARGUMENT; así no hace falta importar nada
+ANDROID = "ANDROID_ARGUMENT" in os.environ
+
+__all__ = [
+    "ANDROID", "get_app_dir", "get_db_path", "get_config_path", "get_db", "init_db",
+    "fts_disponible", "cerrar_gestores", "validar_usuario", "guardar_en_db",
+    "guardar_lote_en_db", "ids_por_numero", "obtener_registros", "cargar_config",
+    "guardar_config", "exportar_a_csv", "sincronizar", "sincronizar_con_servidor",
+    "parsear_datos", "leer_pdf417_desde_imagen", "importar_imagenes",
+    "RegistroDuplicado", "POLITICAS", "POLITICA_DEFECTO", "diagnostico", "volcar_diagnostico",
+    "cache_busquedas", "estadisticas", "reconstruir_estadisticas", "buscar_por_numero",
+    "archivar_viejos", "respaldar", "respaldo_pendiente", "listar_respaldos", "restaurar_respaldo",
+    "entrenar_diccionario_crudos", "reparsear_crudos",
+]
+
+
+# ============================================
+# BASE DE DATOS
+# ============================================
+
+@lru_cache(maxsize=None)
+def get_app_dir():
+    """Directorio de la aplicación en Android o Desktop.
+
+    CEDULAS_DIR lo reemplaza (tareas en servidor, benchmarks); tras cambiarlo
+    hay que llamar a get_app_dir.cache_clear().
+    """
+    if os.environ.get("CEDULAS_DIR"):
+        return os.environ["CEDULAS_DIR"]
+    if ANDROID:
+        from android.storage import app_storage_path
+        return app_storage_path()
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def get_db_path():
+    return os.path.join(get_app_dir(), "cedulas.db")
+
+
+def get_config_path():
+    return os.path.join(get_app_dir(), "config.json")
+
+
+def get_db():
+    """Gestor de conexiones compartido (WAL, un escritor y pool de lectores)"""
+    return obtener_gestor(get_db_path())
+
+
+# Primeras páginas de búsquedas recientes; toda escritura de registros la invalida
+cache_busquedas = CacheBusquedas()
+
+
+@medido("db.init_db")
+def init_db():
+    with get_db().escritura() as conn:
+        crear_esquema_base(conn)
+        aplicadas = migrar(conn)
+    if requiere_vacuum(aplicadas):
+        get_db().vacuum()
+    fts_disponible.cache_clear()
+    cache_busquedas.invalidar()
+
+
+@lru_cache(maxsize=None)
+def fts_disponible():
+    with get_db().lectura() as conn:
+        return tiene_tabla(conn, "ciudadanos_fts")
+
+
+@medido("db.validar_usuario")
+def validar_usuario(username, password):
+    import hashlib  # carga OpenSSL: la mitad del tiempo de importar el núcleo
+
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    with get_db().lectura() as conn:
+        usuario = conn.execute("SELECT rol FROM usuarios WHERE username=? AND password=?",
+                               (username, password_hash)).fetchone()
+    return usuario[0] if usuario else None
+
+
+@medido("db.guardar_en_db")
+def guardar_en_db(datos):
+    """Guarda un registro según la política de duplicados y devuelve su id.
+    Con la política "rechazar" lanza RegistroDuplicado si el número ya existe."""
+    politica = cargar_config().get("duplicados", POLITICA_DEFECTO)
+    archivados = _archivados([datos["numero"]], politica)
+    with get_db().escritura() as conn:
+        rowid = insertar(conn, datos, politica, archivados)
+    cache_busquedas.invalidar()
+    return rowid
+
+
+@medido("db.guardar_lote_en_db")
+def guardar_lote_en_db(lista):
+    """Inserta varios registros en una sola transacción"""
+    contar("db.registros_en_lote", len(lista))
+    politica = cargar_config().get("duplicados", POLITICA_DEFECTO)
+    archivados = _archivados([d["numero"] for d in lista], politica)
+    with get_db().escritura() as conn:
+        cambios = insertar_lote(conn, lista, politica, archivados)
+    cache_busquedas.invalidar()
+    return cambios
+
+
+def _archivados(numeros, politica):
+    """Números ya archivados: se rechazan o, con otra política, vuelven a ciudadanos"""
+    return archivo.numeros_archivados(get_db(), archivo.directorio_archivo(get_db_path()), numeros,
+                                      recuperar=politica != RECHAZAR)
+
+
+@medido("db.ids_por_numero")
+def ids_por_numero(numeros):
+    """ids de los números dados (para ubicar filas escritas en diferido)"""
+    numeros = list(numeros)
+    if not numeros:
+        return []
+    marcas = ",".join("?" * len(numeros))
+    with get_db().lectura() as conn:
+        return [fila[0] for fila in conn.execute(
+            f"SELECT id FROM ciudadanos WHERE numero IN ({marcas}) ORDER BY id", numeros)]
+
+
+@medido("db.obtener_registros")
+def obtener_registros(filtro=None, remotos=True, archivados=None):
+    """Tuplas legibles en el orden de campos.CAMPOS.
+
+    Tras los locales van los archivados (archivo.py) si `archivados` es
+    True o, con None, si hay filtro y en ciudadanos no coincidió nada. Con
+    `remotos` siguen los registros de otros dispositivos de cache_remota
+    cuyo número no está en ciudadanos.
+    """
+    usar_fts = fts_disponible()
+    where, params, _ = planificar(filtro, usar_fts=usar_fts)
+    with get_db().lectura() as conn:
+        filas = [legible(fila) for fila in conn.execute(
+            f"SELECT {COLUMNAS} FROM ciudadanos WHERE {where} ORDER BY id", params)]
+        if archivados or (archivados is None and filtro and not filas):
+            rutas = [ruta for _, ruta in archivo.listar(archivo.directorio_archivo(get_db_path()))]
+            if rutas:
+                contar("obtener_registros.archivo")
+                filas.extend(legible(fila) for fila in archivo.buscar(conn, rutas, filtro, usar_fts))
+        if remotos and tiene_tabla(conn, "cache_remota"):
+            filas.extend(_remotos(conn, filtro, usar_fts))
+    return filas
+
+
+def _remotos(conn, filtro, usar_fts):
+    # cache_remota no tiene FTS: los números usan la clave primaria y las
+    # palabras se filtran en memoria con el mismo criterio que ciudadanos_fts
+    where, params, camino = planificar(filtro, usar_fts=False, alias="r")
+    coincide = None
+    if camino not in ("todo", "numero"):
+        where, params, coincide = "1", (), predicado(filtro, usar_fts)
+    cursor = conn.execute(f"""
+    SELECT {COLUMNAS} FROM cache_remota r WHERE {where}
+    AND NOT EXISTS (SELECT 1 FROM ciudadanos c WHERE c.numero = r.numero) ORDER BY r.numero
+    """, params)
+    return [legible(fila) for fila in cursor if coincide is None or coincide(*fila[:3])]
+
+
+@medido("db.buscar_por_numero")
+def buscar_por_numero(numero):
+    """Datos legibles de un número (dict de CAMPOS) y su origen ("local", "archivo" o "remoto"), o None"""
+    rutas = [ruta for _, ruta in archivo.listar(archivo.directorio_archivo(get_db_path()))]
+    with get_db().lectura() as conn:
+        for origen in ("local", "archivo", "remoto"):
+            if origen == "local":
+                fila = conn.execute(f"SELECT {COLUMNAS} FROM ciudadanos WHERE numero = ?", (numero,)).fetchone()
+            elif origen == "archivo":
+                fila = archivo.buscar_numero(conn, rutas, numero)
+            elif tiene_tabla(conn, "cache_remota"):
+                fila = conn.execute(f"SELECT {COLUMNAS} FROM cache_remota WHERE numero = ?", (numero,)).fetchone()
+            else:
+                fila = None
+            if fila is not None:
+                contar(f"buscar_por_numero.{origen}")
+                return dict(zip(CAMPOS, legible(fila))), origen
+    return None
+
+
+@medido("parsear_datos")
+def parsear_datos(data):
+    """parser_pdf417.parsear_datos, medido"""
+    return _parsear_datos(data)
+
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+
+_config_cache = None
+
+
+def cargar_config():
+    """Lee config.json una vez y la mantiene en memoria hasta guardar_config"""
+    global _config_cache
+    if _config_cache is None:
+        config = {"servidor": "", "puerto": 5000, "habilitado": False}
+        ruta = get_config_path()
+        if os.path.exists(ruta):
+            try:
+                with open(ruta, 'r') as f:
+                    config = json.load(f)
+            except Exception:
+                pass
+        _config_cache = config
+    return dict(_config_cache)
+
+
+def guardar_config(config):
+    global _config_cache
+    ruta = get_config_path()
+    try:
+        with open(ruta, 'w') as f:
+            json.dump(config, f, indent=2)
+        _config_cache = None
+        return True
+    except Exception:
+        return False
+
+
+# ============================================
+# EXPORTACIÓN Y SINCRONIZACIÓN
+# ============================================
+
+@medido("exportar_a_csv")
+def exportar_a_csv(filtro=None, progreso=None, cancelado=None):
+    from exportacion import exportar_stream, ExportacionCancelada
+
+    config = cargar_config()
+    where, params, _ = planificar(filtro, usar_fts=fts_disponible())
+    try:
+        archivos, total = exportar_stream(
+            get_db(), where, params, get_app_dir(),
+            comprimir=config.get("exportar_gzip", False),
+            filas_por_archivo=config.get("filas_por_archivo", 0),
+            progreso=progreso, cancelado=cancelado
+        )
+    except ExportacionCancelada:
+        return None, "Exportación cancelada"
+    except Exception as e:
+        return None, f"Error exportando: {str(e)}"
+
+    if not total:
+        return None, "No hay registros para exportar"
+    if len(archivos) > 1:
+        return archivos[0], f"Exportado {total} registros en {len(archivos)} archivos"
+    return archivos[0], f"Exportado {total} registros"
+
+
+@medido("sincronizar")
+def sincronizar(cancelado=None, progreso=None):
+    """Sincroniza los cambios pendientes; lanza ErrorSinConexion/ErrorServidor si conviene reintentar"""
+    from sincronizacion import sincronizar_delta, descargar_cambios, ErrorSinConexion, ErrorServidor
+
+    config = cargar_config()
+    if not config.get("habilitado"):
+        return False, "Sincronización deshabilitada"
+
+    servidor = config.get("servidor", "").strip()
+    puerto = config.get("puerto", 5000)
+    if not servidor:
+        return False, "Servidor no configurado"
+
+    transporte = _obtener_transporte(f"http://{servidor}:{puerto}", config.get("formato_sync", "auto"))
+    exito, _, mensaje = sincronizar_delta(
+        get_db(), transporte, "Android" if ANDROID else "Desktop",
+        tam_lote=config.get("tam_lote_sync", 500),
+        paralelo=config.get("subidas_paralelas", 2),
+        cancelado=cancelado, progreso=progreso
+    )
+    if exito and config.get("descargar_cambios", True):
+        # El envío ya quedó confirmado: un fallo de la descarga no lo deshace
+        # ni dispara el reintento; el cursor guardado la retoma la próxima vez
+        try:
+            descargado, _, descarga = descargar_cambios(
+                get_db(), transporte,
+                tam_pagina=config.get("pagina_descarga", 1000),
+                maximo=config.get("cache_remota_max", 20000),
+                cancelado=cancelado
+            )
+        except (ErrorSinConexion, ErrorServidor) as e:
+            descargado, descarga = False, f"Descarga fallida: {e}"
+        if not descargado:
+            contar("sincronizar.descarga_fallo")
+        mensaje = f"{mensaje} · {descarga}"
+    contar("sincronizar.ok" if exito else "sincronizar.fallo")
+    return exito, mensaje
+
+
+_transporte = None
+
+
+def _obtener_transporte(base_url, formato):
+    """Reutiliza la sesión HTTP (keep-alive) mientras no cambie el servidor"""
+    global _transporte
+    # requests tarda más en importarse que todo el resto del núcleo
+    from transporte_sync import TransporteSync
+
+    if _transporte is None or _transporte.base_url != base_url or \
+            (formato != "auto" and _transporte.formato != formato):
+        if _transporte is not None:
+            _transporte.cerrar()
+        _transporte = TransporteSync(base_url, formato=formato)
+    return _transporte
+
+
+def sincronizar_con_servidor():
+    try:
+        return sincronizar()
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+
+
+# ============================================
+# PDF417 DESDE IMÁGENES
+# ============================================
+
+def leer_pdf417_desde_imagen(imagen_path):
+    """
+    Lee código PDF417 desde archivo de imagen
+    Usa el primer backend instalado (zxing-cpp o pyzbar). En el APK no se
+    empaquetan por tamaño, así que retorna None y se usa entrada manual.
+    """
+    from decodificacion_imagen import decodificar_imagen
+
+    return decodificar_imagen(imagen_path)
+
+
+def importar_imagenes(directorio, procesos=None, progreso=None):
+    """Lee todas las fotos de una carpeta y guarda las cédulas decodificadas"""
+    from decodificacion_imagen import obtener_backend, importar_carpeta
+
+    if obtener_backend() is None:
+        return 0, [], "No hay decodificador de imágenes instalado (zxing-cpp o pyzbar)"
+    guardados, fallidos = importar_carpeta(directorio, guardar_lote_en_db, parsear_datos,
+                                           procesos=procesos, progreso=progreso)
+    return guardados, fallidos, f"Importados {guardados} registros, {len(fallidos)} fallidos"
+
+
+# ============================================
+# ESTADÍSTICAS
+# ============================================
+
+@medido("estadisticas")
+def estadisticas(dias=30):
+    """Totales por sexo, edad, lugar y día desde las tablas resumen (sin recorrer ciudadanos)"""
+    from estadisticas import leer
+
+    with get_db().lectura() as conn:
+        return leer(conn, dias=dias)
+
+
+@medido("reconstruir_estadisticas")
+def reconstruir_estadisticas():
+    """Recalcula los resúmenes desde cero (tras una carga masiva o una migración)"""
+    archivo.reconstruir_resumenes_con_archivos(get_db(), archivo.directorio_archivo(get_db_path()))
+
+
+# ============================================
+# ARCHIVO
+# ============================================
+
+@medido("archivar_viejos")
+def archivar_viejos(cancelado=None):
+    """Mueve a archivo/ los registros de más de config["archivo_dias"] días.
+
+    Con config["archivo_dias_sincronizados"] los ya enviados al servidor se
+    archivan antes. Mientras la sincronización está habilitada los
+    pendientes no se archivan; sin ella se archivan pero siguen en la cola y
+    el envío los lee del archivo.
+    Devuelve {año: filas movidas}.
+    """
+    from datetime import date, timedelta
+
+    config = cargar_config()
+    dias = config.get("archivo_dias", archivo.DIAS_ARCHIVO)
+    if not dias:
+        return {}
+    hoy = date.today()
+    limite = int((hoy - timedelta(days=dias)).strftime("%Y%m%d"))
+    dias_sincronizados = config.get("archivo_dias_sincronizados")
+    limite_sincronizados = (int((hoy - timedelta(days=dias_sincronizados)).strftime("%Y%m%d"))
+                            if dias_sincronizados is not None else None)
+    movidas = archivo.archivar(get_db(), archivo.directorio_archivo(get_db_path()), limite,
+                               limite_sincronizados=limite_sincronizados,
+                               incluir_pendientes=not config.get("habilitado"), cancelado=cancelado)
+    if movidas:
+        cache_busquedas.invalidar()
+        contar("archivo.movidas", sum(movidas.values()))
+    return movidas
+
+
+# ============================================
+# CÓDIGOS ORIGINALES
+# ============================================
+
+def entrenar_diccionario_crudos():
+    """Arma el diccionario de compresión de los códigos cuando ya hay muestras; devuelve su id o None"""
+    with get_db().escritura() as conn:
+        return crudos.entrenar(conn)
+
+
+@medido("reparsear_crudos")
+def reparsear_crudos(procesos=None, aplicar=True, progreso=None, cancelado=None):
+    """Pasa los códigos guardados por el parser actual (ver crudos.reparsear)"""
+    informe = crudos.reparsear(get_db(), procesos=procesos, aplicar=aplicar,
+                               progreso=progreso, cancelado=cancelado)
+    if informe["actualizados"]:
+        cache_busquedas.invalidar()
+    return informe
+
+
+# ============================================
+# RESPALDOS
+# ============================================
+
+@medido("respaldar")
+def respaldar(progreso=None, cancelado=None):
+    """Respaldo en caliente de la DB a respaldos/; devuelve la ruta del archivo"""
+    config = cargar_config()
+    ruta = get_db_path()
+    return respaldo.respaldar(ruta, respaldo.directorio_respaldos(ruta),
+                              comprimir=config.get("respaldo_comprimir", True),
+                              conservar=config.get("respaldo_conservar", respaldo.CONSERVAR),
+                              progreso=progreso, cancelado=cancelado)
+
+
+def respaldo_pendiente():
+    """True si toca el respaldo programado (config["respaldo_horas"]; 0 lo apaga)"""
+    horas = cargar_config().get("respaldo_horas", respaldo.HORAS)
+    return bool(horas) and respaldo.pendiente(respaldo.directorio_respaldos(get_db_path()), horas)
+
+
+def listar_respaldos():
+    """[(fecha, ruta, bytes)] del más reciente al más viejo"""
+    return respaldo.listar(respaldo.directorio_respaldos(get_db_path()))
+
+
+@medido("restaurar_respaldo")
+def restaurar_respaldo(ruta):
+    """Carga un respaldo en la DB en uso y devuelve el respaldo de la base reemplazada.
+
+    Los archivos de archivo/ no forman parte del respaldo: lo archivado
+    después de la copia sigue allí y lo que vuelve a ciudadanos tiene
+    prioridad en las búsquedas.
+    """
+    previo = respaldo.restaurar(get_db(), ruta, comprimir=cargar_config().get("respaldo_comprimir", True))
+    init_db()   # la copia puede ser de un esquema anterior
+    return previo
+
+
+# ============================================
+# DIAGNÓSTICO
+# ============================================
+
+def _tamano(ruta):
+    try:
+        return os.path.getsize(ruta)
+    except OSError:
+        return 0
+
+
+def diagnostico():
+    """Métricas, filas, tamaño de la DB y cola de sincronización"""
+    from sincronizacion import contar_pendientes, leer_estado
+
+    gestor = get_db()
+    with gestor.lectura() as conn:
+        filas = {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                 for tabla in ("ciudadanos", "visitas", "sync_outbox", "crudos") if tiene_tabla(conn, tabla)}
+        ultima = leer_estado(conn, "ultima_sincronizacion")
+    ruta = get_db_path()
+    archivos, archivo_bytes = archivo.tamano(archivo.directorio_archivo(ruta))
+    respaldos = respaldo.listar(respaldo.directorio_respaldos(ruta))
+    return {
+        "filas": filas,
+        "db_bytes": _tamano(ruta),
+        "wal_bytes": _tamano(ruta + "-wal"),
+        "archivo": {"archivos": archivos, "bytes": archivo_bytes},
+        "ultimo_respaldo": respaldos[0][0].isoformat(" ", "seconds") if respaldos else None,
+        "sync": {"pendientes": contar_pendientes(gestor), "ultima": ultima},
+        "instrumentacion": instrumentacion.resumen(),
+    }
+
+
+def volcar_diagnostico(ruta=None):
+    """Guarda diagnostico() en un JSON del directorio de la app y devuelve la ruta"""
+    import platform
+    import sqlite3
+    from datetime import datetime
+
+    if ruta is None:
+        ruta = os.path.join(get_app_dir(), f"diagnostico_{datetime.now():%Y%m%d_%H%M%S}.json")
+    datos = diagnostico()
+    del datos["instrumentacion"]
+    datos["entorno"] = {"android": ANDROID, "python": platform.python_version(),
+                        "sqlite": sqlite3.sqlite_version, "plataforma": platform.platform()}
+    return instrumentacion.volcar_json(ruta, datos)
@@ -0,0 +1,163 @@
+"""
+Fuente de datos paginada por clave (keyset) para la lista de registros
+Mantiene en memoria solo una ventana acotada de páginas consecutivas
+"""
+
+from collections import deque, namedtuple
+
+from busqueda import planificar, predicado
+from campos import COLUMNAS
+
+TAM_PAGINA = 50
+PAGINAS_MAX = 6
+
+# Resultado de consultar(): se calcula en cualquier hilo y se aplica en el de la UI
+PrimeraPagina = namedtuple("PrimeraPagina", "where params filas hay_siguiente")
+
+
+class FuenteRegistros:
+    """Ventana deslizante de páginas sobre ciudadanos, ordenada por id.
+
+    Cada página se pide con `id > ultimo` / `id < primero` en vez de OFFSET,
+    así el coste de una página no depende de cuántas filas hay antes.
+    Las filas son tuplas (id, numero, nombres, apellidos, ...).
+    Con `cache` (busqueda.CacheBusquedas) las primeras páginas se reutilizan
+    y un filtro más largo se resuelve filtrando en memoria uno más corto.
+    """
+
+    def __init__(self, get_db, usar_fts=lambda: True, tam_pagina=TAM_PAGINA, paginas_max=PAGINAS_MAX,
+                 cache=None):
+        self._get_db = get_db
+        self._usar_fts = usar_fts
+        self._cache = cache
+        self.tam_pagina = tam_pagina
+        self.paginas_max = max(2, paginas_max)
+        self._paginas = deque()
+        self._where = "1"
+        self._params = ()
+        self.hay_anterior = False
+        self.hay_siguiente = False
+
+    def _consultar(self, condicion, params, descendente=False, where=None, where_params=None):
+        if where is None:
+            where, where_params = self._where, self._params
+        orden = "DESC" if descendente else "ASC"
+        sql = (f"SELECT id, {COLUMNAS} FROM ciudadanos "
+               f"WHERE ({where}) AND {condicion} ORDER BY id {orden} LIMIT ?")
+        with self._get_db().lectura() as conn:
+            filas = conn.execute(sql, where_params + params + (self.tam_pagina + 1,)).fetchall()
+        hay_mas = len(filas) > self.tam_pagina
+        filas = filas[:self.tam_pagina]
+        if descendente:
+            filas.reverse()
+        return filas, hay_mas
+
+    def desde_cache(self, filtro=None):
+        """PrimeraPagina de `filtro` sin tocar la DB, o None si la caché no la resuelve"""
+        if self._cache is None:
+            return None
+        usar_fts = self._usar_fts()
+        where, params, _ = planificar(filtro, usar_fts=usar_fts)
+        entrada = self._cache.obtener(filtro, usar_fts)
+        if entrada is not None:
+            return PrimeraPagina(where, params, *entrada)
+        ancestro = self._cache.ancestro(filtro, usar_fts)
+        if ancestro is None:
+            return None
+        filas_corto, generacion = ancestro
+        coincide = predicado(filtro, usar_fts)
+        filas = [fila for fila in filas_corto if coincide(fila[1], fila[2], fila[3])]
+        # El filtro corto no tenía más páginas: el acotado tampoco
+        self._cache.guardar(filtro, usar_fts, filas, False, generacion)
+        return PrimeraPagina(where, params, filas, False)
+
+    def consultar(self, filtro=None):
+        """PrimeraPagina de `filtro` (caché o DB) sin tocar la ventana; seguro desde otro hilo"""
+        pagina = self.desde_cache(filtro)
+        if pagina is not None:
+            return pagina
+        usar_fts = self._usar_fts()
+        generacion = self._cache.generacion if self._cache is not None else None
+        where, params, _ = planificar(filtro, usar_fts=usar_fts)
+        filas, hay_siguiente = self._consultar("1", (), where=where, where_params=params)
+        if self._cache is not None:
+            self._cache.guardar(filtro, usar_fts, filas, hay_siguiente, generacion)
+        return PrimeraPagina(where, params, filas, hay_siguiente)
+
+    def aplicar(self, pagina):
+        """Reemplaza la ventana por una PrimeraPagina ya consultada"""
+        self._where, self._params = pagina.where, pagina.params
+        self._paginas.clear()
+        self.hay_siguiente = pagina.hay_siguiente
+        self.hay_anterior = False
+        if pagina.filas:
+            # Copia: registro_guardado modifica las páginas y la caché las comparte
+            self._paginas.append(list(pagina.filas))
+        return self.filas()
+
+    def reiniciar(self, filtro=None):
+        """Descarta la ventana y carga la primera página del filtro"""
+        return self.aplicar(self.consultar(filtro))
+
+    def avanzar(self):
+        """Carga la página siguiente. Devuelve (filas_nuevas, filas_descartadas_al_inicio)"""
+        if not self._paginas or not self.hay_siguiente:
+            return [], 0
+        filas, self.hay_siguiente = self._consultar("id > ?", (self._paginas[-1][-1][0],))
+        if not filas:
+            return [], 0
+        self._paginas.append(filas)
+        descartadas = 0
+        if len(self._paginas) > self.paginas_max:
+            descartadas = len(self._paginas.popleft())
+            self.hay_anterior = True
+        return filas, descartadas
+
+    def retroceder(self):
+        """Carga la página anterior. Devuelve (filas_nuevas, filas_descartadas_al_final)"""
+        if not self._paginas or not self.hay_anterior:
+            return [], 0
+        filas, self.hay_anterior = self._consultar("id < ?", (self._paginas[0][0][0],), descendente=True)
+        if not filas:
+            return [], 0
+        self._paginas.appendleft(filas)
+        descartadas = 0
+        if len(self._paginas) > self.paginas_max:
+            descartadas = len(self._paginas.pop())
+            self.hay_siguiente = True
+        return filas, descartadas
+
+    def filas(self):
+        return [fila for pagina in self._paginas for fila in pagina]
+
+    def registro_guardado(self, rowid):
+        """Incorpora una fila recién escrita sin recargar la ventana.
+
+        Devuelve ('nueva', fila, descartadas_al_inicio) si se añadió al final,
+        ('cambio', indice, fila) si reemplazó una fila visible, o None si no
+        afecta a la ventana.
+        """
+        with self._get_db().lectura() as conn:
+            fila = conn.execute(
+                f"SELECT id, {COLUMNAS} FROM ciudadanos WHERE id = ? AND ({self._where})",
+                (rowid,) + self._params).fetchone()
+        if fila is None:
+            return None
+        indice = 0
+        for pagina in self._paginas:
+            for i, actual in enumerate(pagina):
+                if actual[0] == rowid:
+                    pagina[i] = fila
+                    return ("cambio", indice + i, fila)
+            indice += len(pagina)
+        if self.hay_siguiente:
+            # La fila queda más allá de la ventana; se verá al avanzar
+            return None
+        descartadas = 0
+        if not self._paginas or len(self._paginas[-1]) >= self.tam_pagina:
+            self._paginas.append([])
+            if len(self._paginas) > self.paginas_max:
+                descartadas = len(self._paginas.popleft())
+                self.hay_anterior = True
+        self._paginas[-1].append(fila)
+        return ("nueva", fila, descartadas)
@@ -0,0 +1,148 @@
+"""
+Parser del código PDF417 de la cédula colombiana
+Patrones compilados una sola vez y un único recorrido por la cadena
+"""
+
+import re
+from itertools import islice
+
+from decodificador_cedula import decodificar, DISENOS
+
+LARGO_MIN_DISENO = min(d.largo_min for d in DISENOS)
+
+# Secuencias de mayúsculas ASCII o de dígitos: los únicos tokens que importan
+_TOKEN = re.compile(r"[A-Z]+|\d+")
+
+# Tras [MF]: año(4) mes(2) día(2) municipio(2) departamento(3)
+_LARGO_FECHA = 13
+_LARGO_DOCUMENTO = 10
+_PALABRAS_IGNORADAS = frozenset(("DSK", "PUB", "PUBDSK"))
+_MAX_PALABRAS = 4
+
+_CAMPOS = ("numero", "nombres", "apellidos", "fecha_nacimiento", "sexo", "lugar_expedicion")
+_VACIO = dict.fromkeys(_CAMPOS, "")
+
+
+def _resultado_vacio():
+    return _VACIO.copy()
+
+
+def _parsear_arrobas(s):
+    campos = [c.strip() for c in s.split("@")]
+    n = len(campos)
+    return {
+        "numero": campos[1] if n > 1 else "",
+        "nombres": campos[2] if n > 2 else "",
+        "apellidos": campos[3] if n > 3 else "",
+        "fecha_nacimiento": campos[4] if n > 4 else "",
+        "sexo": campos[5] if n > 5 else "",
+        "lugar_expedicion": campos[6] if n > 6 else ""
+    }
+
+
+def parsear_datos(data):
+    """Parser del código PDF417 colombiano.
+
+    Si el registro coincide con un diseño conocido se decodifica por
+    posiciones (decodificador_cedula). Si no, un solo recorrido con _TOKEN encuentra a la vez: la fecha (mayúsculas
+    terminadas en M/F seguidas de 13+ dígitos), el último número de 10+
+    dígitos anterior a ella y las primeras cuatro palabras válidas.
+    """
+    if not data:
+        return _resultado_vacio()
+
+    # Registro con el diseño conocido: lectura directa por posiciones
+    if isinstance(data, str):
+        s = data
+        if len(s) >= LARGO_MIN_DISENO:
+            try:
+                crudo = s.encode("latin-1")
+            except UnicodeEncodeError:
+                crudo = None
+            resultado = decodificar(crudo) if crudo is not None else None
+            if resultado is not None:
+                return resultado
+    else:
+        resultado = decodificar(data)
+        if resultado is not None:
+            return resultado
+        s = bytes(data).decode("utf-8", errors="ignore")
+
+    if "@" in s and s.count("@") >= 3:
+        return _parsear_arrobas(s)
+
+    fecha = None          # (sexo, dígitos) de la primera coincidencia
+    documento = ""
+    palabras = []
+    anterior = None       # token de mayúsculas inmediatamente previo
+
+    for m in _TOKEN.finditer(s):
+        token = m.group()
+        if not ("A" <= token[0] <= "Z"):
+            # Dígitos (\d también acepta dígitos Unicode)
+            if fecha is None:
+                if (anterior is not None and anterior.end() == m.start()
+                        and len(token) >= _LARGO_FECHA and anterior.group()[-1] in "MF"):
+                    fecha = (anterior.group()[-1], token)
+                elif len(token) >= _LARGO_DOCUMENTO:
+                    documento = token
+            anterior = None
+        else:
+            if len(palabras) < _MAX_PALABRAS and len(token) >= 3 and token not in _PALABRAS_IGNORADAS:
+                palabras.append(token)
+            anterior = m
+        if fecha is not None and len(palabras) >= _MAX_PALABRAS:
+            break
+
+    if fecha is None:
+        return _resultado_vacio()
+
+    genero, digitos = fecha
+    year = digitos[0:4]
+    month = digitos[4:6]
+    day = digitos[6:8]
+    municipio = digitos[8:10]
+    departamento = digitos[10:13]
+
+    apellidos = " ".join(palabras[0:2])
+    nombres = " ".join(palabras[2:4])
+
+    fecha_nacimiento = ""
+    y = int(year) if year.isdigit() else 0
+    mes = int(month) if month.isdigit() else 0
+    d = int(day) if day.isdigit() else 0
+    if 1900 <= y <= 2100 and 1 <= mes <= 12 and 1 <= d <= 31:
+        fecha_nacimiento = f"{year}-{month}-{day}"
+
+    return {
+        "numero": documento,
+        "nombres": nombres.title(),
+        "apellidos": apellidos.title(),
+        "fecha_nacimiento": fecha_nacimiento,
+        "sexo": genero,
+        "lugar_expedicion": f"{departamento}-{municipio}"
+    }
+
+
+def parsear_lote(datos, procesos=None, tam_bloque=256):
+    """Parsea un iterable de códigos y va entregando los resultados en orden.
+
+    Con `procesos` > 1 reparte el trabajo en un pool de procesos, enviando
+    ventanas acotadas para no materializar la entrada completa. En Android
+    conviene dejarlo en None (sin multiprocessing).
+    """
+    if not procesos or procesos <= 1:
+        for dato in datos:
+            yield parsear_datos(dato)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    iterador = iter(datos)
+    ventana = tam_bloque * procesos * 4
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        while True:
+            bloque = list(islice(iterador, ventana))
+            if not bloque:
+                break
+            yield from pool.map(parsear_datos, bloque, chunksize=tam_bloque)
@@ -0,0 +1,256 @@
+"""
+Respaldos en caliente con la API de backup de SQLite
+La copia avanza por pasos de pocas páginas desde un hilo aparte, así la app
+sigue leyendo y guardando mientras tanto. Cada copia pasa integrity_check
+antes de darse por buena, se puede comprimir con gzip y se rotan las más
+viejas. restaurar() verifica la copia, respalda la base actual y carga la
+copia en la base en uso
+
+    python respaldo.py --db cedulas.db                 # respaldar ahora
+    python respaldo.py --db cedulas.db --listar
+    python respaldo.py --db cedulas.db --restaurar respaldos/cedulas_20260101_120000_000000.db.gz
+"""
+
+import argparse
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+PAGINAS_POR_PASO = 256      # ~1 MB con páginas de 4 KiB
+PAUSA_PASO = 0.005          # segundos entre pasos: deja pasar a las escrituras
+REINICIOS_MAX = 3           # luego se copia en un solo paso (una lectura WAL)
+CONSERVAR = 7
+HORAS = 24
+BLOQUE_GZIP = 1024 * 1024
+# Con microsegundos: un respaldo programado y uno manual (o el previo a
+# restaurar) en el mismo segundo no comparten nombre. Los de antes no los tienen
+_NOMBRE = re.compile(r"cedulas_(\d{8}_\d{6})(?:_(\d{6}))?\.db(\.gz)?")
+
+# Un respaldo a la vez (programado, manual o previo a restaurar)
+_lock = threading.Lock()
+
+
+class ErrorRespaldo(Exception):
+    """Copia cancelada, incompleta o que no pasa integrity_check"""
+
+
+class _Reiniciado(Exception):
+    pass
+
+
+def directorio_respaldos(ruta_db):
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_db)), "respaldos")
+
+
+def listar(directorio):
+    """[(fecha, ruta, bytes)] de los respaldos terminados, del más reciente al más viejo"""
+    try:
+        nombres = os.listdir(directorio)
+    except FileNotFoundError:
+        return []
+    respaldos = []
+    for nombre in nombres:
+        m = _NOMBRE.fullmatch(nombre)
+        if m:
+            ruta = os.path.join(directorio, nombre)
+            fecha = datetime.strptime(f"{m.group(1)}_{m.group(2) or '000000'}", "%Y%m%d_%H%M%S_%f")
+            respaldos.append((fecha, ruta, os.path.getsize(ruta)))
+    return sorted(respaldos, reverse=True)
+
+
+def rotar(directorio, conservar=CONSERVAR):
+    """Borra los respaldos más viejos y deja los `conservar` más recientes"""
+    for _, ruta, _ in listar(directorio)[conservar:]:
+        os.remove(ruta)
+
+
+def pendiente(directorio, horas=HORAS, ahora=None):
+    """True si el último respaldo tiene más de `horas` (o no hay ninguno)"""
+    respaldos = listar(directorio)
+    if not respaldos:
+        return True
+    return ((ahora or datetime.now()) - respaldos[0][0]).total_seconds() >= horas * 3600
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+
+def _verificar(conn):
+    resultado = [fila[0] for fila in conn.execute("PRAGMA integrity_check")]
+    if resultado != ["ok"]:
+        raise ErrorRespaldo("; ".join(resultado[:5]))
+
+
+def _copiar(origen, destino, paginas, pausa, progreso, cancelado):
+    """origen.backup por pasos; si otras conexiones la reinician seguido, en un paso"""
+    reinicios = 0
+    anteriores = None
+
+    def al_paso(estado, restantes, total):
+        nonlocal reinicios, anteriores
+        if cancelado is not None and cancelado():
+            raise ErrorRespaldo("Respaldo cancelado")
+        # Una escritura de otra conexión hace que SQLite empiece de nuevo
+        if anteriores is not None and restantes > anteriores:
+            reinicios += 1
+            if reinicios >= REINICIOS_MAX:
+                raise _Reiniciado()
+        anteriores = restantes
+        if progreso is not None:
+            progreso(total - restantes, total)
+
+    try:
+        origen.backup(destino, pages=paginas, progress=al_paso, sleep=pausa)
+    except _Reiniciado:
+        # En WAL copiar en un solo paso es una lectura larga: no frena a los escritores
+        origen.backup(destino)
+
+
+def _comprimir(ruta, final):
+    parcial = final + ".parcial"
+    try:
+        with open(ruta, "rb") as entrada, gzip.open(parcial, "wb", compresslevel=6) as salida:
+            shutil.copyfileobj(entrada, salida, BLOQUE_GZIP)
+        os.replace(parcial, final)
+    except BaseException:
+        _borrar(parcial)
+        raise
+    os.remove(ruta)
+
+
+def respaldar(ruta_db, directorio, comprimir=True, conservar=CONSERVAR, paginas=PAGINAS_POR_PASO,
+              pausa=PAUSA_PASO, progreso=None, cancelado=None):
+    """Copia la base en uso a directorio/cedulas_AAAAMMDD_HHMMSS_ffffff.db[.gz] y devuelve la ruta.
+
+    La copia se arma en un .parcial que solo se renombra después de pasar
+    integrity_check; queda en modo DELETE, un solo archivo sin -wal. Nunca
+    reemplaza un respaldo existente: si el nombre está tomado lanza ErrorRespaldo.
+    `progreso(copiadas, total)` recibe páginas. Con `conservar` None no se rota.
+    """
+    with _lock:
+        os.makedirs(directorio, exist_ok=True)
+        base = os.path.join(directorio, f"cedulas_{datetime.now():%Y%m%d_%H%M%S_%f}.db")
+        final = base + ".gz" if comprimir else base
+        if os.path.exists(base) or os.path.exists(base + ".gz"):
+            raise ErrorRespaldo(f"Ya existe un respaldo {os.path.basename(final)}")
+        parcial = base + ".parcial"
+        _borrar(parcial)
+        origen = sqlite3.connect(ruta_db)
+        try:
+            destino = sqlite3.connect(parcial)
+            try:
+                _copiar(origen, destino, paginas, pausa, progreso, cancelado)
+                destino.execute("PRAGMA journal_mode=DELETE")
+                _verificar(destino)
+            finally:
+                destino.close()
+        except BaseException:
+            _borrar(parcial)
+            raise
+        finally:
+            origen.close()
+        if comprimir:
+            _comprimir(parcial, final)
+        else:
+            os.replace(parcial, final)
+        if conservar is not None:
+            rotar(directorio, conservar)
+        return final
+
+
+@contextmanager
+def abrir(ruta):
+    """Conexión a un respaldo; los .gz se descomprimen a un temporal que se borra al salir"""
+    temporal = None
+    if ruta.endswith(".gz"):
+        temporal = ruta[:-3] + ".tmp"
+        with gzip.open(ruta, "rb") as entrada, open(temporal, "wb") as salida:
+            shutil.copyfileobj(entrada, salida, BLOQUE_GZIP)
+    conn = sqlite3.connect(temporal or ruta)
+    try:
+        yield conn
+    finally:
+        conn.close()
+        if temporal is not None:
+            _borrar(temporal)
+
+
+def verificar(ruta):
+    """integrity_check de un respaldo; lanza ErrorRespaldo si está dañado"""
+    try:
+        with abrir(ruta) as conn:
+            _verificar(conn)
+    except (sqlite3.DatabaseError, OSError, EOFError) as e:
+        raise ErrorRespaldo(str(e))
+
+
+def restaurar(gestor, ruta, directorio=None, comprimir=True):
+    """Carga el respaldo `ruta` en la base del gestor; devuelve el respaldo de la base anterior.
+
+    No toca nada si la copia no pasa integrity_check. La base actual se
+    respalda primero (sin rotar) para poder deshacer. Quien llama debe
+    migrar después: la copia puede ser de una versión anterior del esquema.
+    """
+    try:
+        with abrir(ruta) as origen:
+            _verificar(origen)
+            previo = respaldar(gestor.ruta, directorio or directorio_respaldos(gestor.ruta),
+                               comprimir=comprimir, conservar=None)
+            gestor.restaurar(origen)
+    except (sqlite3.DatabaseError, OSError, EOFError) as e:
+        raise ErrorRespaldo(str(e))
+    return previo
+
+
+def main(argv=None):
+    from db_conexion import GestorConexiones
+    from db_esquema import crear_esquema_base, migrar
+
+    parser = argparse.ArgumentParser(description="Respaldos en caliente de la base de cédulas")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "cedulas.db"))
+    parser.add_argument("--directorio", help="por defecto, respaldos/ junto a la DB")
+    parser.add_argument("--sin-comprimir", action="store_true")
+    parser.add_argument("--conservar", type=int, default=CONSERVAR)
+    parser.add_argument("--listar", action="store_true")
+    parser.add_argument("--verificar", metavar="RESPALDO")
+    parser.add_argument("--restaurar", metavar="RESPALDO")
+    args = parser.parse_args(argv)
+    directorio = args.directorio or directorio_respaldos(args.db)
+
+    try:
+        if args.listar:
+            for fecha, ruta, tamano in listar(directorio):
+                print(f"{fecha:%Y-%m-%d %H:%M:%S}  {tamano / (1024 * 1024):8.1f} MB  {ruta}")
+        elif args.verificar:
+            verificar(args.verificar)
+            print("ok")
+        elif args.restaurar:
+            gestor = GestorConexiones(args.db)
+            try:
+                previo = restaurar(gestor, args.restaurar, directorio, comprimir=not args.sin_comprimir)
+                with gestor.escritura() as conn:
+                    crear_esquema_base(conn)
+                    migrar(conn)
+            finally:
+                gestor.cerrar()
+            print(f"Restaurado; la base anterior quedó en {previo}")
+        else:
+            print(respaldar(args.db, directorio, comprimir=not args.sin_comprimir, conservar=args.conservar))
+    except ErrorRespaldo as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
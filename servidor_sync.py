@@ -0,0 +1,419 @@
+"""
+Servidor de sincronización de referencia
+Recibe los lotes de la app (JSON de /api/sincronizar y NDJSON+gzip de
+/api/sincronizar/ndjson) y los guarda en SQLite sin duplicar nada:
+
+- Cada registro se guarda una vez por (dispositivo_id, numero); un reenvío
+  lo sobrescribe solo si viene de un lote igual o más nuevo (seq mayor o
+  igual), así los lotes paralelos que llegan desordenados no pisan datos
+  recientes con viejos.
+- Un lote_id ya recibido se confirma sin volver a escribirlo.
+
+Cada escritura lleva una versión creciente; GET /api/cambios?desde=V entrega
+por páginas lo que cambió después de V para que los demás dispositivos lo
+guarden en su caché local.
+
+Los hilos HTTP decodifican y validan en paralelo; un solo hilo escribe y agrupa
+en una transacción las peticiones que llegan mientras la anterior se confirma
+(group commit), por eso muchos dispositivos a la vez no se pelean por el
+bloqueo de SQLite.
+
+    python servidor_sync.py --db servidor_sync.db --puerto 5000
+"""
+
+import argparse
+import itertools
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import instrumentacion
+from db_conexion import GestorConexiones
+from escritura_diferida import EscritorDiferido
+from instrumentacion import medido, contar
+from campos import CAMPOS
+
+RUTA_JSON = "/api/sincronizar"
+RUTA_NDJSON = "/api/sincronizar/ndjson"
+RUTA_ESTADO = "/api/estado"
+RUTA_CAMBIOS = "/api/cambios"
+PAGINA_CAMBIOS = 1000
+PAGINA_CAMBIOS_MAX = 5000
+PETICIONES_POR_TRANSACCION = 64
+CUERPO_MAX = 64 * 1024 * 1024
+CONEXIONES_EN_ESPERA = 256    # backlog de listen(); el de socketserver (5) corta conexiones
+ESPERA_ESCRITURA_S = 30
+
+ESQUEMA = ("""
+CREATE TABLE IF NOT EXISTS registros (
+    dispositivo_id TEXT NOT NULL,
+    numero TEXT NOT NULL,
+    nombres TEXT,
+    apellidos TEXT,
+    fecha_nacimiento TEXT,
+    sexo TEXT,
+    lugar_expedicion TEXT,
+    dispositivo TEXT,
+    seq INTEGER NOT NULL DEFAULT 0,
+    recibido TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dispositivo_id, numero)
+) WITHOUT ROWID
+""", """
+CREATE TABLE IF NOT EXISTS lotes (
+    lote_id TEXT PRIMARY KEY,
+    dispositivo_id TEXT,
+    desde_seq INTEGER,
+    hasta_seq INTEGER,
+    registros INTEGER,
+    recibido TEXT
+) WITHOUT ROWID
+""")
+
+# Índice de versión aparte: una DB creada antes de /api/cambios recibe la
+# columna con ALTER TABLE antes de indexarla
+INDICE_VERSION = "CREATE INDEX IF NOT EXISTS idx_registros_version ON registros(version)"
+
+_UPSERT = f"""
+INSERT INTO registros (dispositivo_id, {", ".join(CAMPOS)}, dispositivo, seq, recibido, version)
+VALUES (?, {", ".join("?" * len(CAMPOS))}, ?, ?, ?, ?)
+ON CONFLICT (dispositivo_id, numero) DO UPDATE SET
+    {", ".join(f"{c} = excluded.{c}" for c in CAMPOS[1:])},
+    dispositivo = excluded.dispositivo, seq = excluded.seq, recibido = excluded.recibido,
+    version = excluded.version
+WHERE excluded.seq >= registros.seq
+"""
+
+_CAMBIOS = f"""
+SELECT version, dispositivo_id, {", ".join(CAMPOS)} FROM registros
+WHERE version > ? ORDER BY version LIMIT ?
+"""
+
+
+class PeticionInvalida(Exception):
+    """Cuerpo o metadatos que no cumplen el contrato (responde 400)"""
+
+
+class _Peticion:
+    """Lote decodificado esperando al hilo escritor"""
+
+    __slots__ = ("lote_id", "dispositivo_id", "desde_seq", "hasta_seq", "filas",
+                 "evento", "error", "duplicado")
+
+    def __init__(self, lote_id, dispositivo_id, desde_seq, hasta_seq, filas):
+        self.lote_id = lote_id
+        self.dispositivo_id = dispositivo_id
+        self.desde_seq = desde_seq
+        self.hasta_seq = hasta_seq
+        self.filas = filas
+        self.evento = threading.Event()
+        self.error = None
+        self.duplicado = False
+
+
+def _entero(valor):
+    if valor in (None, ""):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise PeticionInvalida(f"Entero inválido: {valor!r}")
+
+
+def decodificar(ruta, cabeceras, cuerpo):
+    """Convierte una petición en _Peticion; lanza PeticionInvalida si no cumple el contrato"""
+    if cabeceras.get("Content-Encoding", "").lower() == "gzip":
+        try:
+            cuerpo = zlib.decompress(cuerpo, 31)
+        except zlib.error:
+            raise PeticionInvalida("gzip inválido")
+    try:
+        if ruta == RUTA_NDJSON:
+            meta = {
+                "dispositivo": cabeceras.get("X-Dispositivo"),
+                "dispositivo_id": cabeceras.get("X-Dispositivo-Id"),
+                "lote_id": cabeceras.get("X-Lote-Id"),
+                "desde_seq": cabeceras.get("X-Desde-Seq"),
+                "hasta_seq": cabeceras.get("X-Hasta-Seq"),
+            }
+            registros = [json.loads(linea) for linea in cuerpo.splitlines() if linea.strip()]
+        else:
+            meta = json.loads(cuerpo)
+            registros = meta.get("registros")
+    except (ValueError, AttributeError):
+        raise PeticionInvalida("JSON inválido")
+    if not isinstance(registros, list):
+        raise PeticionInvalida("Falta la lista de registros")
+
+    dispositivo = meta.get("dispositivo") or ""
+    # Los clientes antiguos solo mandan el nombre del equipo
+    dispositivo_id = meta.get("dispositivo_id") or dispositivo
+    if not dispositivo_id:
+        raise PeticionInvalida("Falta dispositivo_id")
+    hasta_seq = _entero(meta.get("hasta_seq"))
+    seq = hasta_seq or 0
+    recibido = datetime.now().isoformat(timespec="seconds")
+
+    filas = []
+    for registro in registros:
+        if not isinstance(registro, dict) or not registro.get("numero"):
+            raise PeticionInvalida("Registro sin numero")
+        valores = tuple(registro.get(c) for c in CAMPOS)
+        # sqlite3 no sabe guardar listas ni objetos: sería un 500 en el escritor
+        if not all(v is None or isinstance(v, str) for v in valores):
+            raise PeticionInvalida(f"Campo no textual en el registro {registro['numero']!r}")
+        filas.append((dispositivo_id, *valores, dispositivo, seq, recibido))
+    return _Peticion(meta.get("lote_id") or None, dispositivo_id,
+                     _entero(meta.get("desde_seq")), hasta_seq, filas)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length") or 0)
+        if largo > CUERPO_MAX:
+            self.close_connection = True
+            self._responder(413, {"error": "Lote demasiado grande"})
+            return
+        cuerpo = self.rfile.read(largo)
+        if self.path not in (RUTA_JSON, RUTA_NDJSON):
+            self._responder(404, {"error": "Ruta desconocida"})
+            return
+        try:
+            peticion = decodificar(self.path, self.headers, cuerpo)
+        except PeticionInvalida as e:
+            contar("servidor.rechazadas")
+            self._responder(400, {"error": str(e)})
+            return
+
+        _, codigo, respuesta = self.server.sync.recibir(peticion)
+        self._responder(codigo, respuesta)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == RUTA_ESTADO:
+            self._responder(200, self.server.sync.estado())
+            return
+        if url.path != RUTA_CAMBIOS:
+            self._responder(404, {"error": "Ruta desconocida"})
+            return
+        consulta = parse_qs(url.query)
+        try:
+            desde = _entero(consulta.get("desde", ["0"])[0]) or 0
+            limite = _entero(consulta.get("limite", [""])[0]) or PAGINA_CAMBIOS
+        except PeticionInvalida as e:
+            self._responder(400, {"error": str(e)})
+            return
+        excluir = consulta.get("excluir", [""])[0]
+        comprimir = "gzip" in self.headers.get("Accept-Encoding", "")
+        self._responder(200, self.server.sync.cambios(desde, limite, excluir), comprimir)
+
+    def _responder(self, codigo, datos, comprimir=False):
+        cuerpo = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if comprimir:
+            cuerpo = zlib.compress(cuerpo, 6, 31)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ServidorHTTP(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = CONEXIONES_EN_ESPERA
+
+
+class ServidorSync:
+    """Receptor HTTP con escritura agrupada sobre SQLite.
+
+    Se usa como servidor (`servir()`) o, en pruebas, como context manager que
+    atiende en un hilo aparte; `puerto=0` elige uno libre.
+    """
+
+    def __init__(self, ruta_db, host="127.0.0.1", puerto=5000,
+                 peticiones_por_transaccion=PETICIONES_POR_TRANSACCION):
+        self.gestor = GestorConexiones(ruta_db)
+        with self.gestor.escritura() as conn:
+            for sentencia in ESQUEMA:
+                conn.execute(sentencia)
+            columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(registros)")}
+            if "version" not in columnas:
+                conn.execute("ALTER TABLE registros ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+                conn.execute("""
+                UPDATE registros SET version = v.n FROM (
+                    SELECT dispositivo_id, numero, row_number() OVER (ORDER BY recibido, seq) AS n
+                    FROM registros) v
+                WHERE v.dispositivo_id = registros.dispositivo_id AND v.numero = registros.numero
+                """)
+            conn.execute(INDICE_VERSION)
+            ultima = conn.execute("SELECT COALESCE(MAX(version), 0) FROM registros").fetchone()[0]
+        # Solo el hilo escritor toma versiones: se confirman en orden creciente
+        self._versiones = itertools.count(ultima + 1)
+        # Sin reintentos: una petición que falla no debe frenar a las demás;
+        # sus llamadores reciben el error y el cliente reenvía el lote
+        self.escritor = EscritorDiferido(
+            self._guardar, max_lote=peticiones_por_transaccion, max_espera_ms=0,
+            al_guardar=self._liberar, al_error=self._fallar
+        )
+        self._http = _ServidorHTTP((host, puerto), _Manejador)
+        self._http.sync = self
+        self.puerto = self._http.server_address[1]
+        self._hilo = None
+        self._inicio = time.monotonic()
+
+    # --- Escritura ---
+
+    def recibir(self, peticion):
+        """Encola y espera a que el lote quede confirmado. Devuelve (ok, código, respuesta)"""
+        try:
+            self.escritor.encolar(peticion)
+        except RuntimeError:
+            return False, 503, {"error": "Servidor detenido"}
+        if not peticion.evento.wait(ESPERA_ESCRITURA_S):
+            return False, 503, {"error": "Escritura demorada"}
+        if peticion.error is not None:
+            return False, 500, {"error": str(peticion.error)}
+        respuesta = {"ok": True, "registros": len(peticion.filas), "duplicado": peticion.duplicado}
+        if peticion.hasta_seq is not None:
+            respuesta["hasta_seq"] = peticion.hasta_seq
+        return True, 200, respuesta
+
+    @medido("servidor.transaccion")
+    def _guardar(self, peticiones):
+        with self.gestor.escritura() as conn:
+            for p in peticiones:
+                # Un savepoint por petición: si una falla, solo ella recibe el error
+                conn.execute("SAVEPOINT peticion")
+                try:
+                    self._guardar_peticion(conn, p)
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO peticion")
+                    p.error = e
+                conn.execute("RELEASE peticion")
+        correctas = [p for p in peticiones if p.error is None]
+        contar("servidor.peticiones", len(peticiones))
+        contar("servidor.peticiones_fallidas", len(peticiones) - len(correctas))
+        contar("servidor.lotes_duplicados", sum(p.duplicado for p in correctas))
+        contar("servidor.registros", sum(len(p.filas) for p in correctas if not p.duplicado))
+
+    def _guardar_peticion(self, conn, p):
+        if p.lote_id is not None and conn.execute(
+                "SELECT 1 FROM lotes WHERE lote_id = ?", (p.lote_id,)).fetchone():
+            p.duplicado = True
+            return
+        # Las versiones de una petición deshecha quedan como hueco: el cursor
+        # de /api/cambios solo necesita que crezcan
+        conn.executemany(_UPSERT, [fila + (next(self._versiones),) for fila in p.filas])
+        if p.lote_id is not None:
+            conn.execute(
+                "INSERT INTO lotes (lote_id, dispositivo_id, desde_seq, hasta_seq, registros, recibido)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (p.lote_id, p.dispositivo_id, p.desde_seq, p.hasta_seq, len(p.filas),
+                 datetime.now().isoformat(timespec="seconds")))
+
+    @staticmethod
+    def _liberar(peticiones):
+        for p in peticiones:
+            p.evento.set()
+
+    @staticmethod
+    def _fallar(peticiones, error):
+        for p in peticiones:
+            p.error = error
+            p.evento.set()
+
+    # --- Consulta ---
+
+    def estado(self):
+        with self.gestor.lectura() as conn:
+            registros, dispositivos = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT dispositivo_id) FROM registros").fetchone()
+            lotes = conn.execute("SELECT COUNT(*) FROM lotes").fetchone()[0]
+        return {
+            "registros": registros,
+            "dispositivos": dispositivos,
+            "lotes": lotes,
+            "en_cola": self.escritor.pendientes,
+            "segundos_activo": round(time.monotonic() - self._inicio, 1),
+            "instrumentacion": instrumentacion.resumen(),
+        }
+
+    def cambios(self, desde, limite=PAGINA_CAMBIOS, excluir=""):
+        """Página de registros con versión > desde, sin los del dispositivo `excluir`.
+
+        `hasta` es la versión de la última fila recorrida, también si era del
+        propio dispositivo y no se entregó, para que el cursor no vuelva a
+        pasar por ellas. `maximo` permite al cliente notar que la DB del
+        servidor se reemplazó (su cursor quedaría por delante).
+        """
+        limite = max(1, min(limite, PAGINA_CAMBIOS_MAX))
+        with self.gestor.lectura() as conn:
+            filas = conn.execute(_CAMBIOS, (desde, limite + 1)).fetchall()
+            maximo = conn.execute("SELECT COALESCE(MAX(version), 0) FROM registros").fetchone()[0]
+        hay_mas = len(filas) > limite
+        filas = filas[:limite]
+        contar("servidor.cambios_servidos", len(filas))
+        return {
+            "campos": ["version", *CAMPOS],
+            "registros": [[version, *campos] for version, dispositivo_id, *campos in filas
+                          if dispositivo_id != excluir],
+            "hasta": filas[-1][0] if filas else desde,
+            "hay_mas": hay_mas,
+            "maximo": maximo,
+        }
+
+    # --- Ciclo de vida ---
+
+    def servir(self):
+        try:
+            self._http.serve_forever()
+        finally:
+            self.cerrar()
+
+    def cerrar(self):
+        self._http.server_close()
+        # Lo que no se escribió a tiempo se responde con error, no se espera
+        self._fallar(self.escritor.detener(ESPERA_ESCRITURA_S), RuntimeError("Servidor detenido"))
+        self.gestor.cerrar()
+
+    def __enter__(self):
+        self._hilo = threading.Thread(target=self._http.serve_forever, name="servidor-sync", daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._http.shutdown()
+        self.cerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de sincronización de referencia (SQLite)")
+    parser.add_argument("--db", default="servidor_sync.db")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=5000)
+    parser.add_argument("--peticiones-por-transaccion", type=int, default=PETICIONES_POR_TRANSACCION)
+    parser.add_argument("--sin-metricas", action="store_true", help="no medir latencias internas")
+    args = parser.parse_args(argv)
+
+    instrumentacion.activar(not args.sin_metricas)
+    servidor = ServidorSync(args.db, args.host, args.puerto, args.peticiones_por_transaccion)
+    print(f"Escuchando en http://{args.host}:{servidor.puerto} (DB: {args.db})", flush=True)
+    try:
+        servidor.servir()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
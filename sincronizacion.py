@@ -0,0 +1,246 @@
+"""
+Sincronización incremental con el servidor
+Envía solo los cambios de sync_outbox y avanza la marca de agua al confirmarse.
+En sentido contrario descarga por páginas lo que registraron los demás
+dispositivos desde el último cursor y lo guarda en cache_remota
+"""
+
+import itertools
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import archivo
+from campos import CAMPOS, COLUMNAS, a_columnas, legible
+
+TAM_LOTE = 500
+PAGINA_DESCARGA = 1000
+CACHE_REMOTA_MAX = 20000      # filas (~100 bytes cada una con índices)
+
+_GUARDAR_REMOTO = f"""
+INSERT INTO cache_remota ({COLUMNAS}, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(numero) DO UPDATE SET
+    nombres=excluded.nombres, apellidos=excluded.apellidos,
+    fecha_nacimiento=excluded.fecha_nacimiento, sexo=excluded.sexo,
+    departamento=excluded.departamento, municipio=excluded.municipio,
+    lugar_texto=excluded.lugar_texto, version=excluded.version
+WHERE excluded.version >= cache_remota.version
+"""
+
+
+class ErrorSinConexion(Exception):
+    """No se pudo contactar al servidor (red caída, DNS, timeout)"""
+
+
+class ErrorServidor(Exception):
+    """El servidor respondió con un error transitorio (5xx)"""
+
+
+def leer_estado(conn, clave, defecto=None):
+    fila = conn.execute("SELECT valor FROM sync_estado WHERE clave=?", (clave,)).fetchone()
+    return fila[0] if fila else defecto
+
+
+def escribir_estado(conn, clave, valor):
+    conn.execute("INSERT OR REPLACE INTO sync_estado (clave, valor) VALUES (?, ?)", (clave, str(valor)))
+
+
+def obtener_dispositivo_id(gestor):
+    """Identificador estable del dispositivo, creado la primera vez"""
+    with gestor.lectura() as conn:
+        dispositivo_id = leer_estado(conn, "dispositivo_id")
+    if dispositivo_id:
+        return dispositivo_id
+    with gestor.escritura() as conn:
+        dispositivo_id = leer_estado(conn, "dispositivo_id")
+        if not dispositivo_id:
+            dispositivo_id = uuid.uuid4().hex
+            escribir_estado(conn, "dispositivo_id", dispositivo_id)
+    return dispositivo_id
+
+
+def marca_de_agua(gestor):
+    with gestor.lectura() as conn:
+        return int(leer_estado(conn, "ultimo_seq", 0))
+
+
+def contar_pendientes(gestor):
+    with gestor.lectura() as conn:
+        return conn.execute("SELECT COUNT(DISTINCT ciudadano_id) FROM sync_outbox").fetchone()[0]
+
+
+def leer_lote(conn, desde_seq, limite=TAM_LOTE, archivos=()):
+    """Cambios con seq > desde_seq, uno por ciudadano.
+
+    Devuelve (hasta_seq, cursor) donde hasta_seq es el mayor seq cubierto y el
+    cursor recorre los registros legibles (en el orden de CAMPOS) sin materializarlos.
+    Los que ya no están en ciudadanos se buscan en `archivos` (rutas de
+    archivo.listar): pendientes archivados mientras no se sincronizaba.
+    """
+    hasta_seq = conn.execute("""
+    SELECT MAX(seq) FROM (SELECT seq FROM sync_outbox WHERE seq > ? ORDER BY seq LIMIT ?)
+    """, (desde_seq, limite)).fetchone()[0]
+    if hasta_seq is None:
+        return desde_seq, iter(())
+    archivadas = []
+    if archivos:
+        ids = [fila[0] for fila in conn.execute("""
+        SELECT DISTINCT ciudadano_id FROM sync_outbox WHERE seq > ? AND seq <= ?
+        AND ciudadano_id NOT IN (SELECT id FROM ciudadanos)
+        """, (desde_seq, hasta_seq))]
+        # Antes de abrir el cursor: DETACH falla con sentencias en curso
+        if ids:
+            archivadas = archivo.filas_por_id(conn, archivos, ids)
+    cursor = conn.execute(f"""
+    SELECT {COLUMNAS} FROM ciudadanos
+    WHERE id IN (SELECT ciudadano_id FROM sync_outbox WHERE seq > ? AND seq <= ?)
+    ORDER BY id
+    """, (desde_seq, hasta_seq))
+    return hasta_seq, map(legible, itertools.chain(archivadas, cursor))
+
+
+def confirmar(gestor, hasta_seq):
+    """Marca como enviados los cambios hasta hasta_seq (borra y avanza la marca)"""
+    with gestor.escritura() as conn:
+        conn.execute("DELETE FROM sync_outbox WHERE seq <= ?", (hasta_seq,))
+        if hasta_seq > int(leer_estado(conn, "ultimo_seq", 0)):
+            escribir_estado(conn, "ultimo_seq", hasta_seq)
+        escribir_estado(conn, "ultima_sincronizacion", datetime.now().isoformat())
+
+
+def sincronizar_delta(gestor, transporte, dispositivo, tam_lote=TAM_LOTE, paralelo=1,
+                      cancelado=None, progreso=None):
+    """Envía los pendientes por lotes hasta vaciar la cola.
+
+    `transporte.codificar(meta, filas)` consume el cursor de un lote y
+    devuelve un paquete; `transporte.publicar(paquete)` lo envía y devuelve
+    (ok, hasta_confirmado, mensaje), donde hasta_confirmado es el seq que el
+    servidor reconoce (o None para "todo el lote"). Puede lanzar
+    ErrorSinConexion / ErrorServidor para que el llamador reintente.
+
+    Hasta `paralelo` lotes viajan a la vez, pero la marca de agua solo avanza
+    sobre lotes confirmados contiguos: una interrupción retoma desde el
+    primero sin confirmar en lugar de empezar de cero.
+    Devuelve (ok, enviados, mensaje).
+    """
+    dispositivo_id = obtener_dispositivo_id(gestor)
+    archivos = [ruta for _, ruta in archivo.listar(archivo.directorio_archivo(gestor.ruta))]
+    enviados = 0
+    siguiente = marca_de_agua(gestor)
+    en_vuelo = deque()
+    agotado = False
+
+    with ThreadPoolExecutor(max_workers=max(1, paralelo), thread_name_prefix="sync-envio") as pool:
+        try:
+            while True:
+                while not agotado and len(en_vuelo) < max(1, paralelo):
+                    if cancelado is not None and cancelado():
+                        agotado = True
+                        break
+                    desde = siguiente
+                    meta = {
+                        "dispositivo": dispositivo,
+                        "dispositivo_id": dispositivo_id,
+                        "timestamp": datetime.now().isoformat(),
+                    }
+                    with gestor.lectura() as conn:
+                        hasta, filas = leer_lote(conn, desde, tam_lote, archivos)
+                        if hasta == desde:
+                            agotado = True
+                            break
+                        meta.update(lote_id=f"{dispositivo_id}-{desde + 1}-{hasta}",
+                                    desde_seq=desde + 1, hasta_seq=hasta)
+                        paquete = transporte.codificar(meta, filas)
+                    futuro = pool.submit(transporte.publicar, paquete) if paquete.registros else None
+                    en_vuelo.append((desde, hasta, paquete.registros, futuro))
+                    siguiente = hasta
+
+                if not en_vuelo:
+                    break
+                desde, hasta, n, futuro = en_vuelo.popleft()
+                if futuro is not None:
+                    ok, confirmado, mensaje = futuro.result()
+                    if not ok:
+                        return False, enviados, mensaje
+                    if confirmado is not None and int(confirmado) < hasta:
+                        if int(confirmado) > desde:
+                            confirmar(gestor, int(confirmado))
+                        # Lo no confirmado se reenvía en la próxima sincronización
+                        return False, enviados, "El servidor confirmó el lote solo en parte"
+                confirmar(gestor, hasta)
+                enviados += n
+                if progreso is not None and n:
+                    progreso(enviados)
+        finally:
+            for *_, futuro in en_vuelo:
+                if futuro is not None:
+                    futuro.cancel()
+
+    if cancelado is not None and cancelado():
+        return False, enviados, f"Cancelado tras {enviados} registros"
+    if not enviados:
+        return True, 0, "Sin cambios pendientes"
+    return True, enviados, f"Sincronizados {enviados} registros"
+
+
+# ============================================
+# DESCARGA A LA CACHÉ LOCAL
+# ============================================
+
+def guardar_remotos(conn, registros):
+    """Upsert en cache_remota de filas [version, *CAMPOS]; devuelve cuántas se guardaron"""
+    valores = [a_columnas(dict(zip(CAMPOS, fila[1:]))) + (fila[0],) for fila in registros if fila[1]]
+    conn.executemany(_GUARDAR_REMOTO, valores)
+    return len(valores)
+
+
+def recortar_cache(conn, maximo=CACHE_REMOTA_MAX):
+    """Descarta las filas de versión más vieja que excedan `maximo`; devuelve cuántas"""
+    sobran = conn.execute("SELECT COUNT(*) FROM cache_remota").fetchone()[0] - maximo
+    if sobran <= 0:
+        return 0
+    conn.execute("DELETE FROM cache_remota WHERE numero IN "
+                 "(SELECT numero FROM cache_remota ORDER BY version LIMIT ?)", (sobran,))
+    return sobran
+
+
+def descargar_cambios(gestor, transporte, tam_pagina=PAGINA_DESCARGA, maximo=CACHE_REMOTA_MAX,
+                      cancelado=None):
+    """Trae los registros de otros dispositivos con versión posterior al cursor guardado.
+
+    `transporte.descargar(desde, limite, excluir)` devuelve (ok, pagina,
+    mensaje) con pagina = {"registros", "hasta", "hay_mas", "maximo"} o None
+    si el servidor no ofrece la ruta. Cada página se guarda en la misma
+    transacción que el cursor, así una interrupción retoma desde la última
+    página completa. Si hay más de `maximo` versiones pendientes se salta a
+    las últimas: las anteriores se descartarían de todos modos.
+    Devuelve (ok, recibidos, mensaje).
+    """
+    dispositivo_id = obtener_dispositivo_id(gestor)
+    with gestor.lectura() as conn:
+        cursor = int(leer_estado(conn, "cursor_descarga", 0))
+    recibidos = 0
+    primera = True
+    while True:
+        if cancelado is not None and cancelado():
+            return False, recibidos, f"Descarga cancelada tras {recibidos} registros"
+        ok, pagina, mensaje = transporte.descargar(cursor, tam_pagina, dispositivo_id)
+        if not ok or pagina is None:
+            return ok, recibidos, mensaje
+        if primera:
+            primera = False
+            # Servidor con otra DB (cursor por delante) o muy atrasados
+            if pagina["maximo"] < cursor or pagina["maximo"] - cursor > maximo:
+                cursor = max(0, pagina["maximo"] - maximo)
+                continue
+        with gestor.escritura() as conn:
+            recibidos += guardar_remotos(conn, pagina["registros"])
+            recortar_cache(conn, maximo)
+            cursor = pagina["hasta"]
+            escribir_estado(conn, "cursor_descarga", cursor)
+        if not pagina["hay_mas"]:
+            break
+    if not recibidos:
+        return True, 0, "Sin cambios de otros dispositivos"
+    return True, recibidos, f"Descargados {recibidos} registros"
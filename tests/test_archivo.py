@@ -0,0 +1,52 @@
+"""Pendientes de sincronizar que se archivan con la sincronización deshabilitada"""
+
+import pytest
+
+import archivo
+from datos_sinteticos import generar_filas
+from db_conexion import GestorConexiones
+from db_esquema import crear_esquema_base, migrar
+from duplicados import insertar_lote
+from sincronizacion import contar_pendientes, sincronizar_delta
+from transporte_sync import Paquete
+
+
+class TransporteFalso:
+    def __init__(self):
+        self.numeros = []
+
+    def codificar(self, meta, filas):
+        filas = list(filas)
+        return Paquete(meta, filas, len(filas), "json")
+
+    def publicar(self, paquete):
+        self.numeros.extend(fila[0] for fila in paquete.cuerpo)
+        return True, None, "ok"
+
+
+@pytest.fixture
+def gestor(tmp_path):
+    gestor = GestorConexiones(str(tmp_path / "cedulas.db"))
+    with gestor.escritura() as conn:
+        crear_esquema_base(conn)
+        migrar(conn)
+    yield gestor
+    gestor.cerrar()
+
+
+def test_pendientes_archivados_se_envian(gestor):
+    filas = list(generar_filas(30, semilla=3))
+    with gestor.escritura() as conn:
+        insertar_lote(conn, filas, "rechazar")
+        # Dos tercios dados de alta hace años, repartidos en tres archivos
+        conn.execute("UPDATE ciudadanos SET registrado = 20200101 + id % 3 * 10000 WHERE id <= 20")
+    movidas = archivo.archivar(gestor, archivo.directorio_archivo(gestor.ruta), 20240101,
+                               incluir_pendientes=True)
+    assert sum(movidas.values()) == 20
+    assert contar_pendientes(gestor) == 30
+
+    transporte = TransporteFalso()
+    ok, _, _ = sincronizar_delta(gestor, transporte, "prueba", tam_lote=7)
+    assert ok
+    assert sorted(set(transporte.numeros)) == sorted(d["numero"] for d in filas)
+    assert contar_pendientes(gestor) == 0
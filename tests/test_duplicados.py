@@ -0,0 +1,54 @@
+"""Inserción masiva con números repetidos dentro del mismo lote"""
+
+import pytest
+
+from datos_sinteticos import generar_filas
+from db_conexion import GestorConexiones
+from db_esquema import crear_esquema_base, insercion_masiva, migrar, reconstruir_resumenes
+from duplicados import POLITICAS, VISITAS, insertar_lote
+
+RESUMENES = ("resumen_sexo", "resumen_lugar", "resumen_nacimiento")
+
+
+@pytest.fixture
+def gestor(tmp_path):
+    gestor = GestorConexiones(str(tmp_path / "cedulas.db"))
+    with gestor.escritura() as conn:
+        crear_esquema_base(conn)
+        migrar(conn)
+    yield gestor
+    gestor.cerrar()
+
+
+def _resumenes(conn):
+    return {t: conn.execute(f"SELECT * FROM {t} WHERE total != 0 ORDER BY 1, 2").fetchall() for t in RESUMENES}
+
+
+@pytest.mark.parametrize("politica", POLITICAS)
+def test_repetido_en_el_lote(gestor, politica):
+    previa, nueva, otra = generar_filas(3, semilla=1)
+    with gestor.escritura() as conn, insercion_masiva(conn):
+        insertar_lote(conn, [previa], politica)
+    # Repetidos dentro del lote: uno ya guardado y uno que entra en este mismo lote
+    corregida = dict(nueva, nombres="OTRO NOMBRE", sexo="F" if nueva["sexo"] == "M" else "M")
+    lote = [nueva, previa, otra, corregida, previa]
+    with gestor.escritura() as conn, insercion_masiva(conn):
+        insertar_lote(conn, lote, politica)
+
+    with gestor.escritura() as conn:
+        conn.execute("INSERT INTO ciudadanos_fts(ciudadanos_fts) VALUES('integrity-check')")
+        assert conn.execute("SELECT COUNT(*) FROM ciudadanos").fetchone()[0] == 3
+        assert conn.execute("SELECT COUNT(*) FROM ciudadanos_fts").fetchone()[0] == 3
+        assert conn.execute("SELECT COUNT(DISTINCT ciudadano_id) FROM sync_outbox").fetchone()[0] == 3
+        nombres = conn.execute("SELECT nombres FROM ciudadanos WHERE numero = ?", (nueva["numero"],)).fetchone()[0]
+        assert nombres == (nueva if politica == "rechazar" else corregida)["nombres"]
+        assert conn.execute("SELECT rowid FROM ciudadanos_fts WHERE ciudadanos_fts MATCH ?",
+                            (f'nombres:"{nombres}"',)).fetchall() == \
+            conn.execute("SELECT id FROM ciudadanos WHERE numero = ?", (nueva["numero"],)).fetchall()
+        visitas = conn.execute("SELECT COUNT(*) FROM visitas").fetchone()[0]
+        assert visitas == (len(lote) + 1 if politica == VISITAS else 0)
+
+        # Los resúmenes mantenidos en bloque coinciden con un recálculo completo
+        antes = _resumenes(conn)
+        reconstruir_resumenes(conn)
+        assert _resumenes(conn) == antes
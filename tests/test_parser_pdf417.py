@@ -0,0 +1,34 @@
+"""parsear_datos contra un corpus de códigos crudos con su resultado esperado.
+
+corpus_pdf417.json guarda el código como texto ("codigo") o, si son bytes,
+en base64 ("codigo_base64"). Los casos que no siguen el diseño por
+posiciones dan lo mismo que el parser anterior a parser_pdf417.
+"""
+
+import base64
+import json
+import os
+
+import pytest
+
+from parser_pdf417 import parsear_datos, parsear_lote
+
+with open(os.path.join(os.path.dirname(__file__), "corpus_pdf417.json"), encoding="utf-8") as f:
+    CORPUS = json.load(f)
+
+
+def _codigo(caso):
+    if "codigo_base64" in caso:
+        return base64.b64decode(caso["codigo_base64"])
+    return caso["codigo"]
+
+
+@pytest.mark.parametrize("caso", CORPUS, ids=[c["descripcion"] for c in CORPUS])
+def test_corpus(caso):
+    assert parsear_datos(_codigo(caso)) == caso["esperado"]
+
+
+@pytest.mark.parametrize("procesos", [None, 2])
+def test_lote_igual_que_uno_a_uno(procesos):
+    resultados = list(parsear_lote((_codigo(c) for c in CORPUS), procesos=procesos, tam_bloque=4))
+    assert resultados == [c["esperado"] for c in CORPUS]
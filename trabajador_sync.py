@@ -0,0 +1,148 @@
+"""
+Trabajador de sincronización en segundo plano
+Cola de solicitudes, disparo periódico y por cambios, reintentos con backoff
+"""
+
+import queue
+import random
+import threading
+import time
+
+from sincronizacion import ErrorSinConexion, ErrorServidor
+
+INTERVALO_PERIODICO = 300     # segundos entre sincronizaciones automáticas
+ESPERA_CAMBIO = 5             # agrupa guardados seguidos en un solo envío
+BACKOFF_BASE = 2
+BACKOFF_MAX = 300
+
+
+class TrabajadorSync:
+    """Ejecuta `tarea(cancelado, progreso)` en un hilo propio.
+
+    `tarea` devuelve (ok, mensaje) o lanza ErrorSinConexion / ErrorServidor,
+    que se reintentan con backoff exponencial y jitter. Cualquier otro error
+    se informa y espera al siguiente disparo. `al_estado(mensaje)` se llama
+    desde el hilo trabajador: la UI debe reenviarlo con Clock.schedule_once.
+    """
+
+    def __init__(self, tarea, al_estado=None, intervalo=INTERVALO_PERIODICO,
+                 espera_cambio=ESPERA_CAMBIO, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.tarea = tarea
+        self.al_estado = al_estado or (lambda mensaje: None)
+        self.intervalo = intervalo
+        self.espera_cambio = espera_cambio
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cola = queue.Queue()
+        self._detenido = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._fallos = 0
+        self._proximo_cambio = None
+        self._proximo_reintento = None
+        self._proximo_periodico = None
+        self.ultimo_resultado = None
+
+    # --- API usada desde la UI ---
+
+    def iniciar(self):
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive() and not self._detenido.is_set():
+                return
+            self._detenido = threading.Event()
+            self._cola = queue.Queue()
+            self._fallos = 0
+            self._proximo_cambio = None
+            self._proximo_reintento = None
+            self._proximo_periodico = time.monotonic() + self.intervalo if self.intervalo else None
+            self._hilo = threading.Thread(target=self._bucle, args=(self._detenido, self._cola),
+                                          name="sync", daemon=True)
+            self._hilo.start()
+
+    def solicitar(self):
+        """Sincronización manual inmediata (ignora el backoff pendiente)"""
+        self._cola.put("manual")
+
+    def notificar_cambio(self):
+        """Hubo escrituras locales: sincronizar tras una breve espera"""
+        self._cola.put("cambio")
+
+    def detener(self, esperar=False):
+        """Cancela la sincronización en curso y las pendientes (p. ej. al cerrar sesión)"""
+        detenido, hilo = self._detenido, self._hilo
+        detenido.set()
+        self._cola.put("detener")
+        if esperar and hilo is not None and hilo is not threading.current_thread():
+            hilo.join()
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive() and not self._detenido.is_set()
+
+    # --- Hilo trabajador ---
+
+    def _siguiente_plazo(self):
+        plazos = [p for p in (self._proximo_cambio, self._proximo_reintento, self._proximo_periodico) if p]
+        return min(plazos) if plazos else None
+
+    def _backoff(self):
+        tope = min(self.backoff_max, self.backoff_base * (2 ** self._fallos))
+        # "Equal jitter": la mitad fija y la otra mitad aleatoria
+        return tope / 2 + random.uniform(0, tope / 2)
+
+    def _bucle(self, detenido, cola):
+        while not detenido.is_set():
+            plazo = self._siguiente_plazo()
+            espera = None if plazo is None else max(0, plazo - time.monotonic())
+            try:
+                motivo = cola.get(timeout=espera)
+            except queue.Empty:
+                motivo = "plazo"
+            if detenido.is_set() or motivo == "detener":
+                break
+
+            ahora = time.monotonic()
+            if motivo == "cambio":
+                if self._proximo_cambio is None:
+                    self._proximo_cambio = ahora + self.espera_cambio
+                continue
+            if motivo == "plazo":
+                vencido = [p for p in (self._proximo_cambio, self._proximo_reintento,
+                                       self._proximo_periodico) if p and p <= ahora]
+                if not vencido:
+                    continue
+            # Agrupar todo lo que llegó mientras tanto en una sola ejecución
+            while True:
+                try:
+                    if cola.get_nowait() == "detener":
+                        return
+                except queue.Empty:
+                    break
+            self._ejecutar(detenido)
+
+    def _ejecutar(self, detenido):
+        self._proximo_cambio = None
+        self._proximo_reintento = None
+        self.al_estado("Sincronizando...")
+
+        def progreso(enviados):
+            self.al_estado(f"Sincronizando... {enviados} enviados")
+
+        try:
+            resultado = self.tarea(detenido.is_set, progreso)
+        except (ErrorSinConexion, ErrorServidor) as e:
+            self._fallos += 1
+            espera = self._backoff()
+            self._proximo_reintento = time.monotonic() + espera
+            tipo = "Sin conexión" if isinstance(e, ErrorSinConexion) else "Error servidor"
+            self.ultimo_resultado = (False, f"{tipo}: {e}")
+            self.al_estado(f"{tipo}, reintento en {int(espera)} s")
+            return
+        except Exception as e:
+            resultado = (False, f"Error: {str(e)}")
+        self._fallos = 0
+        if self.intervalo:
+            self._proximo_periodico = time.monotonic() + self.intervalo
+        self.ultimo_resultado = resultado
+        if not detenido.is_set():
+            self.al_estado(resultado[1])
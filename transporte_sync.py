@@ -0,0 +1,161 @@
+"""
+Transporte HTTP de la sincronización
+Sesión persistente (keep-alive, pool), lotes NDJSON comprimidos con gzip y
+descarga paginada de los cambios de otros dispositivos
+"""
+
+import json
+import threading
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from campos import CAMPOS
+from sincronizacion import ErrorSinConexion, ErrorServidor
+
+RUTA_JSON = "/api/sincronizar"
+RUTA_NDJSON = "/api/sincronizar/ndjson"
+RUTA_CAMBIOS = "/api/cambios"
+TIMEOUT = 10
+
+# Respuestas con las que un servidor antiguo rechaza la ruta o el formato nuevo
+# (501: BaseHTTPRequestHandler sin do_GET)
+CODIGOS_SIN_SOPORTE = (404, 405, 415, 501)
+
+
+class Paquete:
+    """Cuerpo ya codificado de un lote, listo para publicarse desde otro hilo"""
+
+    __slots__ = ("meta", "cuerpo", "registros", "formato")
+
+    def __init__(self, meta, cuerpo, registros, formato):
+        self.meta = meta
+        self.cuerpo = cuerpo
+        self.registros = registros
+        self.formato = formato
+
+
+class TransporteSync:
+    """Publica lotes de sincronización reutilizando conexiones.
+
+    formato: "auto" prueba NDJSON+gzip y, si el servidor no lo soporta, pasa
+    al JSON documentado de /api/sincronizar y lo recuerda; "ndjson" o "json"
+    fuerzan uno de los dos.
+    """
+
+    def __init__(self, base_url, formato="auto", conexiones=4, timeout=TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.formato = formato
+        self.conexiones = conexiones
+        self.timeout = timeout
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=self.conexiones, max_retries=0)
+                session.mount("http://", adaptador)
+                session.mount("https://", adaptador)
+                self._session = session
+            return self._session
+
+    def cerrar(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    # --- Codificación (en el hilo que lee la DB) ---
+
+    def codificar(self, meta, filas):
+        """Consume el cursor `filas` y devuelve un Paquete en el formato vigente"""
+        if self.formato == "json":
+            return self._codificar_json(meta, filas)
+        return self._codificar_ndjson(meta, filas)
+
+    def _codificar_ndjson(self, meta, filas):
+        compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: contenedor gzip
+        partes = []
+        n = 0
+        for fila in filas:
+            linea = json.dumps(dict(zip(CAMPOS, fila)), ensure_ascii=False, separators=(",", ":"))
+            partes.append(compresor.compress(linea.encode("utf-8") + b"\n"))
+            n += 1
+        partes.append(compresor.flush())
+        return Paquete(meta, b"".join(partes), n, "ndjson")
+
+    def _codificar_json(self, meta, filas):
+        registros = [dict(zip(CAMPOS, fila)) for fila in filas]
+        datos = dict(meta, registros=registros)
+        return Paquete(meta, datos, len(registros), "json")
+
+    # --- Publicación (puede ir en paralelo) ---
+
+    def publicar(self, paquete):
+        """Envía un Paquete. Devuelve (ok, hasta_confirmado, mensaje)"""
+        if paquete.formato == "ndjson":
+            resp = self._post(RUTA_NDJSON, data=paquete.cuerpo, headers={
+                "Content-Type": "application/x-ndjson",
+                "Content-Encoding": "gzip",
+                "X-Dispositivo": str(paquete.meta["dispositivo"]),
+                "X-Dispositivo-Id": str(paquete.meta["dispositivo_id"]),
+                "X-Lote-Id": str(paquete.meta["lote_id"]),
+                "X-Desde-Seq": str(paquete.meta["desde_seq"]),
+                "X-Hasta-Seq": str(paquete.meta["hasta_seq"]),
+            })
+            if resp.status_code in CODIGOS_SIN_SOPORTE and self.formato != "ndjson":
+                # Servidor antiguo: recodificar este lote y usar JSON en adelante
+                # (otro hilo puede haber cambiado ya el formato con lotes en vuelo)
+                self.formato = "json"
+                registros = [json.loads(linea) for linea in
+                             zlib.decompress(paquete.cuerpo, 31).decode("utf-8").splitlines()]
+                paquete = Paquete(paquete.meta, dict(paquete.meta, registros=registros),
+                                  len(registros), "json")
+            else:
+                return self._interpretar(resp)
+        return self._interpretar(self._post(RUTA_JSON, json=paquete.cuerpo))
+
+    # --- Descarga de cambios de otros dispositivos ---
+
+    def descargar(self, desde, limite, excluir):
+        """Pide una página de GET /api/cambios. Devuelve (ok, pagina, mensaje).
+
+        Un servidor sin la ruta responde (True, None, ...): no es un error,
+        simplemente no hay nada que descargar.
+        """
+        try:
+            resp = self.session.get(self.base_url + RUTA_CAMBIOS, timeout=self.timeout,
+                                    params={"desde": desde, "limite": limite, "excluir": excluir})
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise ErrorSinConexion(str(e))
+        if resp.status_code in CODIGOS_SIN_SOPORTE:
+            return True, None, "El servidor no ofrece descarga de cambios"
+        if resp.status_code >= 500:
+            raise ErrorServidor(str(resp.status_code))
+        if resp.status_code != 200:
+            return False, None, f"Error servidor: {resp.status_code}"
+        return True, resp.json(), ""
+
+    def _post(self, ruta, **kwargs):
+        try:
+            return self.session.post(self.base_url + ruta, timeout=self.timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise ErrorSinConexion(str(e))
+
+    @staticmethod
+    def _interpretar(resp):
+        if resp.status_code >= 500:
+            raise ErrorServidor(str(resp.status_code))
+        if resp.status_code != 200:
+            return False, None, f"Error servidor: {resp.status_code}"
+        # Servidores nuevos pueden confirmar parcialmente con "hasta_seq";
+        # los antiguos solo responden 200 y se da el lote por confirmado
+        try:
+            confirmado = resp.json().get("hasta_seq")
+        except Exception:
+            confirmado = None
+        return True, confirmado, ""